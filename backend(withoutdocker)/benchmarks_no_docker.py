@@ -0,0 +1,739 @@
+"""Benchmarks against a local Redis.
+
+Usage: python benchmarks_no_docker.py [memory|levels|registrations|nearby|waitlist|recommendations|impact|checkin|logins|google_exchange|google_outage] [counts...]
+Uses a scratch database (BENCH_REDIS_DB, default 15) which is FLUSHED.
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import redis
+from redis import asyncio as aioredis
+# Check-in codes need their own key; any will do against the scratch database
+os.environ.setdefault("CHECKIN_CODE_SECRET", "benchmark-checkin-secret")
+from config_no_docker import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_MAX_CONNECTIONS, CHECKIN_MAX_BATCH_SIZE
+from redis_models_no_docker import (
+    RedisUser, RedisSession, open_login_session, user_key, user_email_key, session_key, session_token_key,
+    USER_AGENTS_KEY, SESSION_EXPIRY_INDEX, STATS_COUNTERS_KEY, LEADERBOARD_KEY, _epoch, _flatten, _save_user
+)
+from cache_no_docker import USER_INVALIDATION_CHANNEL
+from levels_no_docker import evaluate, evaluate_batch, recompute_all_levels
+from events_no_docker import (
+    RedisEvent, register_for_event, cancel_registration, search_nearby,
+    event_key, event_volunteers_key, event_waitlist_key, events_geo_key, tag_events_key,
+    _REGISTER_SCRIPT, _CANCEL_SCRIPT
+)
+from recommendations_no_docker import recommend_events
+from impact_no_docker import (
+    record_attendance, recompute_impact_scores, event_attendees_key, event_hours, impact_score
+)
+from checkin_no_docker import make_checkin_code, verify_checkin_code, check_in
+from notifications_no_docker import NOTIFICATIONS_KEY
+import oauth_no_docker
+from oauth_stub import bench_google_exchange, bench_google_outage
+
+BENCH_REDIS_DB = int(os.getenv("BENCH_REDIS_DB", "15"))
+BATCH_SIZE = 1000
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+]
+
+def bench_client() -> aioredis.Redis:
+    """Async client on the scratch db, pooled like the app's"""
+    return aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD or None,
+        db=BENCH_REDIS_DB, decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS
+    ))
+
+def _fixture(i: int):
+    user = RedisUser(email=f"user{i}@example.com", name=f"User {i}", provider_id=str(10**20 + i))
+    session = RedisSession(
+        user_id=user.id,
+        token=f"{i:08d}-{user.id}",
+        expires_at=(datetime.utcnow() + timedelta(hours=24)).isoformat(),
+        user_agent=USER_AGENTS[i % len(USER_AGENTS)],
+        ip_address=f"10.0.{i // 256 % 256}.{i % 256}"
+    )
+    return user, session
+
+def _write_old_layout(pipe, user, session):
+    """What RedisUser.save/RedisSession.save wrote before the single-copy layout"""
+    user_data = user.to_hash()
+    pipe.hset(f"user:{user.email}", mapping=user_data)
+    pipe.hset(f"user_by_id:{user.id}", mapping=user_data)
+
+    session_data = session.to_hash()
+    session_data.pop('user_agent_id')
+    session_data['user_agent'] = session.user_agent
+    pipe.hset(f"session:{session.token}", mapping=session_data)
+    pipe.hset(f"session_by_id:{session.id}", mapping=session_data)
+    pipe.expire(f"session:{session.token}", 86400)
+    pipe.expire(f"session_by_id:{session.id}", 86400)
+    pipe.zadd(SESSION_EXPIRY_INDEX, {session.token: _epoch(session.expires_at)})
+
+def _write_new_layout(pipe, user, session):
+    """What RedisUser.save/RedisSession.save write now"""
+    pipe.hset(user_key(user.id), mapping=user.to_hash())
+    pipe.set(user_email_key(user.email), user.id)
+
+    session_data = session.to_hash()
+    pipe.hsetnx(USER_AGENTS_KEY, session_data['user_agent_id'], session.user_agent)
+    pipe.hset(session_key(session.id), mapping=session_data)
+    pipe.set(session_token_key(session.token), session.id, ex=86400)
+    pipe.expire(session_key(session.id), 86400)
+    pipe.zadd(SESSION_EXPIRY_INDEX, {session.id: _epoch(session.expires_at)})
+
+async def _used_memory(r) -> int:
+    return (await r.info("memory"))["used_memory"]
+
+async def _measure(r, writer, count: int) -> int:
+    await r.flushdb()
+    baseline = await _used_memory(r)
+    for start in range(0, count, BATCH_SIZE):
+        async with r.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                writer(pipe, *_fixture(i))
+            await pipe.execute()
+    used = await _used_memory(r) - baseline
+    await r.flushdb()
+    return used
+
+async def bench_memory(*counts: int):
+    """Redis memory for N users + N sessions in the old and new layouts"""
+    counts = counts or (100_000, 1_000_000)
+    r = bench_client()
+    try:
+        print(f"Memory for N users + N sessions (db {BENCH_REDIS_DB}):")
+        print(f"  {'N':>9} {'old MB':>9} {'new MB':>9} {'saved':>7} {'old B/pair':>11} {'new B/pair':>11}")
+        for count in counts:
+            start = time.perf_counter()
+            old = await _measure(r, _write_old_layout, count)
+            new = await _measure(r, _write_new_layout, count)
+            print(
+                f"  {count:>9} {old / 2**20:>9.1f} {new / 2**20:>9.1f} {1 - new / old:>7.1%}"
+                f" {old // count:>11} {new // count:>11}   ({time.perf_counter() - start:.0f}s)"
+            )
+    finally:
+        await r.aclose()
+
+def bench_levels(*counts: int):
+    """Full level/badge recompute over N users, plus the evaluation step alone"""
+    counts = counts or (100_000, 1_000_000)
+    r = redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD or None,
+        db=BENCH_REDIS_DB, decode_responses=True
+    )
+    try:
+        print(f"Level recompute (db {BENCH_REDIS_DB}):")
+        print(f"  {'N':>9} {'bisect s':>9} {'numpy s':>8} {'all changed s':>14} {'none changed s':>15}")
+        for count in counts:
+            r.flushdb()
+            points = [random.randint(0, 12000) for _ in range(count)]
+            for start in range(0, count, BATCH_SIZE):
+                with r.pipeline(transaction=False) as pipe:
+                    for i in range(start, min(start + BATCH_SIZE, count)):
+                        # Stale levels/badges, as after a threshold change
+                        pipe.hset(user_key(str(i)), mapping={"id": i, "points": points[i], "level": "Old", "badges": -1})
+                    pipe.execute()
+
+            start = time.perf_counter()
+            for value in points:
+                evaluate(value)
+            scalar = time.perf_counter() - start
+            array = np.array(points, dtype=np.int64)
+            start = time.perf_counter()
+            evaluate_batch(array)
+            vectorized = time.perf_counter() - start
+
+            start = time.perf_counter()
+            first = recompute_all_levels(r)
+            full = time.perf_counter() - start
+            start = time.perf_counter()
+            second = recompute_all_levels(r)
+            noop = time.perf_counter() - start
+            assert first["changed"] == count and second["changed"] == 0
+            print(f"  {count:>9} {scalar:>9.2f} {vectorized:>8.3f} {full:>14.1f} {noop:>15.1f}")
+        r.flushdb()
+    finally:
+        r.close()
+
+async def _register_storm(r, event: RedisEvent, user_ids) -> tuple:
+    """Register every user at once; (status counts, per-call latencies)"""
+    async def one(user_id):
+        start = time.perf_counter()
+        result = await register_for_event(event, user_id, client=r)
+        return result["status"], time.perf_counter() - start
+
+    results = await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return statuses, sorted(latency for _, latency in results)
+
+async def _create_event(r, capacity: int, user_ids) -> RedisEvent:
+    """An event plus its organizer and volunteers, written straight to the scratch db"""
+    organizer_id = "organizer"
+    event = RedisEvent(
+        organizer_id=organizer_id, title="Beach cleanup", capacity=capacity,
+        starts_at=(datetime.utcnow() + timedelta(days=1)).isoformat()
+    )
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hset(event_key(event.id), mapping={**event.to_hash(), "registered": 0})
+        pipe.hset(user_key(organizer_id), mapping={"id": organizer_id, "role": "organizer"})
+        for user_id in user_ids:
+            pipe.hset(user_key(user_id), mapping={"id": user_id, "role": "volunteer"})
+        await pipe.execute()
+    return event
+
+async def _events_joined(r, user_ids) -> int:
+    async with r.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.hget(user_key(user_id), "events_joined")
+        return sum(int(value or 0) for value in await pipe.execute())
+
+async def bench_registrations(*counts: int):
+    """N volunteers registering for one event at the same moment.
+
+    Runs each N twice: against a capacity of N/2 (half are turned away) and
+    of N (everyone gets in). Checks nothing was overbooked and that every
+    counter the registration touches agrees with the volunteer set.
+    Client latency includes waiting for a pooled connection; "redis us" is
+    the script's own time per call inside Redis.
+    """
+    counts = counts or (1000,)
+    r = bench_client()
+    try:
+        await r.script_load(_REGISTER_SCRIPT)
+        print(f"Concurrent registrations for one event (db {BENCH_REDIS_DB}, pool {REDIS_MAX_CONNECTIONS}):")
+        print(
+            f"  {'N':>6} {'capacity':>9} {'ok':>6} {'full':>6} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}"
+            f" {'wall s':>7} {'redis us':>9}"
+        )
+        for count in counts:
+            for capacity in (count // 2, count):
+                await r.flushdb()
+                user_ids = [f"volunteer-{i}" for i in range(count)]
+                event = await _create_event(r, capacity, user_ids)
+
+                await r.config_resetstat()
+                start = time.perf_counter()
+                statuses, latencies = await _register_storm(r, event, user_ids)
+                wall = time.perf_counter() - start
+                script_stats = (await r.info("commandstats")).get("cmdstat_evalsha", {})
+
+                registered = int(await r.hget(event_key(event.id), "registered"))
+                members = await r.scard(event_volunteers_key(event.id))
+                total_volunteers = int(await r.hget(user_key(event.organizer_id), "total_volunteers") or 0)
+                joined = await _events_joined(r, user_ids)
+                expected = min(capacity, count)
+                assert statuses.get("ok", 0) == registered == members == total_volunteers == joined == expected, \
+                    (statuses, registered, members, total_volunteers, joined)
+
+                pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                print(
+                    f"  {count:>6} {capacity:>9} {statuses.get('ok', 0):>6} {statuses.get('full', 0):>6}"
+                    f" {pick(0.5):>7.2f} {pick(0.99):>7.2f} {latencies[-1] * 1000:>7.2f} {wall:>7.2f}"
+                    f" {script_stats.get('usec_per_call', 0):>9.2f}"
+                )
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def bench_waitlist(*counts: int):
+    """Cancel and register storms against a full event with a waitlist.
+
+    N volunteers register for an event with room for N/2; the rest are
+    waitlisted. Then, all at once, half of those registered cancel while N/2
+    newcomers register. Checks that the event ends up exactly full (or the
+    waitlist empty), nobody is both registered and waiting, every counter
+    matches, and promotions followed waitlist order.
+    """
+    counts = counts or (1000,)
+    r = bench_client()
+    pick = lambda samples, q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+    async def timed(call, kind, samples):
+        start = time.perf_counter()
+        await call
+        samples[kind].append(time.perf_counter() - start)
+
+    try:
+        await r.script_load(_REGISTER_SCRIPT)
+        await r.script_load(_CANCEL_SCRIPT)
+        print(f"Waitlist storms (db {BENCH_REDIS_DB}, pool {REDIS_MAX_CONNECTIONS}):")
+        print(
+            f"  {'N':>6} {'promoted':>9} {'waiting':>8} {'cancel p50':>11} {'p99 ms':>7}"
+            f" {'register p50':>13} {'p99 ms':>7} {'wall s':>7}"
+        )
+        for count in counts:
+            await r.flushdb()
+            capacity = count // 2
+            user_ids = [f"volunteer-{i}" for i in range(count)]
+            newcomers = [f"newcomer-{i}" for i in range(count // 2)]
+            event = await _create_event(r, capacity, user_ids + newcomers)
+            await asyncio.gather(*(register_for_event(event, user_id, waitlist=True, client=r) for user_id in user_ids))
+            waiting_before = await r.zrange(event_waitlist_key(event.id), 0, -1)
+            cancelling = random.sample(sorted(await r.smembers(event_volunteers_key(event.id))), capacity // 2)
+
+            samples = {"cancel": [], "register": []}
+            calls = [timed(cancel_registration(event, user_id, client=r), "cancel", samples) for user_id in cancelling]
+            calls += [
+                timed(register_for_event(event, user_id, waitlist=True, client=r), "register", samples)
+                for user_id in newcomers
+            ]
+            random.shuffle(calls)
+            start = time.perf_counter()
+            await asyncio.gather(*calls)
+            wall = time.perf_counter() - start
+
+            registered = set(await r.smembers(event_volunteers_key(event.id)))
+            waiting = await r.zrange(event_waitlist_key(event.id), 0, -1)
+            count_field = int(await r.hget(event_key(event.id), "registered"))
+            total_volunteers = int(await r.hget(user_key(event.organizer_id), "total_volunteers") or 0)
+            joined = await _events_joined(r, user_ids + newcomers)
+            promoted = [fields["user_id"] for _, fields in await r.xrange(NOTIFICATIONS_KEY)]
+            assert len(registered) == count_field == total_volunteers == joined <= capacity
+            assert not waiting or len(registered) == capacity
+            assert not registered & set(waiting) and not registered & set(cancelling)
+            assert promoted[:len(waiting_before)] == waiting_before[:len(promoted)]
+
+            for kind in samples:
+                samples[kind].sort()
+            print(
+                f"  {count:>6} {len(promoted):>9} {len(waiting):>8}"
+                f" {pick(samples['cancel'], 0.5):>11.2f} {pick(samples['cancel'], 0.99):>7.2f}"
+                f" {pick(samples['register'], 0.5):>13.2f} {pick(samples['register'], 0.99):>7.2f} {wall:>7.2f}"
+            )
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def bench_nearby(*counts: int):
+    """Nearby search over N future events spread across 90 days.
+
+    Events are scattered over a ~600 km square; each query is a random point
+    in it with the default 30-day window. "search" is the GEO script alone,
+    "page" adds loading the event hashes for the first page.
+    """
+    counts = counts or (100_000,)
+    queries = 500
+    shapes = {
+        "radius 5km": {"radius_km": 5},
+        "radius 25km": {"radius_km": 25},
+        "radius 50km": {"radius_km": 50},
+        "box 20x20km": {"box_km": (20, 20)},
+    }
+    r = bench_client()
+    try:
+        print(f"Nearby events, {queries} queries per shape (db {BENCH_REDIS_DB}):")
+        print(f"  {'N':>8} {'shape':>13} {'matches':>8} {'search p50':>11} {'p99 ms':>7} {'page p50':>9} {'p99 ms':>7}")
+        for count in counts:
+            await r.flushdb()
+            today = datetime.now(timezone.utc).date()
+            for start in range(0, count, BATCH_SIZE):
+                async with r.pipeline(transaction=False) as pipe:
+                    for i in range(start, min(start + BATCH_SIZE, count)):
+                        day = today + timedelta(days=i % 90)
+                        event = RedisEvent(
+                            id=f"event-{i}", organizer_id="organizer", title=f"Cleanup {i}", capacity=50,
+                            latitude=random.uniform(35, 40), longitude=random.uniform(-124, -118),
+                            starts_at=datetime.combine(day, datetime.min.time()).isoformat()
+                        )
+                        pipe.hset(event_key(event.id), mapping={**event.to_hash(), "registered": 0})
+                        pipe.geoadd(events_geo_key(day), (event.longitude, event.latitude, event.id))
+                    await pipe.execute()
+
+            last_day = today + timedelta(days=29)
+            for name, shape in shapes.items():
+                search_samples, page_samples, matched = [], [], 0
+                for _ in range(queries):
+                    point = (random.uniform(-123, -119), random.uniform(36, 39))
+                    start = time.perf_counter()
+                    page, _ = await search_nearby(*point, today, last_day, limit=20, client=r, **shape)
+                    search_samples.append(time.perf_counter() - start)
+                    await RedisEvent.find_many([event_id for event_id, _ in page], client=r)
+                    page_samples.append(time.perf_counter() - start)
+                    # Untimed: everything in range, to show how many events a query matches
+                    matched += len((await search_nearby(*point, today, last_day, limit=count, client=r, **shape))[0])
+                search_samples.sort()
+                page_samples.sort()
+                pick = lambda samples, q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+                print(
+                    f"  {count:>8} {name:>12} {matched / queries:>8.0f}"
+                    f" {pick(search_samples, 0.5):>11.2f} {pick(search_samples, 0.99):>7.2f}"
+                    f" {pick(page_samples, 0.5):>9.2f} {pick(page_samples, 0.99):>7.2f}"
+                )
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def bench_recommendations(event_count: int = 50_000, volunteer_count: int = 500_000):
+    """Recommended events for a sample of N volunteers over M tagged events.
+
+    Tag popularity is skewed (a few tags are on most events). Compares the
+    indexed lookup, cold and cached, with scanning every event's tags.
+    """
+    vocabulary = [f"tag-{i}" for i in range(40)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    sample = 2000
+    r = bench_client()
+    try:
+        await r.flushdb()
+        today = datetime.utcnow()
+        for start in range(0, event_count, BATCH_SIZE):
+            async with r.pipeline(transaction=False) as pipe:
+                for i in range(start, min(start + BATCH_SIZE, event_count)):
+                    event = RedisEvent(
+                        id=f"event-{i}", organizer_id="organizer", title=f"Cleanup {i}", capacity=50,
+                        starts_at=(today + timedelta(days=1 + i % 90)).isoformat(),
+                        tags=random.choices(vocabulary, weights, k=random.randint(1, 4))
+                    )
+                    pipe.hset(event_key(event.id), mapping={**event.to_hash(), "registered": 0})
+                    for tag in event.tags:
+                        pipe.zadd(tag_events_key(tag), {event.id: _epoch(event.starts_at)})
+                await pipe.execute()
+        volunteers = [
+            (f"volunteer-{i}", sorted(set(random.choices(vocabulary, weights, k=random.randint(1, 5)))))
+            for i in range(volunteer_count)
+        ]
+        queried = random.sample(volunteers, sample)
+
+        async def timed_run():
+            samples = []
+            for user_id, interests in queried:
+                start = time.perf_counter()
+                await recommend_events(user_id, interests, limit=10, client=r)
+                samples.append(time.perf_counter() - start)
+            return sorted(samples)
+
+        async def scan_all(interests):
+            """The unindexed way: read every event's tags and score them in Python"""
+            wanted = set(interests)
+            scored = []
+            async for keys in _scan_event_batches(r):
+                async with r.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.hmget(key, "tags", "starts_at")
+                    for key, (tags, starts_at) in zip(keys, await pipe.execute()):
+                        matches = len(wanted.intersection(tags.split(",")))
+                        if matches:
+                            scored.append((-matches, starts_at, key))
+            return sorted(scored)[:10]
+
+        cold = await timed_run()
+        warm = await timed_run()
+        scans = []
+        for _, interests in queried[:5]:
+            start = time.perf_counter()
+            await scan_all(interests)
+            scans.append(time.perf_counter() - start)
+
+        pick = lambda samples, q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+        print(f"Recommendations, {event_count} events, {sample} of {volunteer_count} volunteers (db {BENCH_REDIS_DB}):")
+        print(f"  {'':>16} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"  {'indexed, cold':>16} {pick(cold, 0.5):>8.2f} {pick(cold, 0.99):>8.2f}")
+        print(f"  {'indexed, cached':>16} {pick(warm, 0.5):>8.2f} {pick(warm, 0.99):>8.2f}")
+        print(f"  {'scan all events':>16} {statistics.median(scans) * 1000:>8.0f} {max(scans) * 1000:>8.0f}")
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def bench_impact(*counts: int):
+    """Organizer impact: nightly full recompute over N past events, and one check-in.
+
+    Events belong to N/20 organizers, each with ~10 attendees. The
+    aggregation step is also timed alone against a per-event Python loop.
+    """
+    counts = counts or (100_000,)
+    r = bench_client()
+    blocking = redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD or None,
+        db=BENCH_REDIS_DB, decode_responses=True
+    )
+    try:
+        print(f"Impact scores (db {BENCH_REDIS_DB}):")
+        print(
+            f"  {'events':>8} {'full s':>7} {'numpy agg ms':>13} {'python agg ms':>14}"
+            f" {'check-in p50 ms':>16} {'p99 ms':>7}"
+        )
+        for count in counts:
+            await r.flushdb()
+            organizers = [f"organizer-{i}" for i in range(max(count // 20, 1))]
+            columns = {"organizer": [], "index": [], "attended": [], "hours": []}
+            positions = {}
+            start_day = datetime.utcnow() - timedelta(days=365)
+            for start in range(0, count, BATCH_SIZE):
+                async with r.pipeline(transaction=False) as pipe:
+                    for i in range(start, min(start + BATCH_SIZE, count)):
+                        starts_at = start_day + timedelta(hours=i % 8000)
+                        event = RedisEvent(
+                            id=f"event-{i}", organizer_id=random.choice(organizers), title=f"Cleanup {i}",
+                            capacity=50, starts_at=starts_at.isoformat(),
+                            ends_at=(starts_at + timedelta(hours=random.choice((1, 2, 3, 4)))).isoformat()
+                        )
+                        pipe.hset(event_key(event.id), mapping={**event.to_hash(), "registered": 0})
+                        attendees = random.randint(0, 20)
+                        if attendees:
+                            pipe.sadd(event_attendees_key(event.id), *[f"v-{i}-{n}" for n in range(attendees)])
+                        columns["organizer"].append(event.organizer_id)
+                        columns["index"].append(positions.setdefault(event.organizer_id, len(positions)))
+                        columns["attended"].append(attendees)
+                        columns["hours"].append(event_hours(event.starts_at, event.ends_at))
+                    await pipe.execute()
+                async with r.pipeline(transaction=False) as pipe:
+                    for organizer_id in organizers[start // 20:(start + BATCH_SIZE) // 20]:
+                        pipe.hset(user_key(organizer_id), mapping={"id": organizer_id, "role": "organizer"})
+                    await pipe.execute()
+
+            start = time.perf_counter()
+            recompute_impact_scores(blocking)
+            full = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = np.array(columns["index"])
+            attended = np.array(columns["attended"])
+            impact_score(
+                np.bincount(index, weights=attended > 0), np.bincount(index, weights=attended),
+                np.bincount(index, weights=attended * np.array(columns["hours"]))
+            )
+            vectorized = time.perf_counter() - start
+            start = time.perf_counter()
+            totals = {}
+            for organizer_id, attendees, hours in zip(columns["organizer"], columns["attended"], columns["hours"]):
+                held, attendances, volunteer_hours = totals.get(organizer_id, (0, 0, 0.0))
+                totals[organizer_id] = (held + (attendees > 0), attendances + attendees, volunteer_hours + attendees * hours)
+            for held, attendances, volunteer_hours in totals.values():
+                impact_score(held, attendances, volunteer_hours)
+            looped = time.perf_counter() - start
+
+            # Incremental: one volunteer checking in at a time
+            event = RedisEvent(
+                organizer_id=organizers[0], title="Live cleanup", capacity=1000,
+                starts_at=datetime.utcnow().isoformat()
+            )
+            volunteers = [f"live-{n}" for n in range(1000)]
+            await r.sadd(event_volunteers_key(event.id), *volunteers)
+            samples = []
+            for user_id in volunteers:
+                start = time.perf_counter()
+                await record_attendance(event, [user_id], client=r)
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            print(
+                f"  {count:>8} {full:>7.2f} {vectorized * 1000:>13.1f} {looped * 1000:>14.1f}"
+                f" {samples[len(samples) // 2] * 1000:>16.2f} {samples[int(len(samples) * 0.99)] * 1000:>7.2f}"
+            )
+        await r.flushdb()
+    finally:
+        blocking.close()
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def bench_checkin(*counts: int):
+    """N volunteers checking in at an event's start.
+
+    Half check in one scan per request, the other half in uploads of
+    CHECKIN_MAX_BATCH_SIZE scans; then every upload is replayed, which must
+    neither check anyone in twice nor pay them twice. Code verification is
+    also timed on its own.
+    """
+    counts = counts or (2000,)
+    r = bench_client()
+    try:
+        print(f"Event check-in (db {BENCH_REDIS_DB}, batches of {CHECKIN_MAX_BATCH_SIZE}):")
+        print(
+            f"  {'N':>6} {'verify us':>10} {'single scans/s':>15} {'batched scans/s':>16}"
+            f" {'replay scans/s':>15}"
+        )
+        for count in counts:
+            await r.flushdb()
+            user_ids = [f"volunteer-{i}" for i in range(count)]
+            event = await _create_event(r, count, user_ids)
+            event.starts_at = datetime.utcnow().isoformat()
+            event.points = 10
+            await r.sadd(event_volunteers_key(event.id), *user_ids)
+            codes = [make_checkin_code(event, user_id) for user_id in user_ids]
+
+            now = time.time()
+            start = time.perf_counter()
+            for code in codes:
+                verify_checkin_code(code, event.id, now)
+            verify = (time.perf_counter() - start) / count
+
+            half = count // 2
+            start = time.perf_counter()
+            for code in codes[:half]:
+                await check_in(event, [(code, None)], client=r)
+            single = half / (time.perf_counter() - start)
+
+            batches = [
+                [(code, now) for code in codes[i:i + CHECKIN_MAX_BATCH_SIZE]]
+                for i in range(half, count, CHECKIN_MAX_BATCH_SIZE)
+            ]
+            start = time.perf_counter()
+            for batch in batches:
+                results = await check_in(event, batch, client=r)
+                assert all(result["status"] == "ok" for result in results), results[:3]
+            batched = (count - half) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for batch in batches:
+                results = await check_in(event, batch, client=r)
+                assert all(result["status"] == "duplicate" for result in results), results[:3]
+            replayed = (count - half) / (time.perf_counter() - start)
+
+            async with r.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.hget(user_key(user_id), "points")
+                paid = sum(int(points or 0) for points in await pipe.execute())
+            attendees = await r.scard(event_attendees_key(event.id))
+            assert attendees == count and paid == count * event.points, (attendees, paid)
+            print(
+                f"  {count:>6} {verify * 1e6:>10.1f} {single:>15.0f} {batched:>16.0f} {replayed:>15.0f}"
+            )
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def _login_before(r, email: str, session: RedisSession, new_user: RedisUser) -> RedisUser:
+    """The calls a Google login made before open_login_session: find the
+    user, save them, save the session, save them again with last_login"""
+    async def save(user: RedisUser):
+        changed = user.dirty_fields()
+        if not changed:
+            return
+        async with r.pipeline(transaction=True) as pipe:
+            await _save_user(keys=[user_key(user.id), STATS_COUNTERS_KEY], args=_flatten(changed), client=pipe)
+            if 'email' in changed:
+                pipe.set(user_email_key(user.email), user.id)
+            if 'points' in changed or 'role' in changed:
+                pipe.zadd(LEADERBOARD_KEY, {user.id: user.points})
+            await pipe.execute()
+        user._stored = {**(user._stored or {}), **changed}
+        await r.publish(USER_INVALIDATION_CHANNEL, user.id)
+
+    user_id = await r.get(user_email_key(email))
+    user = RedisUser.from_hash(await r.hgetall(user_key(user_id))) if user_id else None
+    if user is None:
+        user = new_user
+        user.email = email
+    else:
+        user.name = new_user.name
+    await save(user)
+
+    session.user_id = user.id
+    session_data = session.to_hash()
+    expire_seconds = session.expire_seconds()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.hsetnx(USER_AGENTS_KEY, session_data['user_agent_id'], session.user_agent)
+        pipe.hset(session_key(session.id), mapping=session_data)
+        pipe.set(session_token_key(session.token), session.id, ex=expire_seconds)
+        pipe.expire(session_key(session.id), expire_seconds)
+        pipe.zadd(SESSION_EXPIRY_INDEX, {session.id: _epoch(session.expires_at)})
+        await pipe.execute()
+
+    user.last_login = datetime.utcnow().isoformat()
+    await save(user)
+    return user
+
+async def bench_logins(*counts: int):
+    """Find-or-create plus session open, as the Google callback does it.
+
+    "before" is the old sequence of calls (6 round trips for a new user, 5
+    for a returning one, with a cold user cache); "script" is
+    open_login_session, one round trip either way. Each phase runs N
+    logins, 50 in flight: first logins (users created), then the same
+    emails again. Last, 50 concurrent signups for one email, which the
+    old check-then-save let through more than once.
+    """
+    counts = counts or (5000,)
+    in_flight = 50
+    r = bench_client()
+    gate = asyncio.Semaphore(in_flight)
+
+    async def login(email: str, scripted: bool):
+        user, session = _fixture(0)
+        async with gate:
+            start = time.perf_counter()
+            if scripted:
+                await open_login_session(email, session, new_user=user, update={"name": user.name}, client=r)
+            else:
+                await _login_before(r, email, session, user)
+            return time.perf_counter() - start
+
+    try:
+        print(f"Login find-or-create + session (db {BENCH_REDIS_DB}, {in_flight} in flight):")
+        print(f"  {'N':>6} {'path':>7} {'logins':>10} {'p50 ms':>7} {'p99 ms':>7} {'logins/s':>9}")
+        for count in counts:
+            for name, scripted in (("before", False), ("script", True)):
+                await r.flushdb()
+                emails = [f"user{i}@example.com" for i in range(count)]
+                for phase in ("new", "returning"):
+                    start = time.perf_counter()
+                    latencies = sorted(await asyncio.gather(*(login(email, scripted) for email in emails)))
+                    wall = time.perf_counter() - start
+                    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                    print(
+                        f"  {count:>6} {name:>7} {phase:>10} {pick(0.5):>7.2f} {pick(0.99):>7.2f}"
+                        f" {count / wall:>9.0f}"
+                    )
+                users = int((await r.hget(STATS_COUNTERS_KEY, "users")) or 0)
+                assert users == count, (name, users)
+
+        print(f"  {in_flight} concurrent signups for one email:")
+        for name, scripted in (("before", False), ("script", True)):
+            await r.flushdb()
+            await asyncio.gather(*(login("race@example.com", scripted) for _ in range(in_flight)))
+            users = len([key async for key in r.scan_iter(user_key("*"))])
+            print(f"  {name:>14}: {users} users created")
+        await r.flushdb()
+    finally:
+        await r.aclose()
+        await r.connection_pool.disconnect()
+
+async def _scan_event_batches(r):
+    batch = []
+    async for key in r.scan_iter("event:*", count=BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+if __name__ == "__main__":
+    import sys
+
+    benchmarks = {
+        "memory": bench_memory,
+        "levels": bench_levels,
+        "registrations": bench_registrations,
+        "nearby": bench_nearby,
+        "waitlist": bench_waitlist,
+        "recommendations": bench_recommendations,
+        "impact": bench_impact,
+        "checkin": bench_checkin,
+        "logins": bench_logins,
+        "google_exchange": lambda *args: bench_google_exchange(oauth_no_docker.google_oauth, *args),
+        "google_outage": lambda *args: bench_google_outage(oauth_no_docker.google_oauth, *args),
+    }
+
+    if len(sys.argv) > 1 and sys.argv[1] in benchmarks:
+        args = [int(arg) for arg in sys.argv[2:]]
+        result = benchmarks[sys.argv[1]](*args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    else:
+        print(f"Usage: python benchmarks_no_docker.py [{'|'.join(benchmarks)}] [counts...]")
@@ -0,0 +1,133 @@
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config_no_docker import USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+
+# Pub/sub channel carrying user ids whose cached copies must be dropped
+USER_INVALIDATION_CHANNEL = "user:invalidate"
+
+# Message on that channel meaning "drop every cached user"
+INVALIDATE_ALL = "*"
+
+
+class UserCache:
+    """Per-process cache of user objects, kept coherent across workers.
+
+    Every save publishes the user id on USER_INVALIDATION_CHANNEL; each worker
+    listens and drops its copy. Concurrent misses for the same key await a
+    single Redis fetch. The TTL only bounds staleness if a message is lost.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._email_to_id: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get_by_id(self, user_id: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Return a copy of the cached user, loading it once on a miss"""
+        return await self._get_or_load(f"id:{user_id}", lambda: self._lookup(user_id), loader)
+
+    async def get_by_email(self, email: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Same as get_by_id, resolving through the email -> id map"""
+        def lookup():
+            user_id = self._email_to_id.get(email)
+            return self._lookup(user_id) if user_id else None
+        return await self._get_or_load(f"email:{email}", lookup, loader)
+
+    def invalidate(self, user_id: str):
+        """Drop a user from this process"""
+        self._generation += 1
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._email_to_id.pop(entry[0].email, None)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop everything, e.g. after the invalidation feed was interrupted"""
+        self._generation += 1
+        self._entries.clear()
+        self._email_to_id.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+    def _lookup(self, user_id: str) -> Optional[Any]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if time.time() >= expires_at:
+            self._entries.pop(user_id, None)
+            self._email_to_id.pop(user.email, None)
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def _store(self, user: Any, generation: int):
+        # Skip if an invalidation raced with the fetch
+        if generation != self._generation:
+            return
+        self._entries[user.id] = (user, time.time() + self.ttl_seconds)
+        self._entries.move_to_end(user.id)
+        self._email_to_id[user.email] = user.id
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._email_to_id.pop(evicted.email, None)
+
+    async def _get_or_load(self, key: str, lookup: Callable, loader: Callable) -> Optional[Any]:
+        user = lookup()
+        if user is not None:
+            self.hits += 1
+            return copy.copy(user)
+
+        self.misses += 1
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            user = await asyncio.shield(pending)
+            return copy.copy(user) if user is not None else None
+
+        pending = self._inflight[key] = asyncio.get_running_loop().create_future()
+        generation = self._generation
+        try:
+            user = await loader()
+            if user is not None:
+                self._store(user, generation)
+            pending.set_result(user)
+        except BaseException as e:
+            pending.set_exception(e)
+            # Nobody may be waiting; don't warn about an unretrieved exception
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        return copy.copy(user) if user is not None else None
+
+
+# Process-wide instance used by redis_models_no_docker
+user_cache = UserCache(
+    max_entries=USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=USER_CACHE_TTL_SECONDS
+)
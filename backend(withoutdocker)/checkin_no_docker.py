@@ -0,0 +1,161 @@
+"""Event check-in with signed, time-boxed codes.
+
+A registered volunteer is issued a code naming the event, the volunteer and
+the window it is valid in, signed with HMAC-SHA256. Organizer devices scan
+codes (possibly while offline) and upload them in batches; each code is
+verified from its signature and window alone, with no database lookup. The
+valid scans of a batch then go through record_attendance (one script call,
+idempotent per volunteer) and the attendees not yet paid for the event are
+awarded its points in one pipelined award_points_bulk, then marked paid.
+
+Code layout: {event id}.{user id}.{valid from}.{valid until}.{signature}
+with epoch-second bounds and a base64url, 128-bit truncated signature.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from redis import asyncio as aioredis
+from config_no_docker import (
+    CHECKIN_CODE_SECRET, CHECKIN_OPENS_MINUTES_BEFORE, CHECKIN_GRACE_MINUTES, CHECKIN_CLOCK_SKEW_SECONDS
+)
+from events_no_docker import RedisEvent, event_volunteers_key
+from impact_no_docker import record_attendance, DEFAULT_EVENT_HOURS
+from points_no_docker import award_points_bulk
+from redis_models_no_docker import redis_client
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_REASON = "event_checkin"
+
+def event_paid_key(event_id: str) -> str:
+    return f"event_checkin_paid:{event_id}"
+
+_SIGNATURE_BYTES = 16
+
+# Codes are trusted on their signature alone, so check-in needs a key of its
+# own rather than falling back to a shared (possibly default) secret
+CHECKIN_ENABLED = bool(CHECKIN_CODE_SECRET)
+if not CHECKIN_ENABLED:
+    logger.warning("CHECKIN_CODE_SECRET is not set; event check-in is disabled")
+
+# Keyed once; each code copies this instead of re-deriving the key pads
+_mac = hmac.new(CHECKIN_CODE_SECRET.encode(), digestmod=hashlib.sha256) if CHECKIN_ENABLED else None
+
+def _sign(payload: str) -> str:
+    if _mac is None:
+        raise RuntimeError("CHECKIN_CODE_SECRET must be set to sign check-in codes")
+    mac = _mac.copy()
+    mac.update(payload.encode())
+    return base64.urlsafe_b64encode(mac.digest()[:_SIGNATURE_BYTES]).rstrip(b"=").decode()
+
+def _epoch(moment: datetime) -> int:
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+def checkin_window(event: RedisEvent) -> Tuple[int, int]:
+    """Epoch seconds between which codes for `event` are accepted"""
+    starts_at = datetime.fromisoformat(event.starts_at)
+    if event.ends_at:
+        ends_at = datetime.fromisoformat(event.ends_at)
+    else:
+        ends_at = starts_at + timedelta(hours=DEFAULT_EVENT_HOURS)
+    return (
+        _epoch(starts_at - timedelta(minutes=CHECKIN_OPENS_MINUTES_BEFORE)),
+        _epoch(ends_at + timedelta(minutes=CHECKIN_GRACE_MINUTES))
+    )
+
+def make_checkin_code(event: RedisEvent, user_id: str) -> str:
+    valid_from, valid_until = checkin_window(event)
+    payload = f"{event.id}.{user_id}.{valid_from}.{valid_until}"
+    return f"{payload}.{_sign(payload)}"
+
+def verify_checkin_code(code: str, event_id: str, scanned_at: float) -> str:
+    """User id a code was issued to, if it is genuine, for `event_id` and valid at `scanned_at`.
+
+    Raises ValueError with the reason ("invalid", "wrong_event",
+    "not_yet_valid" or "expired") otherwise.
+    """
+    try:
+        payload, signature = code.rsplit(".", 1)
+        code_event_id, user_id, valid_from, valid_until = payload.split(".")
+        valid_from, valid_until = int(valid_from), int(valid_until)
+    except (AttributeError, ValueError):
+        raise ValueError("invalid")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("invalid")
+    if code_event_id != event_id:
+        raise ValueError("wrong_event")
+    if scanned_at < valid_from:
+        raise ValueError("not_yet_valid")
+    if scanned_at > valid_until:
+        raise ValueError("expired")
+    return user_id
+
+async def issue_checkin_code(event: RedisEvent, user_id: str) -> Optional[Dict]:
+    """A registered volunteer's code for `event`; None if they aren't registered"""
+    if not await redis_client.sismember(event_volunteers_key(event.id), user_id):
+        return None
+    valid_from, valid_until = checkin_window(event)
+    return {
+        "code": make_checkin_code(event, user_id),
+        "validFrom": datetime.utcfromtimestamp(valid_from).isoformat(),
+        "validUntil": datetime.utcfromtimestamp(valid_until).isoformat(),
+    }
+
+async def check_in(event: RedisEvent, scans: List[Tuple[str, Optional[float]]],
+                   organization: Optional[str] = None,
+                   client: Optional[aioredis.Redis] = None) -> List[Dict]:
+    """Check in a batch of scanned codes for `event`, awarding its points to new attendees.
+
+    `scans` are (code, scanned_at epoch seconds or None for now) pairs;
+    scan times later than now (beyond CHECKIN_CLOCK_SKEW_SECONDS) are
+    clamped to now. Returns one result per scan with status "ok",
+    "duplicate" (already checked in, including earlier in the same batch),
+    "not_registered", or the reason its code was rejected. Safe to replay:
+    a volunteer is only ever checked in, and paid, once, and a replay pays
+    anyone whose earlier payment failed.
+    """
+    now = time.time()
+    results, accepted = [], {}
+    for code, scanned_at in scans:
+        if scanned_at is None or scanned_at > now + CHECKIN_CLOCK_SKEW_SECONDS:
+            scanned_at = now
+        try:
+            user_id = verify_checkin_code(code, event.id, scanned_at)
+        except ValueError as e:
+            results.append({"user_id": None, "status": str(e)})
+            continue
+        result = {"user_id": user_id, "status": "duplicate"}
+        accepted.setdefault(user_id, result)
+        results.append(result)
+
+    if accepted:
+        attended = await record_attendance(event, list(accepted), client=client)
+        for attendance in attended:
+            accepted[attendance["user_id"]]["status"] = attendance["status"]
+        if event.points:
+            await _pay_attendees(event, attended, organization, accepted, client or redis_client)
+    return results
+
+async def _pay_attendees(event: RedisEvent, attended: List[Dict], organization: Optional[str],
+                         accepted: Dict[str, Dict], client: aioredis.Redis):
+    # Attendance and payment are separate writes, so a scan replayed after a
+    # failed payment comes back "duplicate" and must still be paid. The paid
+    # set says who has been; the per-user award id covers a payment that
+    # landed without being marked.
+    unpaid = [attendance["user_id"] for attendance in attended if attendance["status"] == "ok"]
+    duplicates = [attendance["user_id"] for attendance in attended if attendance["status"] == "duplicate"]
+    if duplicates:
+        paid = await client.smismember(event_paid_key(event.id), duplicates)
+        unpaid += [user_id for user_id, is_paid in zip(duplicates, paid) if not is_paid]
+    if not unpaid:
+        return
+    awards = await award_points_bulk(
+        unpaid, event.points, CHECKIN_REASON, f"checkin:{event.id}", organization, client=client
+    )
+    await client.sadd(event_paid_key(event.id), *unpaid)
+    for award in awards:
+        accepted[award["user_id"]]["balance"] = award["balance"]
@@ -1,25 +1,143 @@
 import os
+import sys
 from dotenv import load_dotenv
 from typing import List
 
 # Load environment variables
 load_dotenv()
 
+# Some modules are shared with the Docker backend rather than copied:
+# upstream.py, google_oauth.py and oauth_stub.py take everything they need as
+# arguments, each backend builds them from its own settings, and they are
+# imported from ../backend. Appended, so this backend's own modules win.
+_SHARED_MODULES_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+if _SHARED_MODULES_DIR not in sys.path:
+    sys.path.append(_SHARED_MODULES_DIR)
+
 # Redis Configuration (local)
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "hackathon-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", "24"))
 
+# Expired-session sweeper
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "500"))
+
+# User-object cache (kept coherent across workers via pub/sub)
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+# Keys per SCAN call / hashes per pipeline when walking all users
+USER_SCAN_BATCH_SIZE = int(os.getenv("USER_SCAN_BATCH_SIZE", "500"))
+
+# Largest page /api/leaderboard will return
+LEADERBOARD_MAX_PAGE_SIZE = int(os.getenv("LEADERBOARD_MAX_PAGE_SIZE", "100"))
+# How often workers check whether the week/month windows need rolling over
+LEADERBOARD_ROLLOVER_CHECK_SECONDS = int(os.getenv("LEADERBOARD_ROLLOVER_CHECK_SECONDS", "60"))
+
+# /api/events/nearby: default and largest date span, largest search radius
+# (or box side) and page size
+EVENTS_NEARBY_DEFAULT_DAYS = int(os.getenv("EVENTS_NEARBY_DEFAULT_DAYS", "30"))
+EVENTS_NEARBY_MAX_DAYS = int(os.getenv("EVENTS_NEARBY_MAX_DAYS", "90"))
+EVENTS_NEARBY_MAX_RADIUS_KM = float(os.getenv("EVENTS_NEARBY_MAX_RADIUS_KM", "50"))
+EVENTS_NEARBY_MAX_PAGE_SIZE = int(os.getenv("EVENTS_NEARBY_MAX_PAGE_SIZE", "50"))
+
+# Per-user recommended-events cache lifetime, and the largest list returned.
+# Candidates come from the soonest TAG_WINDOW upcoming events of each tag.
+RECOMMENDATIONS_CACHE_SECONDS = int(os.getenv("RECOMMENDATIONS_CACHE_SECONDS", "300"))
+RECOMMENDATIONS_MAX_PAGE_SIZE = int(os.getenv("RECOMMENDATIONS_MAX_PAGE_SIZE", "50"))
+RECOMMENDATIONS_TAG_WINDOW = int(os.getenv("RECOMMENDATIONS_TAG_WINDOW", "200"))
+
+# Nightly organizer impact recompute: earliest UTC hour, and how often
+# workers check whether today's run is due
+IMPACT_RECOMPUTE_HOUR_UTC = int(os.getenv("IMPACT_RECOMPUTE_HOUR_UTC", "3"))
+IMPACT_RECOMPUTE_CHECK_SECONDS = int(os.getenv("IMPACT_RECOMPUTE_CHECK_SECONDS", "300"))
+
+# Event check-in codes: signing key (check-in is disabled without one; codes
+# are trusted on their signature alone), how long before the start and after
+# the end a code is accepted, device clock skew tolerated on offline scans,
+# and the most scans one check-in request may carry
+CHECKIN_CODE_SECRET = os.getenv("CHECKIN_CODE_SECRET", "")
+CHECKIN_OPENS_MINUTES_BEFORE = int(os.getenv("CHECKIN_OPENS_MINUTES_BEFORE", "60"))
+CHECKIN_GRACE_MINUTES = int(os.getenv("CHECKIN_GRACE_MINUTES", "60"))
+CHECKIN_CLOCK_SKEW_SECONDS = int(os.getenv("CHECKIN_CLOCK_SKEW_SECONDS", "120"))
+CHECKIN_MAX_BATCH_SIZE = int(os.getenv("CHECKIN_MAX_BATCH_SIZE", "500"))
+
+# Notifications stream, its dispatcher consumer group and per-user inboxes
+NOTIFICATIONS_STREAM_MAXLEN = int(os.getenv("NOTIFICATIONS_STREAM_MAXLEN", "100000"))
+NOTIFICATIONS_BATCH_SIZE = int(os.getenv("NOTIFICATIONS_BATCH_SIZE", "200"))
+NOTIFICATIONS_BLOCK_MS = int(os.getenv("NOTIFICATIONS_BLOCK_MS", "5000"))
+NOTIFICATIONS_INBOX_SIZE = int(os.getenv("NOTIFICATIONS_INBOX_SIZE", "50"))
+
+# Points ledger (Redis Stream) and its aggregator consumer group
+POINTS_LEDGER_MAXLEN = int(os.getenv("POINTS_LEDGER_MAXLEN", "1000000"))
+POINTS_AWARD_DEDUPE_SECONDS = int(os.getenv("POINTS_AWARD_DEDUPE_SECONDS", str(7 * 24 * 3600)))
+POINTS_AGGREGATOR_BATCH_SIZE = int(os.getenv("POINTS_AGGREGATOR_BATCH_SIZE", "200"))
+POINTS_AGGREGATOR_BLOCK_MS = int(os.getenv("POINTS_AGGREGATOR_BLOCK_MS", "5000"))
+# Most points one organizer award may give (per volunteer)
+POINTS_AWARD_MAX_AMOUNT = int(os.getenv("POINTS_AWARD_MAX_AMOUNT", "500"))
+
+# How often one worker recounts the /stats counters to repair drift
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "600"))
+
 # OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://openidconnect.googleapis.com/v1/userinfo")
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = os.getenv("GOOGLE_ISSUERS", "https://accounts.google.com,accounts.google.com").split(",")
+
+# Read the Google profile from the code exchange's id_token, verified locally
+# against Google's cached signing keys, instead of calling userinfo. Userinfo
+# remains the fallback when there is no id_token or it can't be verified.
+GOOGLE_VERIFY_ID_TOKEN = os.getenv("GOOGLE_VERIFY_ID_TOKEN", "true").lower() == "true"
+GOOGLE_USERINFO_FALLBACK = os.getenv("GOOGLE_USERINFO_FALLBACK", "true").lower() == "true"
+
+# Signing-key (JWKS) cache: lifetime when the response has no max-age,
+# shortest gap between fetches (an unknown key id forces one early), and
+# retry delay after a failed background refresh
+JWKS_DEFAULT_TTL_SECONDS = int(os.getenv("JWKS_DEFAULT_TTL_SECONDS", "3600"))
+JWKS_MIN_REFRESH_SECONDS = int(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+JWKS_RETRY_SECONDS = int(os.getenv("JWKS_RETRY_SECONDS", "30"))
+
+# Outbound HTTP client shared by OAuth calls: timeouts in seconds (pool =
+# waiting for a free connection), connection limit and how long idle
+# keep-alive connections are held open
+OAUTH_HTTP_CONNECT_TIMEOUT = float(os.getenv("OAUTH_HTTP_CONNECT_TIMEOUT", "3"))
+OAUTH_HTTP_READ_TIMEOUT = float(os.getenv("OAUTH_HTTP_READ_TIMEOUT", "10"))
+OAUTH_HTTP_POOL_TIMEOUT = float(os.getenv("OAUTH_HTTP_POOL_TIMEOUT", "5"))
+OAUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("OAUTH_HTTP_MAX_CONNECTIONS", "20"))
+OAUTH_HTTP_KEEPALIVE_SECONDS = float(os.getenv("OAUTH_HTTP_KEEPALIVE_SECONDS", "60"))
+
+# Guard around calls to Google (per worker). The breaker opens when, over the
+# last WINDOW_SECONDS, at least MIN_CALLS were made and FAILURE_RATE of them
+# failed or took over SLOW_CALL_SECONDS; it stays open OPEN_SECONDS before
+# letting a probe through. At most MAX_CONCURRENCY calls are in flight, and
+# a login waits QUEUE_TIMEOUT seconds for a slot. Each call is tried up to
+# MAX_ATTEMPTS times with jittered backoff, but retries in the window are
+# capped at BUDGET_MIN plus BUDGET_RATIO of calls.
+OAUTH_BREAKER_WINDOW_SECONDS = float(os.getenv("OAUTH_BREAKER_WINDOW_SECONDS", "30"))
+OAUTH_BREAKER_MIN_CALLS = int(os.getenv("OAUTH_BREAKER_MIN_CALLS", "20"))
+OAUTH_BREAKER_FAILURE_RATE = float(os.getenv("OAUTH_BREAKER_FAILURE_RATE", "0.5"))
+OAUTH_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("OAUTH_BREAKER_SLOW_CALL_SECONDS", "2"))
+OAUTH_BREAKER_OPEN_SECONDS = float(os.getenv("OAUTH_BREAKER_OPEN_SECONDS", "15"))
+OAUTH_UPSTREAM_MAX_CONCURRENCY = int(os.getenv("OAUTH_UPSTREAM_MAX_CONCURRENCY", "20"))
+OAUTH_UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("OAUTH_UPSTREAM_QUEUE_TIMEOUT", "1"))
+OAUTH_RETRY_MAX_ATTEMPTS = int(os.getenv("OAUTH_RETRY_MAX_ATTEMPTS", "3"))
+OAUTH_RETRY_BUDGET_RATIO = float(os.getenv("OAUTH_RETRY_BUDGET_RATIO", "0.1"))
+OAUTH_RETRY_BUDGET_MIN = int(os.getenv("OAUTH_RETRY_BUDGET_MIN", "3"))
+OAUTH_RETRY_BACKOFF_SECONDS = float(os.getenv("OAUTH_RETRY_BACKOFF_SECONDS", "0.1"))
+OAUTH_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("OAUTH_RETRY_BACKOFF_MAX_SECONDS", "1"))
 
 # CORS Configuration
 CORS_ORIGINS = [
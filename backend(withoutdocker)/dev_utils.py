@@ -1,4 +1,6 @@
 import redis
+import time
+from datetime import datetime, timezone
 from config_no_docker import get_redis_url
 
 def clear_redis_data():
@@ -25,6 +27,180 @@ def list_redis_keys():
         print(f"❌ Error listing Redis keys: {e}")
         return []
 
+def list_users():
+    """Print every user, streamed in pipelined batches"""
+    from redis_models_no_docker import RedisUser
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        count = 0
+        for user in RedisUser.iter_all_sync(r):
+            print(f"  - {user.email} ({user.role}, {user.points} pts)")
+            count += 1
+        print(f"👥 {count} users")
+        return count
+    except Exception as e:
+        print(f"❌ Error listing users: {e}")
+        return 0
+
+def rebuild_leaderboard():
+    """Rebuild the points leaderboard from the user hashes.
+
+    Built under a temporary key and swapped in with RENAME; points changed
+    while this runs may need another pass.
+    """
+    from redis_models_no_docker import RedisUser, LEADERBOARD_KEY
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        staging_key = f"{LEADERBOARD_KEY}:rebuild"
+        r.delete(staging_key)
+        count = 0
+        with r.pipeline(transaction=False) as pipe:
+            for user in RedisUser.iter_all_sync(r):
+                if user.role == 'volunteer':
+                    pipe.zadd(staging_key, {user.id: user.points})
+                    count += 1
+                if len(pipe) >= 1000:
+                    pipe.execute()
+            pipe.execute()
+        if count:
+            r.rename(staging_key, LEADERBOARD_KEY)
+        else:
+            r.delete(LEADERBOARD_KEY)
+        print(f"✅ Leaderboard rebuilt with {count} volunteers")
+        return True
+    except Exception as e:
+        print(f"❌ Error rebuilding leaderboard: {e}")
+        return False
+
+def relevel_users():
+    """Re-evaluate every user's level and badges against the current rules"""
+    from levels_no_docker import recompute_all_levels
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        start = time.perf_counter()
+        result = recompute_all_levels(r)
+        print(f"✅ Re-levelled {result['changed']} of {result['scanned']} users in {time.perf_counter() - start:.1f}s")
+        return True
+    except Exception as e:
+        print(f"❌ Error re-levelling users: {e}")
+        return False
+
+def recompute_impact():
+    """Rebuild every organizer's impact score from event attendance"""
+    from impact_no_docker import recompute_impact_scores
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        start = time.perf_counter()
+        result = recompute_impact_scores(r)
+        print(
+            f"✅ Recomputed impact for {result['organizers']} organizers over {result['events']} events"
+            f" in {time.perf_counter() - start:.1f}s ({result['skipped']} left as is: check-ins during the run)"
+        )
+        return True
+    except Exception as e:
+        print(f"❌ Error recomputing impact scores: {e}")
+        return False
+
+def migrate_layout():
+    """Move users and sessions onto the single-copy layout and index sessions.
+
+    Old layout: user:{email} + user_by_id:{id}, session:{token} + session_by_id:{id}.
+    New layout: user:{id} + user_email:{email}, session:{id} + session_token:{token},
+    with user agents interned in session_user_agents. Safe to run repeatedly.
+    """
+    from redis_models_no_docker import (
+        user_key, user_email_key, session_key, session_token_key, user_agent_id,
+        USER_AGENTS_KEY, SESSION_EXPIRY_INDEX
+    )
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        users = sessions = 0
+        
+        for key in r.scan_iter("user:*", count=1000):
+            email = key[len("user:"):]
+            if "@" not in email:
+                continue  # Already canonical (user:{id})
+            user_data = r.hgetall(key)
+            if not user_data.get('id'):
+                continue
+            with r.pipeline(transaction=True) as pipe:
+                pipe.hset(user_key(user_data['id']), mapping=user_data)
+                pipe.set(user_email_key(email), user_data['id'])
+                pipe.delete(key, f"user_by_id:{user_data['id']}")
+                pipe.execute()
+            users += 1
+        
+        for key in r.scan_iter("session:*", count=1000):
+            session_data = r.hgetall(key)
+            session_id, token = session_data.get('id'), session_data.get('token')
+            if not session_id or not token:
+                continue
+            if key == session_key(token) and token != session_id:
+                # Old token-keyed copy: rewrite as session:{id}
+                ttl = r.ttl(key)
+                user_agent = session_data.pop('user_agent', '')
+                session_data['user_agent_id'] = user_agent_id(user_agent)
+                with r.pipeline(transaction=True) as pipe:
+                    if user_agent:
+                        pipe.hsetnx(USER_AGENTS_KEY, session_data['user_agent_id'], user_agent)
+                    pipe.delete(key, f"session_by_id:{session_id}")
+                    pipe.hset(session_key(session_id), mapping=session_data)
+                    pipe.set(session_token_key(token), session_id)
+                    if ttl > 0:
+                        pipe.expire(session_key(session_id), ttl)
+                        pipe.expire(session_token_key(token), ttl)
+                    pipe.zrem(SESSION_EXPIRY_INDEX, token)
+                    pipe.execute()
+                sessions += 1
+            if session_data.get('is_active') == 'True' and session_data.get('expires_at'):
+                expires_at = datetime.fromisoformat(session_data['expires_at']).replace(tzinfo=timezone.utc)
+                r.zadd(SESSION_EXPIRY_INDEX, {session_id: expires_at.timestamp()})
+        
+        print(f"✅ Migrated {users} users and {sessions} sessions")
+        return True
+    except Exception as e:
+        print(f"❌ Error migrating layout: {e}")
+        return False
+
+def reindex_tags():
+    """Rebuild the per-tag indexes of upcoming events with room, soonest first.
+
+    Also removes the tag_events:{tag} sets they replace. Every tag's
+    generation is bumped, so cached recommendations are rebuilt. Safe to
+    run repeatedly; registrations landing while it runs are corrected by
+    the registration and cancellation scripts.
+    """
+    from events_no_docker import tag_events_key, TAG_GENERATIONS_KEY
+    from redis_models_no_docker import _epoch
+    try:
+        r = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        now = datetime.utcnow().isoformat()
+        tags, indexed = set(), 0
+        with r.pipeline(transaction=False) as pipe:
+            for key in r.scan_iter("event:*", count=1000):
+                event = r.hmget(key, "id", "starts_at", "status", "capacity", "registered", "tags")
+                event_id, starts_at, status, capacity, registered, event_tags = event
+                if not event_id or not event_tags or not starts_at or starts_at <= now:
+                    continue
+                if status != 'open' or int(registered or 0) >= int(capacity or 0):
+                    continue
+                for tag in event_tags.split(","):
+                    pipe.zadd(tag_events_key(tag), {event_id: _epoch(starts_at)})
+                    tags.add(tag)
+                indexed += 1
+                if len(pipe) >= 1000:
+                    pipe.execute()
+            for tag in tags:
+                pipe.hincrby(TAG_GENERATIONS_KEY, tag, 1)
+            pipe.execute()
+        for key in r.scan_iter("tag_events:*", count=1000):
+            r.delete(key)
+        print(f"✅ Indexed {indexed} upcoming events under {len(tags)} tags")
+        return True
+    except Exception as e:
+        print(f"❌ Error reindexing tags: {e}")
+        return False
+
 if __name__ == "__main__":
     import sys
     
@@ -33,9 +209,27 @@ if __name__ == "__main__":
             clear_redis_data()
         elif sys.argv[1] == "list":
             list_redis_keys()
+        elif sys.argv[1] == "users":
+            list_users()
+        elif sys.argv[1] == "rebuild-leaderboard":
+            rebuild_leaderboard()
+        elif sys.argv[1] == "relevel":
+            relevel_users()
+        elif sys.argv[1] == "impact":
+            recompute_impact()
+        elif sys.argv[1] == "migrate-layout":
+            migrate_layout()
+        elif sys.argv[1] == "reindex-tags":
+            reindex_tags()
         else:
-            print("Usage: python dev_utils.py [clear|list]")
+            print("Usage: python dev_utils.py [clear|list|users|rebuild-leaderboard|relevel|impact|migrate-layout|reindex-tags]")
     else:
-        print("Usage: python dev_utils.py [clear|list]")
-        print("  clear - Clear all Redis data")
-        print("  list  - List all Redis keys")
\ No newline at end of file
+        print("Usage: python dev_utils.py [clear|list|users|rebuild-leaderboard|relevel|impact|migrate-layout|reindex-tags]")
+        print("  clear               - Clear all Redis data")
+        print("  list                - List all Redis keys")
+        print("  users               - List all users")
+        print("  rebuild-leaderboard - Rebuild the points leaderboard from user data")
+        print("  relevel             - Recompute levels and badges for every user")
+        print("  impact              - Recompute every organizer's impact score")
+        print("  migrate-layout      - Move to single-copy storage and index sessions")
+        print("  reindex-tags        - Rebuild the recommendations tag indexes")
\ No newline at end of file
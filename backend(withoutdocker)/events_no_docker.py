@@ -0,0 +1,522 @@
+"""Events, volunteer registrations and location search.
+
+Registration is one script call that checks the event is open, not full and
+not already joined, then adds the volunteer and bumps every counter that
+depends on it (the event's registered count, the volunteer's events_joined,
+the organizer's total_volunteers). Concurrent registrations for a popular
+event are serialized by Redis itself, so there is no lock, no WATCH retry
+loop and no way to overbook.
+
+A full event can put volunteers on a FIFO waitlist instead. Cancelling
+frees the spot and promotes the head of the waitlist in the same script,
+and the promotion notice goes onto the notifications stream.
+
+Upcoming events that still have room are indexed by interest tag, soonest
+first (see recommendations_no_docker); the registration and cancellation
+scripts take an event out of its tag indexes when it fills and put it back
+when a spot frees up.
+
+Location search uses one GEO set per event day, so a query only touches the
+days it asks about, and the radius/box filtering and distance ordering
+happen inside Redis.
+"""
+import logging
+import re
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from redis import asyncio as aioredis
+from config_no_docker import NOTIFICATIONS_STREAM_MAXLEN, RECOMMENDATIONS_TAG_WINDOW
+from notifications_no_docker import NOTIFICATIONS_KEY
+from redis_models_no_docker import redis_client, user_key, invalidate_user_cache, invalidate_user_caches, _epoch
+
+logger = logging.getLogger(__name__)
+
+# Storage layout
+#   event:{id}                 event hash
+#   event_volunteers:{id}      set of registered volunteer ids
+#   event_waitlist:{id}        waiting volunteer ids, scored by arrival order
+#   user_events:{id}           volunteer's events, scored by start time
+#   organizer_events:{id}      organizer's events, scored by start time
+#   events_geo:{YYYYMMDD}      GEO set of the events starting that (UTC) day
+#   tag_upcoming:{tag}         events with room carrying the tag, scored by start time
+#   tag_generations            tag -> counter bumped when an event joins the
+#                              soonest RECOMMENDATIONS_TAG_WINDOW of its index
+def event_key(event_id: str) -> str:
+    return f"event:{event_id}"
+
+def event_volunteers_key(event_id: str) -> str:
+    return f"event_volunteers:{event_id}"
+
+def event_waitlist_key(event_id: str) -> str:
+    return f"event_waitlist:{event_id}"
+
+def user_events_key(user_id: str) -> str:
+    return f"user_events:{user_id}"
+
+def organizer_events_key(organizer_id: str) -> str:
+    return f"organizer_events:{organizer_id}"
+
+def tag_events_key(tag: str) -> str:
+    return f"tag_upcoming:{tag}"
+
+TAG_GENERATIONS_KEY = "tag_generations"
+
+MAX_TAGS = 10
+
+def normalize_tags(tags) -> List[str]:
+    """Lowercase, hyphenated, de-duplicated tags, at most MAX_TAGS"""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    normalized = []
+    for tag in tags or []:
+        tag = re.sub(r"[^a-z0-9-]", "", re.sub(r"\s+", "-", str(tag).strip().lower()))
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized[:MAX_TAGS]
+
+def events_geo_key(day: date) -> str:
+    return f"events_geo:{day:%Y%m%d}"
+
+def _event_day(starts_at: str) -> date:
+    return datetime.fromisoformat(starts_at).date()
+
+def _geo_expire_at(day: date) -> int:
+    """A day's GEO set is kept until the end of the following day"""
+    return int(datetime.combine(day + timedelta(days=2), datetime.min.time(), timezone.utc).timestamp())
+
+# KEYS[1] = tag generations, KEYS[2..] = the event's tag indexes
+# ARGV = event id, event start (epoch seconds), now (epoch seconds), tag window,
+#        'XX' to only move an event already indexed (a reschedule; full events
+#        stay out), the event's tags (matching KEYS[2..])
+# Only bumps the generation of tags where the event lands among the soonest
+# `tag window` upcoming ones, the only part of an index recommendations read.
+_INDEX_TAGS_SCRIPT = """
+for i = 2, #KEYS do
+    local changed
+    if ARGV[5] == 'XX' then
+        changed = redis.call('ZADD', KEYS[i], 'XX', 'CH', ARGV[2], ARGV[1])
+    else
+        changed = redis.call('ZADD', KEYS[i], 'CH', ARGV[2], ARGV[1])
+    end
+    if changed == 1 and redis.call('ZCOUNT', KEYS[i], ARGV[3], '(' .. ARGV[2]) < tonumber(ARGV[4]) then
+        redis.call('HINCRBY', KEYS[1], ARGV[i + 4], 1)
+    end
+end
+"""
+_index_tags = redis_client.register_script(_INDEX_TAGS_SCRIPT)
+
+# KEYS[1] = event, KEYS[2] = event volunteers, KEYS[3] = volunteer's user hash,
+# KEYS[4] = organizer's user hash, KEYS[5] = volunteer's events, KEYS[6] = waitlist,
+# KEYS[7..] = the event's tag indexes
+# ARGV = volunteer id, event id, event start (epoch seconds), '1' to join the
+#        waitlist if full
+# Returns {status, registered count[, waitlist position]}
+_REGISTER_SCRIPT = """
+local event = redis.call('HMGET', KEYS[1], 'status', 'capacity', 'registered')
+if not event[1] then
+    return {'missing'}
+end
+if event[1] ~= 'open' then
+    return {'closed', event[3]}
+end
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+    return {'already', event[3]}
+end
+local waiting = redis.call('ZRANK', KEYS[6], ARGV[1])
+if waiting then
+    return {'waitlisted', event[3], waiting + 1}
+end
+if tonumber(event[3]) >= tonumber(event[2]) then
+    if ARGV[4] ~= '1' then
+        return {'full', event[3]}
+    end
+    local ticket = redis.call('HINCRBY', KEYS[1], 'waitlist_seq', 1)
+    redis.call('ZADD', KEYS[6], ticket, ARGV[1])
+    return {'waitlisted', event[3], redis.call('ZRANK', KEYS[6], ARGV[1]) + 1}
+end
+redis.call('SADD', KEYS[2], ARGV[1])
+local registered = redis.call('HINCRBY', KEYS[1], 'registered', 1)
+redis.call('HINCRBY', KEYS[3], 'events_joined', 1)
+redis.call('HINCRBY', KEYS[4], 'total_volunteers', 1)
+redis.call('ZADD', KEYS[5], ARGV[3], ARGV[2])
+if registered >= tonumber(event[2]) then
+    -- Full. Cached recommendations are left alone: they skip full events
+    -- when read, and are rebuilt if that leaves them short
+    for i = 7, #KEYS do
+        redis.call('ZREM', KEYS[i], ARGV[2])
+    end
+end
+return {'ok', registered}
+"""
+_register = redis_client.register_script(_REGISTER_SCRIPT)
+
+# KEYS[1] = event, KEYS[2] = event volunteers, KEYS[3] = waitlist,
+# KEYS[4] = volunteer's user hash, KEYS[5] = organizer's user hash,
+# KEYS[6] = volunteer's events, KEYS[7] = notifications stream,
+# KEYS[8] = tag generations, KEYS[9..] = the event's tag indexes
+# ARGV = volunteer id, event id, event start (epoch seconds), user key prefix,
+#        user events key prefix, notifications maxlen, now (epoch seconds),
+#        tag window, the event's tags (matching KEYS[9..])
+# The promoted volunteer is only known once the waitlist is popped, so their
+# keys are built here from the prefixes (single Redis node only).
+# Returns {status, registered count, promoted volunteer id or nil}
+_CANCEL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {'missing'}
+end
+if redis.call('ZREM', KEYS[3], ARGV[1]) == 1 then
+    return {'left_waitlist', redis.call('HGET', KEYS[1], 'registered')}
+end
+if redis.call('SREM', KEYS[2], ARGV[1]) == 0 then
+    return {'not_registered', redis.call('HGET', KEYS[1], 'registered')}
+end
+redis.call('HINCRBY', KEYS[4], 'events_joined', -1)
+redis.call('ZREM', KEYS[6], ARGV[2])
+
+-- The spot passes straight on whatever the event's status (registration may
+-- have closed since they joined the waitlist): registered and
+-- total_volunteers stay put
+local promoted = redis.call('ZPOPMIN', KEYS[3])[1]
+if promoted then
+    redis.call('SADD', KEYS[2], promoted)
+    redis.call('HINCRBY', ARGV[4] .. promoted, 'events_joined', 1)
+    redis.call('ZADD', ARGV[5] .. promoted, ARGV[3], ARGV[2])
+    redis.call('XADD', KEYS[7], 'MAXLEN', '~', ARGV[6], '*',
+        'type', 'waitlist_promoted', 'user_id', promoted, 'event_id', ARGV[2])
+    return {'ok', redis.call('HGET', KEYS[1], 'registered'), promoted}
+end
+redis.call('HINCRBY', KEYS[5], 'total_volunteers', -1)
+local registered = redis.call('HINCRBY', KEYS[1], 'registered', -1)
+local open = redis.call('HGET', KEYS[1], 'status') == 'open'
+if open and registered + 1 == tonumber(redis.call('HGET', KEYS[1], 'capacity')) then
+    -- Was full: recommendable again
+    for i = 9, #KEYS do
+        redis.call('ZADD', KEYS[i], ARGV[3], ARGV[2])
+        if redis.call('ZCOUNT', KEYS[i], ARGV[7], '(' .. ARGV[3]) < tonumber(ARGV[8]) then
+            redis.call('HINCRBY', KEYS[8], ARGV[i], 1)
+        end
+    end
+end
+return {'ok', registered}
+"""
+_cancel = redis_client.register_script(_CANCEL_SCRIPT)
+
+# KEYS = day GEO sets to search
+# ARGV = lon, lat, 'BYRADIUS' or 'BYBOX', radius or width (km), height (km, box
+#        only), cursor distance ('' for the first page), cursor event id,
+#        results already returned, limit
+# Returns event id, distance, ... for the next `limit` hits ordered by
+# (distance, id), i.e. keyset pagination that is stable across partitions.
+# No day can hold more than `returned` hits at or before the cursor, so the
+# nearest returned + limit of each day are enough to fill the page.
+_NEARBY_SCRIPT = """
+local cursor_distance = tonumber(ARGV[6])
+local cursor_id = ARGV[7]
+local per_day = tonumber(ARGV[8]) + tonumber(ARGV[9])
+local hits = {}
+for _, key in ipairs(KEYS) do
+    local found
+    if ARGV[3] == 'BYRADIUS' then
+        found = redis.call('GEOSEARCH', key, 'FROMLONLAT', ARGV[1], ARGV[2],
+            'BYRADIUS', ARGV[4], 'km', 'ASC', 'COUNT', per_day, 'WITHDIST')
+    else
+        found = redis.call('GEOSEARCH', key, 'FROMLONLAT', ARGV[1], ARGV[2],
+            'BYBOX', ARGV[4], ARGV[5], 'km', 'ASC', 'COUNT', per_day, 'WITHDIST')
+    end
+    for _, hit in ipairs(found) do
+        local distance = tonumber(hit[2])
+        if not cursor_distance or distance > cursor_distance
+                or (distance == cursor_distance and hit[1] > cursor_id) then
+            hits[#hits + 1] = {hit[1], distance, hit[2]}
+        end
+    end
+end
+table.sort(hits, function(a, b)
+    if a[2] ~= b[2] then
+        return a[2] < b[2]
+    end
+    return a[1] < b[1]
+end)
+local page = {}
+for i = 1, math.min(#hits, tonumber(ARGV[9])) do
+    page[#page + 1] = hits[i][1]
+    page[#page + 1] = hits[i][3]
+end
+return page
+"""
+_nearby = redis_client.register_script(_NEARBY_SCRIPT)
+
+class RedisEvent:
+    """Redis-based Event model"""
+
+    def __init__(self, **kwargs):
+        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.organizer_id = kwargs.get('organizer_id')
+        self.title = kwargs.get('title')
+        self.description = kwargs.get('description', '')
+        self.location = kwargs.get('location', '')
+        self.latitude = float(kwargs.get('latitude', 0.0))
+        self.longitude = float(kwargs.get('longitude', 0.0))
+        self.starts_at = kwargs.get('starts_at')
+        self.ends_at = kwargs.get('ends_at', '')
+        self.capacity = int(kwargs.get('capacity', 0))
+        self.points = int(kwargs.get('points', 0))
+        self.status = kwargs.get('status', 'open')
+        self.tags = normalize_tags(kwargs.get('tags'))
+        self.created_at = kwargs.get('created_at', datetime.utcnow().isoformat())
+
+        # Maintained by the registration script, never written by save()
+        self.registered = int(kwargs.get('registered', 0))
+
+        # Whether the event hash exists in Redis yet, and the GEO set it is in
+        self._stored = False
+        self._indexed_day: Optional[date] = None
+
+    def to_hash(self) -> Dict[str, str]:
+        """Field mapping as stored in the event hash"""
+        return {
+            'id': str(self.id),
+            'organizer_id': str(self.organizer_id),
+            'title': str(self.title or ''),
+            'description': str(self.description or ''),
+            'location': str(self.location or ''),
+            'latitude': str(self.latitude),
+            'longitude': str(self.longitude),
+            'starts_at': str(self.starts_at),
+            'ends_at': str(self.ends_at or ''),
+            'capacity': str(self.capacity),
+            'points': str(self.points),
+            'status': str(self.status),
+            'tags': ','.join(self.tags),
+            'created_at': str(self.created_at),
+        }
+
+    @classmethod
+    def from_hash(cls, event_data: Dict[str, str]) -> 'RedisEvent':
+        """Build an event from a stored hash"""
+        event = cls(**event_data)
+        event._stored = True
+        event._indexed_day = _event_day(event.starts_at)
+        return event
+
+    async def save(self):
+        """Save event to Redis; a new event also counts towards the organizer's events_organized"""
+        try:
+            day = _event_day(self.starts_at)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(event_key(self.id), mapping=self.to_hash())
+                if not self._stored:
+                    pipe.hsetnx(event_key(self.id), 'registered', 0)
+                    pipe.hincrby(user_key(self.organizer_id), 'events_organized', 1)
+                if self.tags:
+                    await _index_tags(
+                        keys=[TAG_GENERATIONS_KEY, *[tag_events_key(tag) for tag in self.tags]],
+                        args=[
+                            self.id, _epoch(self.starts_at), datetime.now(timezone.utc).timestamp(),
+                            RECOMMENDATIONS_TAG_WINDOW, "XX" if self._stored else "", *self.tags
+                        ],
+                        client=pipe
+                    )
+                pipe.zadd(organizer_events_key(self.organizer_id), {self.id: _epoch(self.starts_at)})
+                if self._indexed_day and self._indexed_day != day:
+                    pipe.zrem(events_geo_key(self._indexed_day), self.id)
+                pipe.geoadd(events_geo_key(day), (self.longitude, self.latitude, self.id))
+                pipe.expireat(events_geo_key(day), _geo_expire_at(day))
+                await pipe.execute()
+
+            self._indexed_day = day
+            if not self._stored:
+                self._stored = True
+                await invalidate_user_cache(self.organizer_id)
+
+            logger.info(f"Event saved successfully: {self.id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving event {self.id}: {e}")
+            return False
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'organizerId': self.organizer_id,
+            'title': self.title,
+            'description': self.description,
+            'location': self.location,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'startsAt': self.starts_at,
+            'endsAt': self.ends_at,
+            'capacity': self.capacity,
+            'registered': self.registered,
+            'spotsLeft': max(self.capacity - self.registered, 0),
+            'points': self.points,
+            'status': self.status,
+            'tags': self.tags,
+            'createdAt': self.created_at
+        }
+
+    @classmethod
+    async def find_by_id(cls, event_id: str) -> Optional['RedisEvent']:
+        """Find event by ID"""
+        try:
+            event_data = await redis_client.hgetall(event_key(event_id))
+            return cls.from_hash(event_data) if event_data else None
+        except Exception as e:
+            logger.error(f"Error finding event {event_id}: {e}")
+            return None
+
+    @classmethod
+    async def find_many(cls, event_ids: List[str], client: Optional[aioredis.Redis] = None) -> List['RedisEvent']:
+        """Events for a list of ids in one pipelined round trip, skipping deleted ones"""
+        async with (client or redis_client).pipeline(transaction=False) as pipe:
+            for event_id in event_ids:
+                pipe.hgetall(event_key(event_id))
+            hashes = await pipe.execute()
+        return [cls.from_hash(event_data) for event_data in hashes if event_data]
+
+async def register_for_event(event: RedisEvent, user_id: str, waitlist: bool = False,
+                             client: Optional[aioredis.Redis] = None) -> Dict:
+    """Register a volunteer for an event if there is room.
+
+    Status is "ok", "already" (registered before; nothing changes), "full",
+    "closed" or "missing". With `waitlist`, a full event puts the volunteer
+    on its waitlist instead: status "waitlisted" with their 1-based
+    `position`. `registered` is the event's count after the call.
+    """
+    result = await _register(
+        keys=[
+            event_key(event.id), event_volunteers_key(event.id), user_key(user_id),
+            user_key(event.organizer_id), user_events_key(user_id), event_waitlist_key(event.id),
+            *[tag_events_key(tag) for tag in event.tags]
+        ],
+        args=[user_id, event.id, _epoch(event.starts_at), "1" if waitlist else ""],
+        client=client or redis_client
+    )
+    status = result[0]
+    if status == "ok":
+        await invalidate_user_caches([user_id, event.organizer_id])
+    response = {
+        "event_id": event.id,
+        "status": status,
+        "registered": int(result[1]) if len(result) > 1 and result[1] is not None else None,
+    }
+    if status == "waitlisted":
+        response["position"] = int(result[2])
+    return response
+
+async def cancel_registration(event: RedisEvent, user_id: str,
+                              client: Optional[aioredis.Redis] = None) -> Dict:
+    """Give up a spot (or a waitlist place) and promote the next volunteer waiting.
+
+    Status is "ok", "left_waitlist", "not_registered" or "missing".
+    `promoted` is the volunteer who got the spot, if any. Callers refuse
+    cancellations once the event has started.
+    """
+    result = await _cancel(
+        keys=[
+            event_key(event.id), event_volunteers_key(event.id), event_waitlist_key(event.id),
+            user_key(user_id), user_key(event.organizer_id), user_events_key(user_id), NOTIFICATIONS_KEY,
+            TAG_GENERATIONS_KEY, *[tag_events_key(tag) for tag in event.tags]
+        ],
+        args=[
+            user_id, event.id, _epoch(event.starts_at), user_key(""), user_events_key(""),
+            NOTIFICATIONS_STREAM_MAXLEN, datetime.now(timezone.utc).timestamp(), RECOMMENDATIONS_TAG_WINDOW,
+            *event.tags
+        ],
+        client=client or redis_client
+    )
+    status = result[0]
+    promoted = result[2] if len(result) > 2 else None
+    if status == "ok":
+        await invalidate_user_caches([user_id, promoted or event.organizer_id])
+    return {
+        "event_id": event.id,
+        "status": status,
+        "registered": int(result[1]) if len(result) > 1 and result[1] is not None else None,
+        "promoted": promoted,
+    }
+
+async def get_waitlist_position(event_id: str, user_id: str) -> Optional[int]:
+    """1-based place on an event's waitlist, None if not waiting"""
+    rank = await redis_client.zrank(event_waitlist_key(event_id), user_id)
+    return None if rank is None else rank + 1
+
+async def get_user_events(user_id: str, organizer: bool = False, upcoming_only: bool = True) -> List[RedisEvent]:
+    """A volunteer's joined events (or an organizer's own), soonest first"""
+    key = organizer_events_key(user_id) if organizer else user_events_key(user_id)
+    low = datetime.now(timezone.utc).timestamp() if upcoming_only else "-inf"
+    event_ids = await redis_client.zrangebyscore(key, low, "+inf")
+    return await RedisEvent.find_many(event_ids)
+
+# KEYS[1] = organizer's events, KEYS[2..] = each volunteer's events
+# Returns 1 or 0 per volunteer: whether they joined any of the organizer's
+# events. Walks whichever of the two sets is smaller.
+_JOINED_ANY_SCRIPT = """
+local joined = {}
+local organized = redis.call('ZCARD', KEYS[1])
+for i = 2, #KEYS do
+    local found = 0
+    local small, large = KEYS[i], KEYS[1]
+    if organized < redis.call('ZCARD', KEYS[i]) then
+        small, large = KEYS[1], KEYS[i]
+    end
+    for _, event_id in ipairs(redis.call('ZRANGE', small, 0, -1)) do
+        if redis.call('ZSCORE', large, event_id) then
+            found = 1
+            break
+        end
+    end
+    joined[#joined + 1] = found
+end
+return joined
+"""
+_joined_any = redis_client.register_script(_JOINED_ANY_SCRIPT)
+
+async def volunteers_of(organizer_id: str, user_ids: List[str],
+                        client: Optional[aioredis.Redis] = None) -> List[str]:
+    """The user_ids registered for (so also any who attended) one of the organizer's events"""
+    if not user_ids:
+        return []
+    joined = await _joined_any(
+        keys=[organizer_events_key(organizer_id), *[user_events_key(user_id) for user_id in user_ids]],
+        client=client or redis_client
+    )
+    return [user_id for user_id, found in zip(user_ids, joined) if found]
+
+async def search_nearby(longitude: float, latitude: float, first_day: date, last_day: date,
+                        radius_km: Optional[float] = None, box_km: Optional[Tuple[float, float]] = None,
+                        cursor: Optional[str] = None, limit: int = 20,
+                        client: Optional[aioredis.Redis] = None) -> Tuple[List[Tuple[str, float]], Optional[str]]:
+    """Events starting between first_day and last_day within a radius or a
+    (width, height) box around a point, nearest first.
+
+    Returns ([(event id, distance km), ...], next cursor). The cursor is
+    opaque to callers; None means there are no more results. ValueError if
+    `cursor` is not one we returned.
+    """
+    days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    if radius_km is not None:
+        shape = ["BYRADIUS", radius_km, ""]
+    else:
+        shape = ["BYBOX", box_km[0], box_km[1]]
+    returned, cursor_distance, cursor_id = 0, "", ""
+    if cursor:
+        try:
+            returned_text, cursor_distance, cursor_id = cursor.split(":", 2)
+            returned = int(returned_text)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+
+    page = await _nearby(
+        keys=[events_geo_key(day) for day in days],
+        args=[longitude, latitude, *shape, cursor_distance, cursor_id, returned, limit + 1],
+        client=client or redis_client
+    )
+    hits = [(page[i], float(page[i + 1])) for i in range(0, len(page), 2)]
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = f"{returned + limit}:{page[2 * limit - 1]}:{hits[-1][0]}"
+    return hits, next_cursor
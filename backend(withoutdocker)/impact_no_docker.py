@@ -0,0 +1,203 @@
+"""Organizer impact scores, kept precomputed on the organizer's user hash.
+
+score = EVENT_WEIGHT * events held (at least one attendee)
+      + ATTENDEE_WEIGHT * attendances
+      + HOUR_WEIGHT * volunteer hours (attendances x event length)
+
+Each attendance updates the components and the score in the same script
+call, so the dashboard only ever reads the impact_score field. A nightly
+full recompute rebuilds every organizer's components from the events
+themselves, aggregating per organizer over numpy columns rather than one
+organizer at a time.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, List, Optional
+import numpy as np
+import redis
+from redis import asyncio as aioredis
+from config_no_docker import get_redis_url, IMPACT_RECOMPUTE_HOUR_UTC, IMPACT_RECOMPUTE_CHECK_SECONDS
+from cache_no_docker import USER_INVALIDATION_CHANNEL, INVALIDATE_ALL
+from events_no_docker import RedisEvent, event_key, event_volunteers_key
+from redis_models_no_docker import redis_client, user_key, invalidate_user_cache
+
+logger = logging.getLogger(__name__)
+
+EVENT_WEIGHT = 10
+ATTENDEE_WEIGHT = 2
+HOUR_WEIGHT = 1
+
+# Length credited for events without an end time
+DEFAULT_EVENT_HOURS = 2.0
+
+# Volunteers recorded as having attended an event
+def event_attendees_key(event_id: str) -> str:
+    return f"event_attendees:{event_id}"
+
+EVENT_KEY_PATTERN = event_key("*")
+
+def event_hours(starts_at: str, ends_at: str) -> float:
+    """Volunteer hours one attendance of an event is worth"""
+    if not ends_at:
+        return DEFAULT_EVENT_HOURS
+    seconds = (datetime.fromisoformat(ends_at) - datetime.fromisoformat(starts_at)).total_seconds()
+    return max(seconds / 3600, 0.0)
+
+def impact_score(events_held, attended, hours):
+    """Score from its components; works on scalars and numpy arrays alike"""
+    return np.floor(EVENT_WEIGHT * events_held + ATTENDEE_WEIGHT * attended + HOUR_WEIGHT * hours + 0.5)
+
+# KEYS[1] = event attendees, KEYS[2] = event volunteers, KEYS[3] = organizer's user hash
+# ARGV = event hours, event/attendee/hour weights, volunteer id...
+# Returns a status per volunteer: 'ok', 'duplicate' or 'not_registered'
+_ATTEND_SCRIPT = """
+local statuses = {}
+local added = 0
+for i = 5, #ARGV do
+    if redis.call('SISMEMBER', KEYS[2], ARGV[i]) == 0 then
+        statuses[#statuses + 1] = 'not_registered'
+    elseif redis.call('SADD', KEYS[1], ARGV[i]) == 0 then
+        statuses[#statuses + 1] = 'duplicate'
+    else
+        statuses[#statuses + 1] = 'ok'
+        added = added + 1
+    end
+end
+if added > 0 then
+    if redis.call('SCARD', KEYS[1]) == added then
+        redis.call('HINCRBY', KEYS[3], 'impact_events', 1)
+    end
+    local attended = redis.call('HINCRBY', KEYS[3], 'impact_attended', added)
+    local hours = tonumber(redis.call('HINCRBYFLOAT', KEYS[3], 'impact_hours', added * tonumber(ARGV[1])))
+    local events_held = tonumber(redis.call('HGET', KEYS[3], 'impact_events'))
+    local score = tonumber(ARGV[2]) * events_held + tonumber(ARGV[3]) * attended + tonumber(ARGV[4]) * hours
+    redis.call('HSET', KEYS[3], 'impact_score', math.floor(score + 0.5))
+end
+return statuses
+"""
+_attend = redis_client.register_script(_ATTEND_SCRIPT)
+
+async def record_attendance(event: RedisEvent, user_ids: List[str],
+                            client: Optional[aioredis.Redis] = None) -> List[Dict]:
+    """Mark registered volunteers as having attended, updating the organizer's impact.
+
+    Idempotent per volunteer. Status per volunteer is "ok", "duplicate" or
+    "not_registered".
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    statuses = await _attend(
+        keys=[event_attendees_key(event.id), event_volunteers_key(event.id), user_key(event.organizer_id)],
+        args=[event_hours(event.starts_at, event.ends_at), EVENT_WEIGHT, ATTENDEE_WEIGHT, HOUR_WEIGHT, *user_ids],
+        client=client or redis_client
+    )
+    if "ok" in statuses:
+        await invalidate_user_cache(event.organizer_id)
+    return [{"user_id": user_id, "status": status} for user_id, status in zip(user_ids, statuses)]
+
+# KEYS = organizer user hashes; ARGV = impact_attended snapshot ('' if unset),
+# events, attended, hours, score for each. Skips deleted organizers, and those
+# with check-ins since the snapshot: their incremental values already count
+# them, and the recount might not.
+_WRITE_BATCH_SCRIPT = """
+local written = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1
+            and (redis.call('HGET', key, 'impact_attended') or '') == ARGV[5 * i - 4] then
+        redis.call('HSET', key, 'impact_events', ARGV[5 * i - 3], 'impact_attended', ARGV[5 * i - 2],
+            'impact_hours', ARGV[5 * i - 1], 'impact_score', ARGV[5 * i])
+        written = written + 1
+    end
+end
+return written
+"""
+
+def recompute_impact_scores(client: redis.Redis, batch_size: int = 5000) -> Dict[str, int]:
+    """Rebuild every organizer's impact from their events' attendance.
+
+    Takes a blocking client (decode_responses=True). SCANs event hashes,
+    reading organizer and times, then attendee counts, for each batch, then
+    aggregates per organizer with numpy.bincount and writes the results back
+    in batches. Each organizer's impact_attended is snapshotted before any
+    of their events is counted; one with check-ins since then keeps their
+    incrementally updated values until the next run.
+    """
+    # Columns, one row per event; organizers are numbered as first seen
+    organizer_ids: Dict[str, int] = {}
+    snapshots: List[str] = []
+    index, hours, attended = [], [], []
+    keys = client.scan_iter(EVENT_KEY_PATTERN, count=batch_size, _type="hash")
+    while True:
+        batch = list(islice(keys, batch_size))
+        if not batch:
+            break
+        with client.pipeline(transaction=False) as pipe:
+            for key in batch:
+                pipe.hmget(key, "organizer_id", "starts_at", "ends_at")
+            events = pipe.execute()
+        events = [(key, event) for key, event in zip(batch, events) if event[0] and event[1]]
+        new_organizers = list(dict.fromkeys(
+            organizer_id for _, (organizer_id, _, _) in events if organizer_id not in organizer_ids
+        ))
+        # Snapshots are queued first, so they are taken before these counts
+        with client.pipeline(transaction=False) as pipe:
+            for organizer_id in new_organizers:
+                pipe.hget(user_key(organizer_id), "impact_attended")
+            for key, _ in events:
+                pipe.scard(event_attendees_key(key[len(event_key("")):]))
+            values = pipe.execute()
+        for organizer_id, snapshot in zip(new_organizers, values):
+            organizer_ids[organizer_id] = len(organizer_ids)
+            snapshots.append(snapshot or "")
+        for (_, (organizer_id, starts_at, ends_at)), count in zip(events, values[len(new_organizers):]):
+            index.append(organizer_ids[organizer_id])
+            hours.append(event_hours(starts_at, ends_at))
+            attended.append(count)
+
+    if not index:
+        return {"events": 0, "organizers": 0, "skipped": 0}
+    index = np.array(index, dtype=np.int64)
+    attended = np.array(attended, dtype=np.int64)
+    events_held = np.bincount(index, weights=attended > 0)
+    attendances = np.bincount(index, weights=attended)
+    volunteer_hours = np.bincount(index, weights=attended * np.array(hours))
+    scores = impact_score(events_held, attendances, volunteer_hours)
+
+    write_batch = client.register_script(_WRITE_BATCH_SCRIPT)
+    columns = [
+        snapshots, events_held.astype(np.int64).tolist(), attendances.astype(np.int64).tolist(),
+        np.round(volunteer_hours, 2).tolist(), scores.astype(np.int64).tolist()
+    ]
+    organizer_ids = list(organizer_ids)
+    written = 0
+    for start in range(0, len(organizer_ids), batch_size):
+        end = start + batch_size
+        args = [value for row in zip(*(column[start:end] for column in columns)) for value in row]
+        written += write_batch(keys=[user_key(organizer_id) for organizer_id in organizer_ids[start:end]], args=args)
+
+    client.publish(USER_INVALIDATION_CHANNEL, INVALIDATE_ALL)
+    return {"events": len(index), "organizers": len(organizer_ids), "skipped": len(organizer_ids) - written}
+
+async def run_nightly_impact_recompute():
+    """Run recompute_impact_scores once per UTC day after IMPACT_RECOMPUTE_HOUR_UTC, on one worker"""
+    while True:
+        try:
+            now = datetime.now(timezone.utc)
+            if now.hour >= IMPACT_RECOMPUTE_HOUR_UTC and await redis_client.set(
+                f"impact:recomputed:{now:%Y%m%d}", "1", nx=True, ex=2 * 86400
+            ):
+                client = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+                try:
+                    # Blocking I/O and numpy work stay off the event loop
+                    result = await asyncio.to_thread(recompute_impact_scores, client)
+                finally:
+                    client.close()
+                logger.info(f"Recomputed impact scores: {result}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Impact recompute error: {e}")
+        await asyncio.sleep(IMPACT_RECOMPUTE_CHECK_SECONDS)
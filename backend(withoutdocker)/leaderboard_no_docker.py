@@ -0,0 +1,166 @@
+"""Points leaderboards, each a sorted set of volunteer ids.
+
+- all-time: LEADERBOARD_KEY, absolute points, set by saves and incremented
+  by each award
+- per day: points earned that day, incremented by each award and expired
+  once no window needs them
+- rolling windows (week, month): the sum of the last N days, incremented
+  by each award and rebuilt with ZUNIONSTORE when the day rolls over
+- per organization: points earned from that organization's awards
+
+Ranks come from ZREVRANK/ZREVRANGE (O(log N) plus the page size); user
+details for a page are fetched with one pipelined HMGET per user. Equal
+scores are ordered by user id, so rank is a position, not a tie group.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from config_no_docker import LEADERBOARD_ROLLOVER_CHECK_SECONDS
+from redis_models_no_docker import redis_client, user_key, LEADERBOARD_KEY
+
+logger = logging.getLogger(__name__)
+
+# Rolling window name -> days covered, today included
+WINDOWS = {"week": 7, "month": 30}
+
+# Day sets outlive the longest window by a day
+DAY_KEY_TTL_SECONDS = (max(WINDOWS.values()) + 1) * 86400
+
+def day_key(day: date) -> str:
+    return f"leaderboard:day:{day:%Y%m%d}"
+
+def window_key(window: str) -> str:
+    return f"leaderboard:window:{window}"
+
+def organization_key(organization: str) -> str:
+    return f"leaderboard:org:{organization.strip().lower()}"
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def board_key(window: str = "all", organization: Optional[str] = None) -> str:
+    """Sorted set behind a leaderboard view; ValueError if there is none"""
+    if organization:
+        if window != "all":
+            raise ValueError("Organization leaderboards are all-time only")
+        return organization_key(organization)
+    if window == "all":
+        return LEADERBOARD_KEY
+    if window not in WINDOWS:
+        raise ValueError(f"window must be one of: all, {', '.join(WINDOWS)}")
+    return window_key(window)
+
+def award_boards(organization: Optional[str] = None) -> List[str]:
+    """Sorted sets an award increments: today's set first, then all-time and the windows"""
+    boards = [day_key(_today()), LEADERBOARD_KEY] + [window_key(window) for window in WINDOWS]
+    if organization and organization.strip():
+        boards.append(organization_key(organization))
+    return boards
+
+async def user_boards(client=None) -> List[str]:
+    """Every sorted set a volunteer can be on: all-time, the windows, the day
+    sets still alive and each organization's board (found by SCAN, so meant
+    for rare writes such as a role change)"""
+    client = client or redis_client
+    today = _today()
+    boards = [LEADERBOARD_KEY] + [window_key(window) for window in WINDOWS]
+    boards += [day_key(today - timedelta(days=n)) for n in range(DAY_KEY_TTL_SECONDS // 86400)]
+    boards += [key async for key in client.scan_iter(organization_key("*"), count=1000, _type="zset")]
+    return boards
+
+# Hash fields shown next to a leaderboard entry
+_ENTRY_FIELDS = ('name', 'avatar', 'level')
+
+# Rank, size and the surrounding slice in one round trip.
+# KEYS[1] = leaderboard; ARGV = user id, radius
+_AROUND_SCRIPT = """
+local rank = redis.call('ZREVRANK', KEYS[1], ARGV[1])
+if not rank then
+    return false
+end
+local start = math.max(rank - tonumber(ARGV[2]), 0)
+local slice = redis.call('ZREVRANGE', KEYS[1], start, rank + tonumber(ARGV[2]), 'WITHSCORES')
+return {rank, redis.call('ZCARD', KEYS[1]), start, slice}
+"""
+_around = redis_client.register_script(_AROUND_SCRIPT)
+
+async def _entries(ranked: List[Tuple[str, float]], first_rank: int) -> List[Dict]:
+    """Attach user details to (user id, points) pairs"""
+    if not ranked:
+        return []
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id, _ in ranked:
+            pipe.hmget(user_key(user_id), *_ENTRY_FIELDS)
+        rows = await pipe.execute()
+    
+    entries = []
+    for offset, ((user_id, points), (name, avatar, level)) in enumerate(zip(ranked, rows)):
+        if name is None and level is None:
+            continue  # User hash gone; the next rebuild drops the id
+        entries.append({
+            "rank": first_rank + offset,
+            "id": user_id,
+            "name": name,
+            "avatar": avatar,
+            "level": level,
+            "points": int(points)
+        })
+    return entries
+
+async def get_leaderboard_page(offset: int = 0, limit: int = 20, key: str = LEADERBOARD_KEY) -> Dict:
+    """One page of a leaderboard, highest points first"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        pipe.zcard(key)
+        ranked, total = await pipe.execute()
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "entries": await _entries(ranked, offset + 1)
+    }
+
+async def get_top_users(count: int = 5) -> List[Dict]:
+    """The first `count` leaderboard entries"""
+    return (await get_leaderboard_page(0, count))["entries"]
+
+async def get_rank_with_neighbours(user_id: str, radius: int = 2, key: str = LEADERBOARD_KEY) -> Optional[Dict]:
+    """A user's 1-based rank plus up to `radius` entries either side.
+
+    None if the user isn't on the leaderboard (e.g. organizers, or no points
+    in the window).
+    """
+    result = await _around(keys=[key], args=[user_id, radius])
+    if not result:
+        return None
+    rank, total, start, flat = result
+    ranked = list(zip(flat[::2], map(float, flat[1::2])))
+    return {
+        "rank": rank + 1,
+        "total": total,
+        "neighbours": await _entries(ranked, start + 1)
+    }
+
+# Rollover
+async def rebuild_windows(today: Optional[date] = None):
+    """Recompute each rolling window from its day sets, dropping days that fell out"""
+    today = today or _today()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for window, days in WINDOWS.items():
+            pipe.zunionstore(window_key(window), [day_key(today - timedelta(days=n)) for n in range(days)])
+        await pipe.execute()
+
+async def run_leaderboard_rollover():
+    """Rebuild the windows once per UTC day, on whichever worker gets there first"""
+    while True:
+        try:
+            today = _today()
+            if await redis_client.set(f"leaderboard:rolled:{today:%Y%m%d}", "1", nx=True, ex=2 * 86400):
+                await rebuild_windows(today)
+                logger.info(f"Rolled leaderboard windows over to {today}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Leaderboard rollover error: {e}")
+        await asyncio.sleep(LEADERBOARD_ROLLOVER_CHECK_SECONDS)
@@ -0,0 +1,105 @@
+"""Level and badge rules, evaluated per user or for the whole population.
+
+Both are step functions of points: the level is the highest threshold
+reached and badges is the number of milestones passed. One user is looked
+up with bisect; whole batches go through numpy.searchsorted, which applies
+the same rule to an array of points at once.
+"""
+from bisect import bisect_right
+from itertools import islice
+from typing import Dict, Tuple
+import numpy as np
+from cache_no_docker import USER_INVALIDATION_CHANNEL, INVALIDATE_ALL
+
+# (minimum points, level name), ascending
+LEVELS = [
+    (0, "Newcomer"),
+    (100, "Wave Rider"),
+    (500, "Reef Guardian"),
+    (1500, "Ocean Champion"),
+]
+
+# One badge per milestone reached
+BADGE_MILESTONES = [50, 250, 1000, 2500, 5000, 10000]
+
+_LEVEL_THRESHOLDS = [points for points, _ in LEVELS]
+_LEVEL_NAMES = np.array([name for _, name in LEVELS], dtype=object)
+_LEVEL_THRESHOLDS_ARRAY = np.array(_LEVEL_THRESHOLDS, dtype=np.int64)
+_BADGE_MILESTONES_ARRAY = np.array(BADGE_MILESTONES, dtype=np.int64)
+
+def evaluate(points: int) -> Tuple[str, int]:
+    """(level, badges) for a points balance"""
+    level = max(bisect_right(_LEVEL_THRESHOLDS, points) - 1, 0)
+    return LEVELS[level][1], bisect_right(BADGE_MILESTONES, points)
+
+def evaluate_batch(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """evaluate() over an int array: (level names, badge counts)"""
+    level = np.searchsorted(_LEVEL_THRESHOLDS_ARRAY, points, side="right") - 1
+    np.maximum(level, 0, out=level)
+    return _LEVEL_NAMES[level], np.searchsorted(_BADGE_MILESTONES_ARRAY, points, side="right")
+
+# Batch I/O for recompute_all_levels: one script call per batch instead of a
+# command per user keeps client-side protocol overhead out of the loop.
+# KEYS = user hashes; returns points, level, badges for each, flattened
+_READ_BATCH_SCRIPT = """
+local out = {}
+for i, key in ipairs(KEYS) do
+    local fields = redis.call('HMGET', key, 'points', 'level', 'badges')
+    out[3 * i - 2], out[3 * i - 1], out[3 * i] = fields[1], fields[2], fields[3]
+end
+return out
+"""
+# KEYS = user hashes; ARGV = points read, level, badges for each. Skips users
+# whose points moved since the read (or who were deleted): whoever read the
+# newer balance writes its level. Shared with the points aggregator.
+WRITE_LEVELS_SCRIPT = """
+local written = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('HGET', key, 'points') == ARGV[3 * i - 2] then
+        redis.call('HSET', key, 'level', ARGV[3 * i - 1], 'badges', ARGV[3 * i])
+        written = written + 1
+    end
+end
+return written
+"""
+
+def recompute_all_levels(client, batch_size: int = 5000) -> Dict[str, int]:
+    """Re-evaluate every user against the current rules, e.g. after a threshold change.
+
+    Takes a blocking client (decode_responses=True). SCANs user hashes, reads
+    points/level/badges for each batch in one script call, evaluates the
+    batch with numpy and writes back only the users whose level or badges
+    moved. A user whose points changed between the read and the write is
+    left alone rather than given a level for the old balance. Caches are
+    dropped with one broadcast at the end.
+    """
+    from redis_models_no_docker import USER_KEY_PATTERN
+
+    read_batch = client.register_script(_READ_BATCH_SCRIPT)
+    write_batch = client.register_script(WRITE_LEVELS_SCRIPT)
+    scanned = changed = 0
+    keys = client.scan_iter(USER_KEY_PATTERN, count=batch_size, _type="hash")
+    while True:
+        batch = list(islice(keys, batch_size))
+        if not batch:
+            break
+        values = read_batch(keys=batch)
+        stored_points, stored_levels, stored_badges = values[0::3], values[1::3], values[2::3]
+
+        exists = np.fromiter((value is not None for value in stored_points), dtype=bool, count=len(batch))
+        points = np.fromiter((int(value or 0) for value in stored_points), dtype=np.int64, count=len(batch))
+        levels, badges = evaluate_batch(points)
+        badges = badges.astype(str)
+        moved = (levels != np.array(stored_levels, dtype=object)) | (badges != np.array(stored_badges, dtype=object))
+        dirty = np.flatnonzero(exists & moved)
+        if dirty.size:
+            args = [None] * (3 * dirty.size)
+            args[0::3] = [stored_points[i] for i in dirty]
+            args[1::3] = levels[dirty].tolist()
+            args[2::3] = badges[dirty].tolist()
+            changed += write_batch(keys=[batch[i] for i in dirty], args=args)
+        scanned += len(batch)
+
+    if changed:
+        client.publish(USER_INVALIDATION_CHANNEL, INVALIDATE_ALL)
+    return {"scanned": scanned, "changed": changed}
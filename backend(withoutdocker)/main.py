@@ -1,26 +1,57 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from jose import jwt, JWTError
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional
-import httpx
 import uuid
 import logging
 
 # Import our modules
 from config_no_docker import *
-from redis_models_no_docker import RedisUser, RedisSession, get_user_count, get_active_sessions_count, test_redis_connection
+from redis_models_no_docker import (
+    RedisUser, RedisSession, get_user_count, get_active_sessions_count, get_stats_counters, test_redis_connection,
+    init_redis, close_redis, start_background_task, open_login_session
+)
+from cache_no_docker import user_cache
+from leaderboard_no_docker import (
+    get_leaderboard_page, get_rank_with_neighbours, get_top_users, board_key, run_leaderboard_rollover
+)
+from points_no_docker import award_points, award_points_bulk, run_points_aggregator
+from events_no_docker import (
+    RedisEvent, register_for_event, cancel_registration, get_user_events, search_nearby, normalize_tags,
+    volunteers_of
+)
+from recommendations_no_docker import recommend_events
+from impact_no_docker import record_attendance, run_nightly_impact_recompute
+from checkin_no_docker import issue_checkin_code, check_in, CHECKIN_ENABLED
+from notifications_no_docker import get_notifications, run_notification_dispatcher
+from oauth_no_docker import get_google_user, GoogleOAuthError, google_upstream, init_oauth, close_oauth
+from upstream import UpstreamUnavailable
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_redis()
+    start_background_task(run_points_aggregator())
+    start_background_task(run_leaderboard_rollover())
+    start_background_task(run_notification_dispatcher())
+    start_background_task(run_nightly_impact_recompute())
+    await init_oauth()
+    yield
+    await close_oauth()
+    await close_redis()
+
 # Create FastAPI app
 app = FastAPI(
     title="WaveAI API - No Docker",
     version="1.0.0",
-    description="Hackathon-ready authentication with local Redis"
+    description="Hackathon-ready authentication with local Redis",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -45,32 +76,22 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def create_session_token(user_id: str, request: Request = None) -> str:
-    """Create session token and store in Redis"""
-    token = str(uuid.uuid4())
-    expires_at = (datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)).isoformat()
-    
-    user_agent = request.headers.get("user-agent") if request else None
-    ip_address = request.client.host if request else None
-    
-    session = RedisSession(
-        user_id=user_id,
-        token=token,
-        expires_at=expires_at,
-        user_agent=user_agent,
-        ip_address=ip_address
+def new_session(request: Request = None) -> RedisSession:
+    """Unsaved session with a fresh token, expiring with the access token"""
+    return RedisSession(
+        token=str(uuid.uuid4()),
+        expires_at=(datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)).isoformat(),
+        user_agent=request.headers.get("user-agent") if request else None,
+        ip_address=request.client.host if request else None
     )
-    session.save()
-    
-    return token
 
-def get_user_from_token(token: str) -> Optional[RedisUser]:
+async def get_user_from_token(token: str) -> Optional[RedisUser]:
     """Get user from JWT token"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
         if user_id:
-            return RedisUser.find_by_id(user_id)
+            return await RedisUser.find_by_id(user_id)
         return None
     except JWTError:
         return None
@@ -82,7 +103,7 @@ async def get_current_user(request: Request) -> RedisUser:
         raise HTTPException(status_code=401, detail="No valid authorization header")
     
     token = auth_header.split(" ")[1]
-    user = get_user_from_token(token)
+    user = await get_user_from_token(token)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -92,22 +113,28 @@ async def get_current_user(request: Request) -> RedisUser:
     
     return user
 
-def create_auth_response(user: RedisUser, request: Request = None) -> dict:
-    """Create authentication response"""
+async def create_auth_response(request: Request, email: str, new_user: Optional[RedisUser] = None,
+                               update: Optional[dict] = None, fill: Optional[dict] = None) -> Optional[dict]:
+    """Find or create the user and open a session (see open_login_session).
+
+    Returns the authentication response, or None if the user exists and
+    `update` is None, or doesn't and `new_user` is None.
+    """
+    session = new_session(request)
+    status, user = await open_login_session(email, session, new_user=new_user, update=update, fill=fill)
+    if user is None:
+        return None
+    logger.info(f"Login for {email}: user {status}")
+    
     jwt_token = create_access_token(data={
         "sub": user.email,
         "user_id": user.id,
         "role": user.role
     })
     
-    session_token = create_session_token(user.id, request)
-    
-    user.last_login = datetime.utcnow().isoformat()
-    user.save()
-    
     return {
         "access_token": jwt_token,
-        "session_token": session_token,
+        "session_token": session.token,
         "token_type": "bearer",
         "expires_in": ACCESS_TOKEN_EXPIRE_HOURS * 3600,
         "user": user.to_dict()
@@ -116,14 +143,14 @@ def create_auth_response(user: RedisUser, request: Request = None) -> dict:
 # Routes
 @app.get("/")
 async def root():
-    redis_status = "✅ Connected" if test_redis_connection() else "❌ Disconnected"
+    redis_status = "✅ Connected" if await test_redis_connection() else "❌ Disconnected"
     
     return {
         "message": "WaveAI API with Local Redis is running! 🌊",
         "status": "healthy",
         "redis_status": redis_status,
-        "users_count": get_user_count(),
-        "active_sessions": get_active_sessions_count(),
+        "users_count": await get_user_count(),
+        "active_sessions": await get_active_sessions_count(),
         "features": [
             "✅ Local Redis storage",
             "✅ Google OAuth",
@@ -179,64 +206,42 @@ async def google_callback(request: Request):
         
         logger.info(f"Exchanging code for tokens...")
         
-        # Exchange code for token
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "code": code,
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "redirect_uri": redirect_uri,
-                    "grant_type": "authorization_code",
-                }
-            )
-            
-            if token_response.status_code != 200:
-                logger.error(f"Token exchange failed: {token_response.status_code} - {token_response.text}")
-                error_url = f"http://localhost:5173/auth/callback?error=token_exchange&message=Failed to exchange code for token"
-                return RedirectResponse(url=error_url)
-            
-            tokens = token_response.json()
-            
-            # Get user info
-            user_response = await client.get(
-                "https://openidconnect.googleapis.com/v1/userinfo",
-                headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        # Exchange code for token, then fetch the profile
+        try:
+            google_user = await get_google_user(code, redirect_uri)
+        except GoogleOAuthError as e:
+            logger.error(f"Google OAuth {e}")
+            message = {
+                "token_exchange": "Failed to exchange code for token",
+                "user_info": "Failed to get user information",
+            }[e.stage]
+            error_url = f"http://localhost:5173/auth/callback?error={e.stage}&message={message}"
+            return RedirectResponse(url=error_url)
+        except UpstreamUnavailable as e:
+            logger.warning(f"Google OAuth skipped: {e}")
+            error_url = (
+                f"http://localhost:5173/auth/callback?error=google_unavailable&retry_after={e.retry_after:.0f}"
+                f"&message=Google sign-in is temporarily unavailable, please try again shortly"
             )
-            
-            if user_response.status_code != 200:
-                logger.error(f"User info fetch failed: {user_response.status_code} - {user_response.text}")
-                error_url = f"http://localhost:5173/auth/callback?error=user_info&message=Failed to get user information"
-                return RedirectResponse(url=error_url)
-            
-            google_user = user_response.json()
-            logger.info(f"Got user info for: {google_user.get('email')}")
+            return RedirectResponse(url=error_url)
+        logger.info(f"Got user info for: {google_user.get('email')}")
         
-        # Find or create user
-        user = RedisUser.find_by_email(google_user["email"])
-        if not user:
-            logger.info(f"Creating new user for: {google_user['email']}")
-            user = RedisUser(
-                email=google_user["email"],
+        # Find or create the user and open a session in one round trip
+        update = {"name": google_user["name"]}
+        if "picture" in google_user:
+            update["avatar"] = google_user["picture"]
+        auth_data = await create_auth_response(
+            request, google_user["email"],
+            new_user=RedisUser(
                 name=google_user["name"],
                 avatar=google_user.get("picture", ""),
                 role="volunteer",  # Default role
                 auth_provider="google",
                 provider_id=google_user.get("sub")
-            )
-            user.save()
-        else:
-            logger.info(f"Updating existing user: {google_user['email']}")
-            # Update user info
-            user.name = google_user["name"]
-            user.avatar = google_user.get("picture", user.avatar)
-            if not user.provider_id:
-                user.provider_id = google_user.get("sub")
-            user.save()
-        
-        # Create auth response
-        auth_data = create_auth_response(user, request)
+            ),
+            update=update,
+            fill={"provider_id": google_user.get("sub") or ""}
+        )
         
         # Redirect to frontend with token
         frontend_url = f"http://localhost:5173/auth/callback?token={auth_data['access_token']}"
@@ -255,29 +260,17 @@ async def signup(request: Request):
         data = await request.json()
         logger.info(f"Signup attempt for email: {data.get('email')}")
         
-        # Check if user exists
-        existing_user = RedisUser.find_by_email(data["email"])
-        if existing_user:
-            logger.warning(f"User already exists: {data['email']}")
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        # Create user
-        user = RedisUser(
-            email=data["email"],
+        # Create the user and open a session; the email is claimed atomically
+        auth_data = await create_auth_response(request, data["email"], new_user=RedisUser(
             name=data["name"],
             role=data.get("role", "volunteer"),
             organization_name=data.get("organizationName"),
             auth_provider="local"
-        )
-        
-        if user.save():
-            logger.info(f"User created successfully: {data['email']}")
-        else:
-            logger.error(f"Failed to save user: {data['email']}")
-            raise HTTPException(status_code=500, detail="Failed to create user")
-        
-        # Create auth response
-        auth_data = create_auth_response(user, request)
+        ))
+        if auth_data is None:
+            logger.warning(f"User already exists: {data['email']}")
+            raise HTTPException(status_code=400, detail="Email already registered")
+        logger.info(f"User created successfully: {data['email']}")
         
         return auth_data
         
@@ -294,16 +287,11 @@ async def login(request: Request):
         data = await request.json()
         logger.info(f"Login attempt for email: {data.get('email')}")
         
-        user = RedisUser.find_by_email(data["email"])
-        if not user:
+        auth_data = await create_auth_response(request, data["email"], update={})
+        if auth_data is None:
             logger.warning(f"User not found: {data['email']}")
             raise HTTPException(status_code=400, detail="User not found")
         
-        logger.info(f"User found, creating auth response for: {data['email']}")
-        
-        # Create auth response
-        auth_data = create_auth_response(user, request)
-        
         return auth_data
         
     except HTTPException:
@@ -317,6 +305,19 @@ async def get_current_user_info(current_user: RedisUser = Depends(get_current_us
     """Get current user info"""
     return {"user": current_user.to_dict()}
 
+@app.put("/api/users/me/interests")
+async def update_interests(request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Replace the current user's interest tags"""
+    data = await request.json()
+    interests = data.get("interests")
+    if not isinstance(interests, list) or not all(isinstance(tag, str) for tag in interests):
+        raise HTTPException(status_code=400, detail="interests must be a list of strings")
+    
+    current_user.interests = normalize_tags(interests)
+    if not await current_user.save():
+        raise HTTPException(status_code=500, detail="Failed to save interests")
+    return {"user": current_user.to_dict()}
+
 @app.post("/api/auth/logout")
 async def logout(request: Request):
     """Logout user"""
@@ -329,9 +330,9 @@ async def logout(request: Request):
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             session_token = payload.get("session_token")
             if session_token:
-                session = RedisSession.find_by_token(session_token)
+                session = await RedisSession.find_by_token(session_token)
                 if session:
-                    session.revoke()
+                    await session.revoke()
             
             return {"message": "Logged out successfully", "success": True}
         else:
@@ -340,43 +341,354 @@ async def logout(request: Request):
         logger.error(f"Logout error: {str(e)}")
         return {"message": "Logout completed", "success": True}
 
+def _board_key(window: str, organization: Optional[str]) -> str:
+    try:
+        return board_key(window, organization)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/leaderboard")
+async def leaderboard(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=LEADERBOARD_MAX_PAGE_SIZE),
+    window: str = Query("all"),
+    organization: Optional[str] = Query(None)
+):
+    """Volunteers ranked by points (all-time, week, month or per organization), one page at a time"""
+    return await get_leaderboard_page(offset, limit, _board_key(window, organization))
+
+@app.get("/api/leaderboard/me")
+async def my_leaderboard_rank(
+    radius: int = Query(2, ge=0, le=10),
+    window: str = Query("all"),
+    organization: Optional[str] = Query(None),
+    current_user: RedisUser = Depends(get_current_user)
+):
+    """Current user's rank and the volunteers just above and below"""
+    result = await get_rank_with_neighbours(current_user.id, radius, _board_key(window, organization))
+    if result is None:
+        return {"rank": None, "total": None, "neighbours": []}
+    return result
+
+def _parse_award(data: dict) -> tuple:
+    """Validate the shared award fields of a request body"""
+    amount = data.get("amount")
+    reason = data.get("reason")
+    if not isinstance(amount, int) or isinstance(amount, bool) or not 0 < amount <= POINTS_AWARD_MAX_AMOUNT:
+        raise HTTPException(
+            status_code=400, detail=f"amount must be an integer from 1 to {POINTS_AWARD_MAX_AMOUNT}"
+        )
+    if not isinstance(reason, str) or not reason:
+        raise HTTPException(status_code=400, detail="reason is required")
+    return amount, reason, data.get("awardId")
+
+@app.post("/api/points/award")
+async def award(request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Award points to a volunteer of one of the current organizer's events"""
+    if current_user.role != "organizer":
+        raise HTTPException(status_code=403, detail="Only organizers can award points")
+    data = await request.json()
+    amount, reason, award_id = _parse_award(data)
+    user_id = data.get("userId")
+    if not isinstance(user_id, str) or not await volunteers_of(current_user.id, [user_id]):
+        raise HTTPException(status_code=403, detail="User is not registered for any of your events")
+    
+    result = await award_points(user_id, amount, reason, award_id, current_user.organization_name)
+    if result["status"] == "missing":
+        raise HTTPException(status_code=404, detail="User not found")
+    return result
+
+@app.post("/api/points/award/bulk")
+async def award_bulk(request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Award the same points to many volunteers of the current organizer's events.
+
+    Users not registered for any of them get status "not_registered".
+    """
+    if current_user.role != "organizer":
+        raise HTTPException(status_code=403, detail="Only organizers can award points")
+    data = await request.json()
+    amount, reason, award_id = _parse_award(data)
+    user_ids = data.get("userIds")
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+        raise HTTPException(status_code=400, detail="userIds must be a list of user ids")
+    
+    user_ids = list(dict.fromkeys(user_ids))
+    eligible = await volunteers_of(current_user.id, user_ids)
+    results = await award_points_bulk(eligible, amount, reason, award_id, current_user.organization_name)
+    ineligible = set(user_ids) - set(eligible)
+    results += [{"user_id": user_id, "status": "not_registered"} for user_id in user_ids if user_id in ineligible]
+    return {"results": results}
+
+def _parse_timestamp(value, field: str) -> str:
+    """ISO 8601 string -> naive UTC isoformat(), as stored"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{field} must be an ISO 8601 timestamp")
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+@app.post("/api/events")
+async def create_event(request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Create an event (organizers only)"""
+    if current_user.role != "organizer":
+        raise HTTPException(status_code=403, detail="Only organizers can create events")
+    data = await request.json()
+    title = data.get("title")
+    capacity = data.get("capacity")
+    points = data.get("points", 0)
+    if not isinstance(title, str) or not title.strip():
+        raise HTTPException(status_code=400, detail="title is required")
+    if not isinstance(capacity, int) or isinstance(capacity, bool) or capacity < 1:
+        raise HTTPException(status_code=400, detail="capacity must be a positive integer")
+    if not isinstance(points, int) or isinstance(points, bool) or points < 0:
+        raise HTTPException(status_code=400, detail="points must be a non-negative integer")
+    starts_at = _parse_timestamp(data.get("startsAt"), "startsAt")
+    ends_at = _parse_timestamp(data["endsAt"], "endsAt") if data.get("endsAt") else ""
+    if starts_at <= datetime.utcnow().isoformat():
+        raise HTTPException(status_code=400, detail="startsAt must be in the future")
+    if ends_at and ends_at < starts_at:
+        raise HTTPException(status_code=400, detail="endsAt must not be before startsAt")
+    try:
+        latitude = float(data.get("latitude", 0.0))
+        longitude = float(data.get("longitude", 0.0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be numbers")
+    # Redis GEO covers latitudes up to +/-85.05 degrees
+    if not (-85.05 <= latitude <= 85.05 and -180 <= longitude <= 180):
+        raise HTTPException(status_code=400, detail="latitude/longitude out of range")
+    
+    event = RedisEvent(
+        organizer_id=current_user.id,
+        title=title.strip(),
+        description=data.get("description", ""),
+        location=data.get("location", ""),
+        latitude=latitude,
+        longitude=longitude,
+        starts_at=starts_at,
+        ends_at=ends_at,
+        capacity=capacity,
+        points=points,
+        tags=normalize_tags(data.get("tags"))
+    )
+    if not await event.save():
+        raise HTTPException(status_code=500, detail="Failed to create event")
+    return {"event": event.to_dict()}
+
+@app.get("/api/events/mine")
+async def my_events(
+    include_past: bool = Query(False),
+    current_user: RedisUser = Depends(get_current_user)
+):
+    """Events the current user joined (or organizes), soonest first"""
+    events = await get_user_events(
+        current_user.id, organizer=current_user.role == "organizer", upcoming_only=not include_past
+    )
+    return {"events": [event.to_dict() for event in events]}
+
+@app.get("/api/events/nearby")
+async def nearby_events(
+    lat: float = Query(..., ge=-85.05, le=85.05),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, alias="radiusKm", gt=0, le=EVENTS_NEARBY_MAX_RADIUS_KM),
+    width_km: Optional[float] = Query(None, alias="widthKm", gt=0, le=EVENTS_NEARBY_MAX_RADIUS_KM),
+    height_km: Optional[float] = Query(None, alias="heightKm", gt=0, le=EVENTS_NEARBY_MAX_RADIUS_KM),
+    from_date: Optional[date] = Query(None, alias="fromDate"),
+    to_date: Optional[date] = Query(None, alias="toDate"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=EVENTS_NEARBY_MAX_PAGE_SIZE)
+):
+    """Events within radiusKm (or a widthKm x heightKm box) of a point, nearest first.
+
+    Covers events starting fromDate..toDate (UTC days, default the next
+    EVENTS_NEARBY_DEFAULT_DAYS). Pass nextCursor back as cursor for the next page.
+    """
+    box = width_km is not None or height_km is not None
+    if box == (radius_km is not None) or (box and (width_km is None or height_km is None)):
+        raise HTTPException(status_code=400, detail="Give either radiusKm or both widthKm and heightKm")
+    first_day = from_date or datetime.utcnow().date()
+    last_day = to_date or first_day + timedelta(days=EVENTS_NEARBY_DEFAULT_DAYS - 1)
+    if last_day < first_day or (last_day - first_day).days >= EVENTS_NEARBY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"toDate must be within {EVENTS_NEARBY_MAX_DAYS} days on or after fromDate"
+        )
+    
+    try:
+        hits, next_cursor = await search_nearby(
+            lng, lat, first_day, last_day,
+            radius_km=radius_km, box_km=(width_km, height_km) if box else None,
+            cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    events = {event.id: event for event in await RedisEvent.find_many([event_id for event_id, _ in hits])}
+    return {
+        "events": [
+            {**events[event_id].to_dict(), "distanceKm": distance}
+            for event_id, distance in hits if event_id in events
+        ],
+        "nextCursor": next_cursor
+    }
+
+@app.get("/api/events/recommended")
+async def recommended_events(
+    limit: int = Query(10, ge=1, le=RECOMMENDATIONS_MAX_PAGE_SIZE),
+    current_user: RedisUser = Depends(get_current_user)
+):
+    """Upcoming events with room matching the current user's interests, best match first"""
+    recommended = await recommend_events(current_user.id, current_user.interests, limit)
+    return {"events": [{**event.to_dict(), "matchingTags": matches} for event, matches in recommended]}
+
+@app.get("/api/events/{event_id}")
+async def get_event(event_id: str):
+    """Get one event"""
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return {"event": event.to_dict()}
+
+@app.post("/api/events/{event_id}/register")
+async def register_event(
+    event_id: str,
+    waitlist: bool = Query(True),
+    current_user: RedisUser = Depends(get_current_user)
+):
+    """Register the current volunteer for an event, or join its waitlist if full"""
+    if current_user.role != "volunteer":
+        raise HTTPException(status_code=403, detail="Only volunteers can register for events")
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.starts_at <= datetime.utcnow().isoformat():
+        raise HTTPException(status_code=409, detail="Event has already started")
+    
+    result = await register_for_event(event, current_user.id, waitlist=waitlist)
+    if result["status"] == "missing":
+        raise HTTPException(status_code=404, detail="Event not found")
+    if result["status"] == "closed":
+        raise HTTPException(status_code=409, detail="Event is not open for registration")
+    if result["status"] == "full":
+        raise HTTPException(status_code=409, detail="Event is full")
+    return result
+
+@app.delete("/api/events/{event_id}/register")
+async def cancel_event_registration(event_id: str, current_user: RedisUser = Depends(get_current_user)):
+    """Cancel the current user's registration (or leave the waitlist); the next volunteer waiting is promoted"""
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.starts_at <= datetime.utcnow().isoformat():
+        raise HTTPException(status_code=400, detail="Event has already started")
+    
+    result = await cancel_registration(event, current_user.id)
+    if result["status"] == "missing":
+        raise HTTPException(status_code=404, detail="Event not found")
+    if result["status"] == "not_registered":
+        raise HTTPException(status_code=404, detail="Not registered for this event")
+    return result
+
+@app.post("/api/events/{event_id}/attendance")
+async def mark_attendance(event_id: str, request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Record which registered volunteers turned up (the event's organizer only)"""
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.organizer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the event's organizer can record attendance")
+    data = await request.json()
+    user_ids = data.get("userIds")
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids):
+        raise HTTPException(status_code=400, detail="userIds must be a list of user ids")
+    
+    return {"results": await record_attendance(event, user_ids)}
+
+@app.get("/api/events/{event_id}/checkin-code")
+async def get_checkin_code(event_id: str, current_user: RedisUser = Depends(get_current_user)):
+    """Current volunteer's signed check-in code for an event they're registered for"""
+    if not CHECKIN_ENABLED:
+        raise HTTPException(status_code=503, detail="Check-in is not configured")
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    code = await issue_checkin_code(event, current_user.id)
+    if code is None:
+        raise HTTPException(status_code=404, detail="Not registered for this event")
+    return code
+
+@app.post("/api/events/{event_id}/checkins")
+async def event_checkins(event_id: str, request: Request, current_user: RedisUser = Depends(get_current_user)):
+    """Check in a batch of scanned codes, e.g. uploaded by a device that was offline (the event's organizer only)"""
+    if not CHECKIN_ENABLED:
+        raise HTTPException(status_code=503, detail="Check-in is not configured")
+    event = await RedisEvent.find_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.organizer_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the event's organizer can check volunteers in")
+    data = await request.json()
+    scans = data.get("scans")
+    if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+        raise HTTPException(status_code=400, detail="scans must be a list of {code, scannedAt}")
+    if len(scans) > CHECKIN_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {CHECKIN_MAX_BATCH_SIZE} scans per request")
+    
+    parsed = []
+    for scan in scans:
+        scanned_at = None
+        if scan.get("scannedAt") is not None:
+            scanned_at = datetime.fromisoformat(_parse_timestamp(scan["scannedAt"], "scannedAt"))
+            scanned_at = scanned_at.replace(tzinfo=timezone.utc).timestamp()
+        parsed.append((scan.get("code"), scanned_at))
+    
+    return {"results": await check_in(event, parsed, current_user.organization_name)}
+
+@app.get("/api/notifications")
+async def notifications(
+    limit: int = Query(20, ge=1, le=NOTIFICATIONS_INBOX_SIZE),
+    current_user: RedisUser = Depends(get_current_user)
+):
+    """Current user's most recent notifications, newest first"""
+    return {"notifications": await get_notifications(current_user.id, limit)}
+
 @app.get("/api/auth/health")
 async def health_check():
-    """Health check for Redis and API"""
-    redis_status = test_redis_connection()
+    """Health check for Redis, the API and this worker's Google circuit breaker"""
+    redis_status = await test_redis_connection()
+    google_upstream_status = google_upstream.snapshot()
     
     return {
-        "status": "healthy" if redis_status else "degraded",
+        "status": "healthy" if redis_status and google_upstream_status["state"] == "closed" else "degraded",
         "redis": "connected" if redis_status else "disconnected",
         "timestamp": datetime.utcnow().isoformat(),
         "environment": ENVIRONMENT,
-        "google_oauth": bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)
+        "google_oauth": bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET),
+        "google_upstream": google_upstream_status
     }
 
 @app.get("/stats")
 async def get_stats():
     """Get system stats"""
     try:
-        all_users = RedisUser.get_all_users()
-        volunteers = sum(1 for user in all_users if user.role == "volunteer")
-        organizers = sum(1 for user in all_users if user.role == "organizer")
+        counters = await get_stats_counters()
         
         return {
             "users": {
-                "total": len(all_users),
-                "volunteers": volunteers,
-                "organizers": organizers
+                "total": counters.get("users", 0),
+                "volunteers": counters.get("users:volunteer", 0),
+                "organizers": counters.get("users:organizer", 0)
             },
             "sessions": {
-                "active": get_active_sessions_count()
+                "active": await get_active_sessions_count()
             },
             "redis": {
-                "connected": test_redis_connection(),
+                "connected": await test_redis_connection(),
                 "url": REDIS_URL
             },
+            "user_cache": user_cache.stats(),
             "top_users": [
-                {"name": user.name, "points": user.points, "level": user.level}
-                for user in sorted(all_users, key=lambda x: x.points, reverse=True)[:5]
+                {"name": entry["name"], "points": entry["points"], "level": entry["level"]}
+                for entry in await get_top_users(5)
             ]
         }
     except Exception as e:
@@ -389,11 +701,9 @@ async def debug_redis():
     """Debug Redis contents"""
     try:
         from redis_models_no_docker import redis_client
-        if not redis_client:
-            return {"error": "Redis not connected"}
         
         # Get all keys
-        all_keys = redis_client.keys("*")
+        all_keys = await redis_client.keys("*")
         
         result = {
             "total_keys": len(all_keys),
@@ -404,11 +714,11 @@ async def debug_redis():
         
         # Get user data
         for key in all_keys:
-            if key.startswith("user:") and not key.startswith("user_by_id:"):
-                user_data = redis_client.hgetall(key)
+            if key.startswith("user:"):
+                user_data = await redis_client.hgetall(key)
                 result["users"][key] = user_data
-            elif key.startswith("session:") and not key.startswith("session_by_id:"):
-                session_data = redis_client.hgetall(key)
+            elif key.startswith("session:"):
+                session_data = await redis_client.hgetall(key)
                 result["sessions"][key] = session_data
         
         return result
@@ -420,12 +730,10 @@ async def clear_redis():
     """Clear all Redis data - USE WITH CAUTION"""
     try:
         from redis_models_no_docker import redis_client
-        if not redis_client:
-            return {"error": "Redis not connected"}
         
-        keys_before = len(redis_client.keys("*"))
-        redis_client.flushall()
-        keys_after = len(redis_client.keys("*"))
+        keys_before = await redis_client.dbsize()
+        await redis_client.flushall()
+        keys_after = await redis_client.dbsize()
         
         return {
             "message": "All Redis data cleared successfully",
@@ -462,10 +770,10 @@ async def test_user_creation():
             auth_provider="manual_test"
         )
         
-        saved = user.save()
+        saved = await user.save()
         
         # Try to retrieve the user
-        retrieved_user = RedisUser.find_by_email(test_email)
+        retrieved_user = await RedisUser.find_by_email(test_email)
         
         return {
             "test_email": test_email,
@@ -0,0 +1,48 @@
+"""User notifications: produced onto a stream, delivered to per-user inboxes.
+
+Producers (usually Lua scripts, so a notification is written atomically with
+the change it reports) XADD to NOTIFICATIONS_KEY. The dispatcher consumer
+group moves each entry into the recipient's capped inbox list, which the
+frontend reads through /api/notifications.
+"""
+import json
+import logging
+from typing import Dict, List, Optional
+from config_no_docker import NOTIFICATIONS_INBOX_SIZE, NOTIFICATIONS_BATCH_SIZE, NOTIFICATIONS_BLOCK_MS
+from redis_models_no_docker import redis_client, run_consumer
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_KEY = "notifications"
+DISPATCHER_GROUP = "notification-dispatcher"
+
+def inbox_key(user_id: str) -> str:
+    return f"notifications_inbox:{user_id}"
+
+async def deliver_notifications(entries: list) -> int:
+    """Push each entry onto its recipient's inbox, then ack them. Returns the number delivered."""
+    if not entries:
+        return 0
+    delivered = 0
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for entry_id, fields in entries:
+            if not fields or not fields.get("user_id"):
+                continue  # Trimmed from the stream before we got to it
+            notification = {"id": entry_id, **fields}
+            pipe.lpush(inbox_key(fields["user_id"]), json.dumps(notification))
+            pipe.ltrim(inbox_key(fields["user_id"]), 0, NOTIFICATIONS_INBOX_SIZE - 1)
+            delivered += 1
+        pipe.xack(NOTIFICATIONS_KEY, DISPATCHER_GROUP, *[entry_id for entry_id, _ in entries])
+        await pipe.execute()
+    return delivered
+
+async def get_notifications(user_id: str, limit: int = NOTIFICATIONS_INBOX_SIZE) -> List[Dict]:
+    """A user's most recent notifications, newest first"""
+    return [json.loads(item) for item in await redis_client.lrange(inbox_key(user_id), 0, limit - 1)]
+
+async def run_notification_dispatcher(consumer: Optional[str] = None):
+    """Consume NOTIFICATIONS_KEY as part of DISPATCHER_GROUP until cancelled"""
+    await run_consumer(
+        NOTIFICATIONS_KEY, DISPATCHER_GROUP, deliver_notifications,
+        NOTIFICATIONS_BATCH_SIZE, NOTIFICATIONS_BLOCK_MS, consumer
+    )
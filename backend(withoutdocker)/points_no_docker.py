@@ -0,0 +1,156 @@
+"""Points awards: an append-only ledger stream plus an atomic balance.
+
+An award is one script call that HINCRBYs the user's points, ZINCRBYs the
+leaderboards and XADDs a ledger entry, so concurrent awards never overwrite
+each other. Level and badge updates happen off the request path: the
+aggregator consumer group reads the ledger and applies them in batches.
+"""
+import logging
+from typing import Dict, List, Optional
+from redis import asyncio as aioredis
+from config_no_docker import (
+    POINTS_LEDGER_MAXLEN, POINTS_AWARD_DEDUPE_SECONDS,
+    POINTS_AGGREGATOR_BATCH_SIZE, POINTS_AGGREGATOR_BLOCK_MS
+)
+from leaderboard_no_docker import award_boards, DAY_KEY_TTL_SECONDS
+from levels_no_docker import evaluate, WRITE_LEVELS_SCRIPT
+from redis_models_no_docker import (
+    redis_client, user_key, invalidate_user_cache, invalidate_user_caches, run_consumer
+)
+
+logger = logging.getLogger(__name__)
+
+LEDGER_KEY = "points:ledger"
+AGGREGATOR_GROUP = "points-aggregator"
+
+# Marks an award id as applied so retried requests don't pay out twice
+def award_marker_key(award_id: str) -> str:
+    return f"points:award:{award_id}"
+
+# KEYS[1] = user hash, KEYS[2] = ledger, KEYS[3] = award marker,
+# KEYS[4] = today's leaderboard set, KEYS[5..] = all-time and the other
+# period/segment boards
+# ARGV = user id, amount, reason, award id ('' for none), dedupe TTL, ledger maxlen,
+#        day set TTL, organization ('' for none)
+_AWARD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {'missing'}
+end
+if ARGV[4] ~= '' then
+    if not redis.call('SET', KEYS[3], '1', 'NX', 'EX', ARGV[5]) then
+        return {'duplicate', redis.call('HGET', KEYS[1], 'points')}
+    end
+end
+local balance = redis.call('HINCRBY', KEYS[1], 'points', ARGV[2])
+if redis.call('HGET', KEYS[1], 'role') == 'volunteer' then
+    for i = 4, #KEYS do
+        redis.call('ZINCRBY', KEYS[i], ARGV[2], ARGV[1])
+    end
+    redis.call('EXPIRE', KEYS[4], ARGV[7])
+end
+local entry = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[6], '*',
+    'user_id', ARGV[1], 'amount', ARGV[2], 'reason', ARGV[3], 'award_id', ARGV[4],
+    'organization', ARGV[8], 'balance', balance)
+return {'ok', balance, entry}
+"""
+_award = redis_client.register_script(_AWARD_SCRIPT)
+_write_levels = redis_client.register_script(WRITE_LEVELS_SCRIPT)
+
+def _award_call(user_id: str, amount: int, reason: str, award_id: Optional[str],
+                organization: Optional[str]) -> dict:
+    return {
+        "keys": [user_key(user_id), LEDGER_KEY, award_marker_key(award_id or "")] + award_boards(organization),
+        "args": [
+            user_id, amount, reason, award_id or "", POINTS_AWARD_DEDUPE_SECONDS, POINTS_LEDGER_MAXLEN,
+            DAY_KEY_TTL_SECONDS, organization or ""
+        ],
+    }
+
+def _award_result(user_id: str, result: list) -> Dict:
+    status = result[0]
+    return {
+        "user_id": user_id,
+        "status": status,
+        "balance": int(result[1]) if len(result) > 1 and result[1] is not None else None,
+        "entry_id": result[2] if len(result) > 2 else None,
+    }
+
+async def award_points(user_id: str, amount: int, reason: str, award_id: Optional[str] = None,
+                       organization: Optional[str] = None) -> Dict:
+    """Add `amount` (may be negative) to a user's points and record it.
+
+    Volunteers' awards also count towards today's, this week's and this
+    month's leaderboards, and the awarding organization's. Passing the same
+    award_id again within POINTS_AWARD_DEDUPE_SECONDS is a no-op reported as
+    status "duplicate". Status "missing" means no such user.
+    """
+    result = _award_result(user_id, await _award(**_award_call(user_id, amount, reason, award_id, organization)))
+    if result["status"] == "ok":
+        await invalidate_user_cache(user_id)
+    return result
+
+async def award_points_bulk(user_ids: List[str], amount: int, reason: str,
+                            award_id: Optional[str] = None, organization: Optional[str] = None,
+                            client: Optional[aioredis.Redis] = None) -> List[Dict]:
+    """award_points for many users in one pipelined round trip.
+
+    Each user is awarded atomically on its own; award_id is scoped per user.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    async with (client or redis_client).pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            per_user_id = f"{award_id}:{user_id}" if award_id else None
+            await _award(**_award_call(user_id, amount, reason, per_user_id, organization), client=pipe)
+        raw = await pipe.execute()
+
+    results = [_award_result(user_id, result) for user_id, result in zip(user_ids, raw)]
+    awarded = [result["user_id"] for result in results if result["status"] == "ok"]
+    if awarded:
+        await invalidate_user_caches(awarded)
+    return results
+
+# Aggregation
+async def apply_ledger_entries(entries: list) -> int:
+    """Bring level and badges up to date for the users in `entries`, then ack them.
+
+    Works from each user's current balance rather than the entry itself, so
+    replays and out-of-order delivery converge. The write is skipped for a
+    user whose balance moved since it was read: another award is in the
+    ledger for them, and whoever reads the newer balance levels from it.
+    Returns the users touched.
+    """
+    if not entries:
+        return 0
+    entry_ids = [entry_id for entry_id, _ in entries]
+    user_ids = list(dict.fromkeys(fields["user_id"] for _, fields in entries if fields))
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.hmget(user_key(user_id), "points", "level", "badges")
+        rows = await pipe.execute()
+
+    releveled, args = [], []
+    for user_id, (points, level, badges) in zip(user_ids, rows):
+        if points is None:
+            continue  # User deleted since the award
+        new_level, new_badges = evaluate(int(points))
+        if new_level != level or str(new_badges) != badges:
+            releveled.append(user_id)
+            args += [points, new_level, new_badges]
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if releveled:
+            await _write_levels(keys=[user_key(user_id) for user_id in releveled], args=args, client=pipe)
+        pipe.xack(LEDGER_KEY, AGGREGATOR_GROUP, *entry_ids)
+        await pipe.execute()
+
+    if releveled:
+        await invalidate_user_caches(releveled)
+    return len(user_ids)
+
+async def run_points_aggregator(consumer: Optional[str] = None):
+    """Consume the ledger as part of AGGREGATOR_GROUP until cancelled"""
+    await run_consumer(
+        LEDGER_KEY, AGGREGATOR_GROUP, apply_ledger_entries,
+        POINTS_AGGREGATOR_BATCH_SIZE, POINTS_AGGREGATOR_BLOCK_MS, consumer
+    )
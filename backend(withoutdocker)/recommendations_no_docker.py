@@ -0,0 +1,140 @@
+"""Event recommendations from volunteers' interest tags.
+
+The tag_upcoming:{tag} sorted sets kept by events_no_docker are an inverted
+index from tag to the upcoming events that still have room, scored by start
+time. One script call turns a volunteer's interests into ranked candidates:
+it reads the soonest RECOMMENDATIONS_TAG_WINDOW open events with room of
+each tag, counts how many of the volunteer's tags each one carries, and
+ranks them by that count, then by start time, before cutting the list. The
+work is bounded by tags x window however popular a tag is; an event carrying
+several tags but past the window of one of them is counted under the tags it
+is within.
+
+Each user's list is cached together with the generation of every tag it
+was built from. An event joining the window of a tag (created, or a spot
+freed up) bumps that tag's generation, so only lists that could now rank
+it are rebuilt. Events filling up or starting just drop out of lists when
+they are read, and a cached list left short by them is rebuilt.
+"""
+import json
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from redis import asyncio as aioredis
+from config_no_docker import RECOMMENDATIONS_CACHE_SECONDS, RECOMMENDATIONS_TAG_WINDOW
+from events_no_docker import RedisEvent, event_key, tag_events_key, TAG_GENERATIONS_KEY
+from redis_models_no_docker import redis_client
+
+def recommendations_key(user_id: str) -> str:
+    return f"recommendations:{user_id}"
+
+# KEYS = tag indexes
+# ARGV = now (epoch seconds), tag window, number of candidates wanted, event key prefix
+# Drops events that have started from the indexes on the way. Closed events
+# stay indexed (they can reopen) but are read past, so each tag still
+# contributes a full window of open events with room.
+# Returns event id, matching tag count, ... best first
+_CANDIDATES_SCRIPT = """
+local window, wanted = tonumber(ARGV[2]), tonumber(ARGV[3])
+local matches, starts, ids, has_room = {}, {}, {}, {}
+for _, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', '(' .. ARGV[1])
+    local taken, offset = 0, 0
+    while taken < window do
+        local found = redis.call('ZRANGE', key, offset, offset + window - 1, 'WITHSCORES')
+        if #found == 0 then
+            break
+        end
+        for i = 1, #found, 2 do
+            local event_id = found[i]
+            if has_room[event_id] == nil then
+                local event = redis.call('HMGET', ARGV[4] .. event_id, 'status', 'capacity', 'registered')
+                has_room[event_id] = event[1] == 'open' and (tonumber(event[3]) or 0) < (tonumber(event[2]) or 0)
+            end
+            if taken < window and has_room[event_id] then
+                taken = taken + 1
+                if matches[event_id] then
+                    matches[event_id] = matches[event_id] + 1
+                else
+                    matches[event_id] = 1
+                    starts[event_id] = tonumber(found[i + 1])
+                    ids[#ids + 1] = event_id
+                end
+            end
+        end
+        offset = offset + window
+    end
+end
+table.sort(ids, function(a, b)
+    if matches[a] ~= matches[b] then
+        return matches[a] > matches[b]
+    end
+    if starts[a] ~= starts[b] then
+        return starts[a] < starts[b]
+    end
+    return a < b
+end)
+local out = {}
+for i = 1, math.min(#ids, wanted) do
+    out[#out + 1] = ids[i]
+    out[#out + 1] = matches[ids[i]]
+end
+return out
+"""
+_candidates = redis_client.register_script(_CANDIDATES_SCRIPT)
+
+async def _build(user_id: str, tags: List[str], wanted: int, client: aioredis.Redis) -> List[Tuple[str, int]]:
+    flat = await _candidates(
+        keys=[tag_events_key(tag) for tag in tags],
+        args=[datetime.now(timezone.utc).timestamp(), RECOMMENDATIONS_TAG_WINDOW, wanted, event_key("")],
+        client=client
+    )
+    return [(flat[i], int(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+async def recommend_events(user_id: str, interests: List[str], limit: int = 20,
+                           client: Optional[aioredis.Redis] = None) -> List[Tuple[RedisEvent, int]]:
+    """Upcoming events with room for a volunteer, most matching tags first, then soonest.
+
+    Returns (event, matching tag count) pairs.
+    """
+    client = client or redis_client
+    tags = sorted(interests)
+    if not tags:
+        return []
+    wanted = 2 * limit  # Headroom for events that filled or started since being cached
+
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.get(recommendations_key(user_id))
+        pipe.hmget(TAG_GENERATIONS_KEY, tags)
+        cached, generations = await pipe.execute()
+    generations = [int(generation or 0) for generation in generations]
+
+    candidates = None
+    if cached:
+        cached = json.loads(cached)
+        if cached["tags"] == tags and cached["generations"] == generations and cached["wanted"] >= wanted:
+            candidates = [tuple(candidate) for candidate in cached["events"]]
+    if candidates is not None:
+        upcoming = await _with_room(candidates, client)
+        if len(upcoming) >= limit or len(candidates) < wanted:
+            return upcoming[:limit]
+        # Too many cached events filled up or closed since: the index has
+        # dropped or skips them, so a rebuild refills from past the old list
+
+    candidates = await _build(user_id, tags, wanted, client)
+    await client.set(
+        recommendations_key(user_id),
+        json.dumps({"tags": tags, "generations": generations, "wanted": wanted, "events": candidates}),
+        ex=RECOMMENDATIONS_CACHE_SECONDS
+    )
+    return (await _with_room(candidates, client))[:limit]
+
+async def _with_room(candidates: List[Tuple[str, int]], client: aioredis.Redis) -> List[Tuple[RedisEvent, int]]:
+    """The candidates still upcoming, open and not full, best first"""
+    matches = dict(candidates)
+    now = datetime.utcnow().isoformat()
+    upcoming = [
+        (event, matches[event.id]) for event in await RedisEvent.find_many(list(matches), client=client)
+        if event.starts_at > now and event.status == "open" and event.registered < event.capacity
+    ]
+    upcoming.sort(key=lambda pair: (-pair[1], pair[0].starts_at))
+    return upcoming
@@ -1,21 +1,131 @@
-import redis
+import asyncio
+import hashlib
 import json
+import os
+import socket
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
-from config_no_docker import get_redis_url
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, AsyncIterator, Awaitable, Callable, Iterator, Tuple
+import redis
+from redis import asyncio as aioredis
+from redis.exceptions import ResponseError, WatchError
+from config_no_docker import (
+    get_redis_url, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT,
+    SESSION_SWEEP_INTERVAL_SECONDS, SESSION_SWEEP_BATCH_SIZE, USER_SCAN_BATCH_SIZE,
+    STATS_RECONCILE_INTERVAL_SECONDS
+)
+from cache_no_docker import user_cache, USER_INVALIDATION_CHANNEL, INVALIDATE_ALL
+from levels_no_docker import evaluate
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redis connection
-try:
-    redis_client = redis.Redis.from_url(get_redis_url(), decode_responses=True)
-    redis_client.ping()
-    print("✅ Redis connected successfully")
-except Exception as e:
-    print(f"❌ Redis connection failed: {e}")
-    redis_client = None
+# Redis connection: one bounded pool per worker, opened lazily and checked
+# by init_redis() from the app lifespan. When all connections are busy callers
+# wait up to REDIS_POOL_TIMEOUT seconds instead of failing.
+redis_pool = aioredis.BlockingConnectionPool.from_url(
+    get_redis_url(),
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    decode_responses=True
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# Storage layout: one canonical hash per entity plus small pointer keys
+#   user:{id}              user hash
+#   user_email:{email}     -> user id
+#   session:{id}           session hash (expires with the session)
+#   session_token:{token}  -> session id (expires with the session)
+#   session_user_agents    user agent id -> user agent string, shared by sessions
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+def user_email_key(email: str) -> str:
+    return f"user_email:{email}"
+
+def session_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+def session_token_key(token: str) -> str:
+    return f"session_token:{token}"
+
+USER_KEY_PATTERN = user_key("*")
+USER_AGENTS_KEY = "session_user_agents"
+
+# Sorted set of volunteer ids scored by points, kept in step by RedisUser.save
+LEADERBOARD_KEY = "leaderboard:points"
+
+# Sorted set of live session ids scored by expires_at (epoch seconds). Lets
+# the sweeper and the active count work without scanning the keyspace.
+SESSION_EXPIRY_INDEX = "sessions:expiry"
+
+# User counters behind /stats (users, users:{role}), kept in step by
+# _save_user and periodically recounted by reconcile_stats_counters().
+# Active sessions are counted from SESSION_EXPIRY_INDEX instead.
+STATS_COUNTERS_KEY = "stats:counters"
+_STATS_RECONCILE_LOCK_KEY = "stats:reconcile:lock"
+
+# Write user fields and adjust the user/role counters from the stored role,
+# so the counts stay right whichever worker or code path saves.
+# KEYS[1] = user key, KEYS[2] = counters; ARGV = field, value, ...
+_SAVE_USER_SCRIPT = """
+local existed = redis.call('EXISTS', KEYS[1])
+local old_role = redis.call('HGET', KEYS[1], 'role')
+redis.call('HSET', KEYS[1], unpack(ARGV))
+local new_role = redis.call('HGET', KEYS[1], 'role')
+if existed == 0 then
+    redis.call('HINCRBY', KEYS[2], 'users', 1)
+end
+if old_role ~= new_role then
+    if old_role then
+        redis.call('HINCRBY', KEYS[2], 'users:' .. old_role, -1)
+    end
+    if new_role then
+        redis.call('HINCRBY', KEYS[2], 'users:' .. new_role, 1)
+    end
+end
+"""
+_save_user = redis_client.register_script(_SAVE_USER_SCRIPT)
+
+# In-process copy of interned user agents; there are few distinct ones
+_user_agents: Dict[str, str] = {}
+
+def user_agent_id(user_agent: Optional[str]) -> str:
+    """Short stable id under which a user agent string is interned"""
+    if not user_agent:
+        return ''
+    return hashlib.sha1(user_agent.encode()).hexdigest()[:16]
+
+async def lookup_user_agent(agent_id: str) -> str:
+    """Resolve an interned user agent id back to the string"""
+    if not agent_id:
+        return ''
+    user_agent = _user_agents.get(agent_id)
+    if user_agent is None:
+        user_agent = await redis_client.hget(USER_AGENTS_KEY, agent_id) or ''
+        if user_agent and len(_user_agents) < 10000:
+            _user_agents[agent_id] = user_agent
+    return user_agent
+
+def _epoch(iso_timestamp: str) -> float:
+    """Naive UTC isoformat() string -> epoch seconds"""
+    return datetime.fromisoformat(iso_timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+def _flatten(fields: Dict[str, str]) -> list:
+    return [item for pair in fields.items() for item in pair]
+
+async def _scan_batches(client: aioredis.Redis, pattern: str, batch_size: int) -> AsyncIterator[List[str]]:
+    """SCAN for hash keys matching pattern, grouped into lists of batch_size"""
+    batch = []
+    async for key in client.scan_iter(pattern, count=batch_size, _type="hash"):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 class RedisUser:
     """Redis-based User model"""
@@ -31,11 +141,15 @@ class RedisUser:
         self.points = int(kwargs.get('points', 0))
         self.level = kwargs.get('level', 'Newcomer')
         self.badges = int(kwargs.get('badges', 0))
+        self.events_joined = int(kwargs.get('events_joined', 0))
+        interests = kwargs.get('interests') or []
+        self.interests = [tag for tag in interests.split(',') if tag] if isinstance(interests, str) else list(interests)
         
         # Organizer stats
         self.organization_name = kwargs.get('organization_name', '')
         self.events_organized = int(kwargs.get('events_organized', 0))
         self.total_volunteers = int(kwargs.get('total_volunteers', 0))
+        self.impact_score = int(kwargs.get('impact_score', 0))
         self.is_verified = bool(kwargs.get('is_verified', False))
         
         # Meta
@@ -46,37 +160,106 @@ class RedisUser:
         # OAuth
         self.auth_provider = kwargs.get('auth_provider', 'local')
         self.provider_id = kwargs.get('provider_id', '')
-    
-    def save(self):
-        """Save user to Redis"""
-        if not redis_client:
-            logger.error("Redis client not available")
-            return False
         
+        # Hash as last read from/written to Redis; None until persisted
+        self._stored: Optional[Dict[str, str]] = None
+    
+    def to_hash(self) -> Dict[str, str]:
+        """Field mapping as stored in the user hash"""
+        return {
+            'id': str(self.id),
+            'email': str(self.email or ''),
+            'name': str(self.name or ''),
+            'avatar': str(self.avatar or ''),
+            'role': str(self.role),
+            'points': str(self.points),
+            'level': str(self.level),
+            'badges': str(self.badges),
+            'events_joined': str(self.events_joined),
+            'interests': ','.join(self.interests),
+            'organization_name': str(self.organization_name or ''),
+            'events_organized': str(self.events_organized),
+            'total_volunteers': str(self.total_volunteers),
+            'impact_score': str(self.impact_score),
+            'is_verified': str(self.is_verified),
+            'is_active': str(self.is_active),
+            'created_at': str(self.created_at),
+            'last_login': str(self.last_login or ''),
+            'auth_provider': str(self.auth_provider),
+            'provider_id': str(self.provider_id or '')
+        }
+    
+    def dirty_fields(self) -> Dict[str, str]:
+        """Fields whose value differs from what is stored in Redis"""
+        current = self.to_hash()
+        if self._stored is None:
+            return current
+        return {name: value for name, value in current.items() if self._stored.get(name) != value}
+    
+    @classmethod
+    def from_hash(cls, user_data: Dict[str, str]) -> 'RedisUser':
+        """Build a user from a stored hash"""
+        # Convert string values back to appropriate types
+        user = cls(
+            id=user_data.get('id'),
+            email=user_data.get('email'),
+            name=user_data.get('name'),
+            avatar=user_data.get('avatar'),
+            role=user_data.get('role'),
+            points=int(user_data.get('points', 0)),
+            level=user_data.get('level'),
+            badges=int(user_data.get('badges', 0)),
+            events_joined=int(user_data.get('events_joined', 0)),
+            interests=user_data.get('interests', ''),
+            organization_name=user_data.get('organization_name'),
+            events_organized=int(user_data.get('events_organized', 0)),
+            total_volunteers=int(user_data.get('total_volunteers', 0)),
+            impact_score=int(user_data.get('impact_score', 0)),
+            is_verified=user_data.get('is_verified', 'False').lower() == 'true',
+            is_active=user_data.get('is_active', 'True').lower() == 'true',
+            created_at=user_data.get('created_at'),
+            last_login=user_data.get('last_login'),
+            auth_provider=user_data.get('auth_provider'),
+            provider_id=user_data.get('provider_id')
+        )
+        user._stored = dict(user_data)
+        return user
+    
+    async def save(self):
+        """Save user to Redis, writing only the fields changed since load"""
         try:
-            user_data = {
-                'id': str(self.id),
-                'email': str(self.email or ''),
-                'name': str(self.name or ''),
-                'avatar': str(self.avatar or ''),
-                'role': str(self.role),
-                'points': str(self.points),
-                'level': str(self.level),
-                'badges': str(self.badges),
-                'organization_name': str(self.organization_name or ''),
-                'events_organized': str(self.events_organized),
-                'total_volunteers': str(self.total_volunteers),
-                'is_verified': str(self.is_verified),
-                'is_active': str(self.is_active),
-                'created_at': str(self.created_at),
-                'last_login': str(self.last_login or ''),
-                'auth_provider': str(self.auth_provider),
-                'provider_id': str(self.provider_id or '')
-            }
+            if self._stored is None or self._stored.get('points') != str(self.points):
+                self.level, self.badges = evaluate(self.points)
+            changed = self.dirty_fields()
+            if not changed:
+                return True
+            boards = [LEADERBOARD_KEY]
+            if 'role' in changed and self.role != 'volunteer' and self._stored:
+                # No longer a volunteer: off the window and organization boards too
+                from leaderboard_no_docker import user_boards
+                boards = await user_boards()
             
-            # Save with both email and ID as keys
-            redis_client.hset(f"user:{self.email}", mapping=user_data)
-            redis_client.hset(f"user_by_id:{self.id}", mapping=user_data)
+            # One canonical hash plus an email -> id pointer, written together
+            async with redis_client.pipeline(transaction=True) as pipe:
+                await _save_user(
+                    keys=[user_key(self.id), STATS_COUNTERS_KEY],
+                    args=_flatten(changed),
+                    client=pipe
+                )
+                if 'email' in changed:
+                    pipe.set(user_email_key(self.email), self.id)
+                    if self._stored and self._stored.get('email'):
+                        pipe.delete(user_email_key(self._stored['email']))
+                if 'points' in changed or 'role' in changed:
+                    if self.role == 'volunteer':
+                        pipe.zadd(LEADERBOARD_KEY, {self.id: self.points})
+                    else:
+                        for board in boards:
+                            pipe.zrem(board, self.id)
+                await pipe.execute()
+            
+            self._stored = {**(self._stored or {}), **changed}
+            await invalidate_user_cache(self.id)
             
             logger.info(f"User saved successfully: {self.email}")
             return True
@@ -95,9 +278,12 @@ class RedisUser:
             'points': self.points,
             'level': self.level,
             'badges': self.badges,
+            'eventsJoined': self.events_joined,
+            'interests': self.interests,
             'organizationName': self.organization_name,
             'eventsOrganized': self.events_organized,
             'totalVolunteers': self.total_volunteers,
+            'impactScore': self.impact_score,
             'isVerified': self.is_verified,
             'isActive': self.is_active,
             'joinedAt': self.created_at,
@@ -107,94 +293,67 @@ class RedisUser:
         }
     
     @classmethod
-    def find_by_email(cls, email: str) -> Optional['RedisUser']:
+    async def find_by_email(cls, email: str) -> Optional['RedisUser']:
         """Find user by email"""
-        if not redis_client:
-            return None
-        
+        return await user_cache.get_by_email(email, lambda: cls._load_by_email(email))
+    
+    @classmethod
+    async def find_by_id(cls, user_id: str) -> Optional['RedisUser']:
+        """Find user by ID"""
+        return await user_cache.get_by_id(user_id, lambda: cls._load_by_id(user_id))
+    
+    @classmethod
+    async def _load_by_email(cls, email: str) -> Optional['RedisUser']:
         try:
-            user_data = redis_client.hgetall(f"user:{email}")
-            if user_data:
-                # Convert string values back to appropriate types
-                converted_data = {
-                    'id': user_data.get('id'),
-                    'email': user_data.get('email'),
-                    'name': user_data.get('name'),
-                    'avatar': user_data.get('avatar'),
-                    'role': user_data.get('role'),
-                    'points': int(user_data.get('points', 0)),
-                    'level': user_data.get('level'),
-                    'badges': int(user_data.get('badges', 0)),
-                    'organization_name': user_data.get('organization_name'),
-                    'events_organized': int(user_data.get('events_organized', 0)),
-                    'total_volunteers': int(user_data.get('total_volunteers', 0)),
-                    'is_verified': user_data.get('is_verified', 'False').lower() == 'true',
-                    'is_active': user_data.get('is_active', 'True').lower() == 'true',
-                    'created_at': user_data.get('created_at'),
-                    'last_login': user_data.get('last_login'),
-                    'auth_provider': user_data.get('auth_provider'),
-                    'provider_id': user_data.get('provider_id')
-                }
-                return cls(**converted_data)
-            return None
+            user_id = await redis_client.get(user_email_key(email))
+            return await cls._load_by_id(user_id) if user_id else None
         except Exception as e:
             logger.error(f"Error finding user by email {email}: {e}")
             return None
     
     @classmethod
-    def find_by_id(cls, user_id: str) -> Optional['RedisUser']:
-        """Find user by ID"""
-        if not redis_client:
-            return None
-        
+    async def _load_by_id(cls, user_id: str) -> Optional['RedisUser']:
         try:
-            user_data = redis_client.hgetall(f"user_by_id:{user_id}")
-            if user_data:
-                # Convert string values back to appropriate types
-                converted_data = {
-                    'id': user_data.get('id'),
-                    'email': user_data.get('email'),
-                    'name': user_data.get('name'),
-                    'avatar': user_data.get('avatar'),
-                    'role': user_data.get('role'),
-                    'points': int(user_data.get('points', 0)),
-                    'level': user_data.get('level'),
-                    'badges': int(user_data.get('badges', 0)),
-                    'organization_name': user_data.get('organization_name'),
-                    'events_organized': int(user_data.get('events_organized', 0)),
-                    'total_volunteers': int(user_data.get('total_volunteers', 0)),
-                    'is_verified': user_data.get('is_verified', 'False').lower() == 'true',
-                    'is_active': user_data.get('is_active', 'True').lower() == 'true',
-                    'created_at': user_data.get('created_at'),
-                    'last_login': user_data.get('last_login'),
-                    'auth_provider': user_data.get('auth_provider'),
-                    'provider_id': user_data.get('provider_id')
-                }
-                return cls(**converted_data)
-            return None
+            user_data = await redis_client.hgetall(user_key(user_id))
+            return cls.from_hash(user_data) if user_data else None
         except Exception as e:
             logger.error(f"Error finding user by ID {user_id}: {e}")
             return None
     
     @classmethod
-    def get_all_users(cls) -> List['RedisUser']:
-        """Get all users"""
-        if not redis_client:
-            return []
-        
-        try:
-            user_keys = redis_client.keys("user:*")
-            users = []
-            for key in user_keys:
-                if not key.startswith("user_by_id:"):
-                    email = key.replace("user:", "")
-                    user = cls.find_by_email(email)
-                    if user:
-                        users.append(user)
-            return users
-        except Exception as e:
-            logger.error(f"Error getting all users: {e}")
-            return []
+    async def iter_all(cls, batch_size: int = USER_SCAN_BATCH_SIZE,
+                       client: Optional[aioredis.Redis] = None) -> AsyncIterator['RedisUser']:
+        """Stream every user: SCAN for keys, HGETALL them in pipelined batches.
+
+        Bypasses the user cache. Like SCAN itself, a user may be yielded twice
+        if the keyspace is rehashed mid-walk, and users written during the walk
+        may or may not appear.
+        """
+        client = client or redis_client
+        async for keys in _scan_batches(client, USER_KEY_PATTERN, batch_size):
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                hashes = await pipe.execute()
+            for user_data in hashes:
+                if user_data:
+                    yield cls.from_hash(user_data)
+    
+    @classmethod
+    def iter_all_sync(cls, client: redis.Redis, batch_size: int = USER_SCAN_BATCH_SIZE) -> Iterator['RedisUser']:
+        """iter_all for scripts using a blocking client (decode_responses=True)"""
+        keys = client.scan_iter(USER_KEY_PATTERN, count=batch_size, _type="hash")
+        while True:
+            batch = list(islice(keys, batch_size))
+            if not batch:
+                return
+            with client.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hgetall(key)
+                hashes = pipe.execute()
+            for user_data in hashes:
+                if user_data:
+                    yield cls.from_hash(user_data)
 
 class RedisSession:
     """Redis-based Session model"""
@@ -209,30 +368,41 @@ class RedisSession:
         self.user_agent = kwargs.get('user_agent', '')
         self.ip_address = kwargs.get('ip_address', '')
     
-    def save(self):
+    def to_hash(self) -> Dict[str, str]:
+        """Field mapping as stored in the session hash (user agent interned)"""
+        return {
+            'id': str(self.id),
+            'user_id': str(self.user_id),
+            'token': str(self.token),
+            'expires_at': str(self.expires_at),
+            'is_active': str(self.is_active),
+            'created_at': str(self.created_at),
+            'user_agent_id': user_agent_id(self.user_agent),
+            'ip_address': str(self.ip_address or '')
+        }
+    
+    def expire_seconds(self) -> int:
+        """Seconds until expires_at (at least 1), for the key TTLs"""
+        return max(1, int(_epoch(self.expires_at) - datetime.now(timezone.utc).timestamp()))
+    
+    async def save(self):
         """Save session to Redis"""
-        if not redis_client:
-            return False
-        
         try:
-            session_data = {
-                'id': str(self.id),
-                'user_id': str(self.user_id),
-                'token': str(self.token),
-                'expires_at': str(self.expires_at),
-                'is_active': str(self.is_active),
-                'created_at': str(self.created_at),
-                'user_agent': str(self.user_agent or ''),
-                'ip_address': str(self.ip_address or '')
-            }
-            
-            redis_client.hset(f"session:{self.token}", mapping=session_data)
-            redis_client.hset(f"session_by_id:{self.id}", mapping=session_data)
+            session_data = self.to_hash()
+            expire_seconds = self.expire_seconds()
             
-            # Set expiration
-            expire_seconds = 24 * 60 * 60  # 24 hours
-            redis_client.expire(f"session:{self.token}", expire_seconds)
-            redis_client.expire(f"session_by_id:{self.id}", expire_seconds)
+            # One canonical hash plus a token -> id pointer, written together
+            async with redis_client.pipeline(transaction=True) as pipe:
+                if self.user_agent:
+                    pipe.hsetnx(USER_AGENTS_KEY, session_data['user_agent_id'], self.user_agent)
+                pipe.hset(session_key(self.id), mapping=session_data)
+                pipe.set(session_token_key(self.token), self.id, ex=expire_seconds)
+                pipe.expire(session_key(self.id), expire_seconds)
+                if self.is_active:
+                    pipe.zadd(SESSION_EXPIRY_INDEX, {self.id: _epoch(self.expires_at)})
+                else:
+                    pipe.zrem(SESSION_EXPIRY_INDEX, self.id)
+                await pipe.execute()
             
             return True
         except Exception as e:
@@ -240,91 +410,381 @@ class RedisSession:
             return False
     
     @classmethod
-    def find_by_token(cls, token: str) -> Optional['RedisSession']:
+    async def find_by_token(cls, token: str) -> Optional['RedisSession']:
         """Find session by token"""
-        if not redis_client:
-            return None
-        
         try:
-            session_data = redis_client.hgetall(f"session:{token}")
+            session_id = await redis_client.get(session_token_key(token))
+            if not session_id:
+                return None
+            session_data = await redis_client.hgetall(session_key(session_id))
             if session_data and session_data.get('is_active') == 'True':
-                return cls(**session_data)
+                user_agent = await lookup_user_agent(session_data.pop('user_agent_id', ''))
+                return cls(user_agent=user_agent, **session_data)
             return None
         except Exception as e:
             logger.error(f"Error finding session: {e}")
             return None
     
-    def revoke(self):
+    async def revoke(self):
         """Revoke session"""
-        if not redis_client:
-            return False
-        
         try:
             self.is_active = False
-            redis_client.hset(f"session:{self.token}", "is_active", "False")
-            redis_client.hset(f"session_by_id:{self.id}", "is_active", "False")
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(session_key(self.id), "is_active", "False")
+                pipe.zrem(SESSION_EXPIRY_INDEX, self.id)
+                await pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Error revoking session: {e}")
             return False
 
+# Login in one round trip: find or create the user by email, patch their
+# profile and open a session (hash, token pointer, expiry index). The email
+# pointer is claimed with SETNX, so concurrent signups for one address can't
+# both create a user. An existing user's key is derived server-side, so this
+# assumes a single (non-cluster) Redis.
+# KEYS[1] = email pointer, KEYS[2] = new user's hash, KEYS[3] = counters,
+# KEYS[4] = leaderboard, KEYS[5] = session, KEYS[6] = session token pointer,
+# KEYS[7] = session expiry index, KEYS[8] = user agents
+# ARGV[1] = new user id ('' to never create), ARGV[2] = user key prefix,
+# ARGV[3] = 'update' or 'reject' for an existing user, ARGV[4] = session id,
+# ARGV[5] = session TTL, ARGV[6] = session expiry (epoch), ARGV[7] = user
+# agent id, ARGV[8] = user agent, ARGV[9] = invalidation channel,
+# ARGV[10..12] = counts of new user, update and fill items, followed by
+# those field, value items and then the session's
+_LOGIN_SCRIPT = """
+local n_new, n_update, n_fill = tonumber(ARGV[10]), tonumber(ARGV[11]), tonumber(ARGV[12])
+local first = 13
+local created = n_new > 0 and redis.call('SETNX', KEYS[1], ARGV[1]) == 1
+local user_id = ARGV[1]
+if not created then
+    local owner = redis.call('GET', KEYS[1])
+    if owner and redis.call('EXISTS', ARGV[2] .. owner) == 1 then
+        if ARGV[3] ~= 'update' then
+            return {'exists'}
+        end
+        user_id = owner
+    elseif n_new > 0 then
+        -- Pointer left behind by a deleted user: take it over
+        redis.call('SET', KEYS[1], user_id)
+        created = true
+    else
+        return {'missing'}
+    end
+end
+
+local user = ARGV[2] .. user_id
+if created then
+    redis.call('HSET', user, unpack(ARGV, first, first + n_new - 1))
+    local role = redis.call('HGET', user, 'role')
+    redis.call('HINCRBY', KEYS[3], 'users', 1)
+    redis.call('HINCRBY', KEYS[3], 'users:' .. role, 1)
+    if role == 'volunteer' then
+        redis.call('ZADD', KEYS[4], redis.call('HGET', user, 'points'), user_id)
+    end
+else
+    if n_update > 0 then
+        redis.call('HSET', user, unpack(ARGV, first + n_new, first + n_new + n_update - 1))
+    end
+    for i = first + n_new + n_update, first + n_new + n_update + n_fill - 1, 2 do
+        local current = redis.call('HGET', user, ARGV[i])
+        if not current or current == '' then
+            redis.call('HSET', user, ARGV[i], ARGV[i + 1])
+        end
+    end
+    redis.call('PUBLISH', ARGV[9], user_id)
+end
+
+redis.call('HSET', KEYS[5], 'user_id', user_id, unpack(ARGV, first + n_new + n_update + n_fill))
+redis.call('EXPIRE', KEYS[5], ARGV[5])
+redis.call('SET', KEYS[6], ARGV[4], 'EX', ARGV[5])
+redis.call('ZADD', KEYS[7], ARGV[6], ARGV[4])
+if ARGV[8] ~= '' then
+    redis.call('HSETNX', KEYS[8], ARGV[7], ARGV[8])
+end
+return {created and 'created' or 'updated', redis.call('HGETALL', user)}
+"""
+_login = redis_client.register_script(_LOGIN_SCRIPT)
+
+async def open_login_session(email: str, session: RedisSession, new_user: Optional[RedisUser] = None,
+                             update: Optional[Dict[str, str]] = None, fill: Optional[Dict[str, str]] = None,
+                             client: Optional[aioredis.Redis] = None) -> Tuple[str, Optional[RedisUser]]:
+    """Find or create the user with `email` and open `session` for them, in one script call.
+
+    If no user has the email, `new_user` (when given) is created. An
+    existing user gets `update` written over their fields and `fill` written
+    to fields that are still empty; with `update` None they are refused.
+    last_login is stamped either way. Returns (status, user): "created" or
+    "updated" with the stored user, or "exists" / "missing" with None when
+    no session was opened. `update` and `fill` must not touch email, role
+    or points, whose indexes are only kept in step on creation.
+    """
+    client = client or redis_client
+    now = datetime.utcnow().isoformat()
+    new_fields = {}
+    if new_user is not None:
+        new_user.email = email
+        new_user.last_login = now
+        new_user.level, new_user.badges = evaluate(new_user.points)
+        new_fields = new_user.to_hash()
+    if update is not None:
+        update = {**update, 'last_login': now}
+    fill = fill or {}
+    session_fields = session.to_hash()
+    del session_fields['user_id']
+
+    result = await _login(
+        keys=[
+            user_email_key(email), user_key(new_user.id if new_user else ''), STATS_COUNTERS_KEY, LEADERBOARD_KEY,
+            session_key(session.id), session_token_key(session.token), SESSION_EXPIRY_INDEX, USER_AGENTS_KEY
+        ],
+        args=[
+            new_user.id if new_user else '', user_key(''), 'reject' if update is None else 'update',
+            session.id, session.expire_seconds(), _epoch(session.expires_at),
+            session_fields['user_agent_id'], session.user_agent or '', USER_INVALIDATION_CHANNEL,
+            len(new_fields) * 2, len(update or {}) * 2, len(fill) * 2,
+            *_flatten(new_fields), *_flatten(update or {}), *_flatten(fill), *_flatten(session_fields)
+        ],
+        client=client
+    )
+    if len(result) == 1:
+        return result[0], None
+    status, fields = result
+    user = RedisUser.from_hash(dict(zip(fields[::2], fields[1::2])))
+    session.user_id = user.id
+    # Other workers are told by the script's PUBLISH
+    user_cache.invalidate(user.id)
+    return status, user
+
+# Background tasks started by init_redis (or start_background_task),
+# cancelled by close_redis
+_background_tasks: List[asyncio.Task] = []
+
+def start_background_task(coro) -> asyncio.Task:
+    """Run a coroutine until close_redis(), e.g. a stream consumer"""
+    task = asyncio.create_task(coro)
+    _background_tasks.append(task)
+    return task
+
+# Pending entries idle this long are taken over from a dead consumer
+_CLAIM_IDLE_MS = 60000
+
+async def _ensure_group(stream: str, group: str):
+    try:
+        await redis_client.xgroup_create(stream, group, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+async def run_consumer(stream: str, group: str, handler: Callable[[list], Awaitable],
+                       batch_size: int, block_ms: int, consumer: Optional[str] = None):
+    """Consume `stream` as part of consumer group `group` until cancelled.
+
+    Each batch of (entry id, fields) entries is passed to `handler`, which
+    acks them. Every worker runs one consumer; the group spreads entries
+    between them, and entries a dead worker read but never acked are claimed
+    after _CLAIM_IDLE_MS.
+    """
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    group_ready = False
+    last_claim = 0.0
+    while True:
+        try:
+            if not group_ready:
+                await _ensure_group(stream, group)
+                group_ready = True
+
+            if time.monotonic() - last_claim >= _CLAIM_IDLE_MS / 1000:
+                last_claim = time.monotonic()
+                claimed = await redis_client.xautoclaim(
+                    stream, group, consumer, min_idle_time=_CLAIM_IDLE_MS, count=batch_size
+                )
+                await handler(claimed[1])
+
+            response = await redis_client.xreadgroup(
+                group, consumer, {stream: ">"}, count=batch_size, block=block_ms
+            )
+            for _, entries in response or []:
+                await handler(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{group} consumer error: {e}")
+            group_ready = False
+            await asyncio.sleep(1)
+
+# User cache coherence
+
+async def invalidate_user_cache(user_id: str):
+    """Drop a user from this worker and broadcast to the others"""
+    user_cache.invalidate(user_id)
+    try:
+        await redis_client.publish(USER_INVALIDATION_CHANNEL, user_id)
+    except Exception as e:
+        logger.error(f"Could not publish user invalidation: {e}")
+
+async def invalidate_user_caches(user_ids: List[str]):
+    """invalidate_user_cache for many users with one pipelined publish"""
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.publish(USER_INVALIDATION_CHANNEL, user_id)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not publish user invalidations: {e}")
+
+async def _listen_for_invalidations():
+    while True:
+        try:
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(USER_INVALIDATION_CHANNEL)
+                # Anything could have changed while we weren't subscribed
+                user_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        if message["data"] == INVALIDATE_ALL:
+                            user_cache.clear()
+                        else:
+                            user_cache.invalidate(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"User invalidation listener error: {e}")
+            user_cache.clear()
+            await asyncio.sleep(1)
+
+async def _sweep_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+        swept = await cleanup_expired_sessions()
+        if swept:
+            logger.info(f"Swept {swept} expired sessions")
+
+async def reconcile_stats_counters(attempts: int = 3) -> Optional[Dict[str, int]]:
+    """Recount users and roles and overwrite the counters.
+
+    Repairs drift from writes made outside _save_user. The counters key is
+    WATCHed during the recount, so a save landing mid-count aborts the
+    overwrite and the recount is retried. Returns None if it never settled.
+    """
+    for _ in range(attempts):
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await pipe.watch(STATS_COUNTERS_KEY)
+            counters = {"users": 0}
+            async for user in RedisUser.iter_all():
+                counters["users"] += 1
+                role_field = f"users:{user.role}"
+                counters[role_field] = counters.get(role_field, 0) + 1
+            
+            pipe.multi()
+            pipe.delete(STATS_COUNTERS_KEY)
+            pipe.hset(STATS_COUNTERS_KEY, mapping=counters)
+            try:
+                await pipe.execute()
+                return counters
+            except WatchError:
+                continue
+    return None
+
+async def get_stats_counters() -> Dict[str, int]:
+    """Current user counters for /stats: one HGETALL"""
+    return {field: int(value) for field, value in (await redis_client.hgetall(STATS_COUNTERS_KEY)).items()}
+
+async def _reconcile_stats_periodically():
+    while True:
+        try:
+            # One worker per interval does the recount
+            if await redis_client.set(_STATS_RECONCILE_LOCK_KEY, "1", nx=True, ex=STATS_RECONCILE_INTERVAL_SECONDS):
+                counters = await reconcile_stats_counters()
+                if counters is None:
+                    logger.warning("Stats counters kept changing; reconciliation skipped")
+                else:
+                    logger.info(f"Reconciled stats counters: {counters}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stats counter reconciliation error: {e}")
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_SECONDS)
+
+async def init_redis():
+    """Check the connection and start background tasks (app startup)"""
+    try:
+        await redis_client.ping()
+        print("✅ Redis connected successfully")
+    except Exception as e:
+        print(f"❌ Redis connection failed: {e}")
+    _background_tasks.append(asyncio.create_task(_listen_for_invalidations()))
+    _background_tasks.append(asyncio.create_task(_sweep_sessions_periodically()))
+    _background_tasks.append(asyncio.create_task(_reconcile_stats_periodically()))
+
+async def close_redis():
+    """Stop background tasks and release pooled connections (app shutdown)"""
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+
 # Helper functions
-def get_user_count() -> int:
+async def get_user_count() -> int:
     """Get total user count"""
-    if not redis_client:
-        return 0
-    
     try:
-        user_keys = redis_client.keys("user:*")
-        # Filter out user_by_id keys
-        return len([key for key in user_keys if not key.startswith("user_by_id:")])
+        return int(await redis_client.hget(STATS_COUNTERS_KEY, "users") or 0)
     except:
         return 0
 
-def get_active_sessions_count() -> int:
+async def get_active_sessions_count() -> int:
     """Get active sessions count"""
-    if not redis_client:
-        return 0
-    
     try:
-        session_keys = redis_client.keys("session:*")
-        active_count = 0
-        for key in session_keys:
-            if not key.startswith("session_by_id:"):
-                session_data = redis_client.hgetall(key)
-                if session_data.get('is_active') == 'True':
-                    active_count += 1
-        return active_count
+        now = datetime.now(timezone.utc).timestamp()
+        return await redis_client.zcount(SESSION_EXPIRY_INDEX, f"({now}", "+inf")
     except:
         return 0
 
-def cleanup_expired_sessions():
-    """Clean up expired sessions"""
-    if not redis_client:
-        return
+async def cleanup_expired_sessions(batch_size: int = SESSION_SWEEP_BATCH_SIZE, max_batches: int = 20) -> int:
+    """Delete sessions whose expiry has passed, in bounded batches.
     
+    Only touches the expiry index and the expired sessions themselves, so the
+    cost doesn't grow with the keyspace. Returns the number swept.
+    """
+    swept = 0
     try:
-        session_keys = redis_client.keys("session:*")
-        for key in session_keys:
-            if not key.startswith("session_by_id:"):
-                session_data = redis_client.hgetall(key)
-                if session_data.get('expires_at'):
-                    expires_at = datetime.fromisoformat(session_data['expires_at'])
-                    if datetime.utcnow() > expires_at:
-                        redis_client.delete(key)
-                        if session_data.get('id'):
-                            redis_client.delete(f"session_by_id:{session_data['id']}")
+        now = datetime.now(timezone.utc).timestamp()
+        for _ in range(max_batches):
+            session_ids = await redis_client.zrangebyscore(
+                SESSION_EXPIRY_INDEX, "-inf", now, start=0, num=batch_size
+            )
+            if not session_ids:
+                break
+            
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for session_id in session_ids:
+                    pipe.hget(session_key(session_id), "token")
+                tokens = await pipe.execute()
+            
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for session_id, token in zip(session_ids, tokens):
+                    pipe.delete(session_key(session_id))
+                    if token:
+                        pipe.delete(session_token_key(token))
+                pipe.zrem(SESSION_EXPIRY_INDEX, *session_ids)
+                await pipe.execute()
+            
+            swept += len(session_ids)
+            if len(session_ids) < batch_size:
+                break
     except Exception as e:
         logger.error(f"Error cleaning up sessions: {e}")
+    return swept
 
 # Test Redis connection
-def test_redis_connection():
+async def test_redis_connection():
     """Test Redis connection"""
-    if not redis_client:
-        return False
-    
     try:
-        redis_client.ping()
+        await redis_client.ping()
         return True
     except:
         return False
\ No newline at end of file
@@ -55,6 +55,10 @@ SECRET_KEY=your-super-secret-key-for-jwt-tokens-min-32-chars-hackathon
 ALGORITHM=HS256
 ACCESS_TOKEN_EXPIRE_HOURS=24
 
+# Event check-in codes (check-in is disabled until set), e.g.
+# python -c "import secrets; print(secrets.token_urlsafe(32))"
+CHECKIN_CODE_SECRET=
+
 # Google OAuth
 GOOGLE_CLIENT_ID=your-google-client-id-from-console
 GOOGLE_CLIENT_SECRET=your-google-client-secret
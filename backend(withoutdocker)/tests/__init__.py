@@ -0,0 +1,29 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Tests import the backend modules by name, the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Against a throwaway database on the local Redis: it is emptied before every test
+os.environ["REDIS_DB"] = os.getenv("TEST_REDIS_DB", "15")
+os.environ.setdefault("CHECKIN_CODE_SECRET", "test-checkin-" + "k" * 32)
+
+class RedisTestCase(unittest.IsolatedAsyncioTestCase):
+    """A test against the emptied test database, with cold caches"""
+
+    async def asyncSetUp(self):
+        from redis.exceptions import ConnectionError
+        from cache_no_docker import user_cache
+        from redis_models_no_docker import redis_client, redis_pool
+
+        # The pool's connections, and the condition it waits on when exhausted,
+        # belong to the previous test's event loop
+        await redis_pool.disconnect()
+        redis_pool._condition = asyncio.Condition()
+        self.addAsyncCleanup(redis_pool.disconnect)
+        try:
+            await redis_client.flushdb()
+        except ConnectionError:
+            self.skipTest("No local Redis")
+        user_cache.clear()
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+import httpx
+import checkin_no_docker
+from checkin_no_docker import check_in, make_checkin_code, checkin_window, event_paid_key
+from events_no_docker import RedisEvent, register_for_event
+from impact_no_docker import event_attendees_key
+import main
+from redis_models_no_docker import RedisUser, redis_client, user_key
+from tests import RedisTestCase
+
+class CheckinTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        await organizer.save()
+        # Under way, so its codes are valid now
+        self.event = RedisEvent(
+            organizer_id=organizer.id, title="Cleanup", capacity=10, points=40,
+            starts_at=datetime.utcnow().isoformat(), ends_at=(datetime.utcnow() + timedelta(hours=2)).isoformat()
+        )
+        await self.event.save()
+        self.volunteers = []
+        for n in range(2):
+            volunteer = RedisUser(email=f"volunteer{n}@example.com", name=f"Volunteer {n}", role="volunteer")
+            await volunteer.save()
+            await register_for_event(self.event, volunteer.id)
+            self.volunteers.append(volunteer.id)
+        self.codes = [make_checkin_code(self.event, user_id) for user_id in self.volunteers]
+
+    async def points(self, user_id: str) -> int:
+        return int(await redis_client.hget(user_key(user_id), "points"))
+
+    async def test_double_scan_in_one_batch_pays_once(self):
+        results = await check_in(self.event, [(self.codes[0], None), (self.codes[0], None), (self.codes[1], None)])
+        self.assertEqual([result["status"] for result in results], ["ok", "duplicate", "ok"])
+        self.assertEqual(await self.points(self.volunteers[0]), 40)
+        self.assertEqual(await redis_client.scard(event_attendees_key(self.event.id)), 2)
+
+    async def test_rescan_in_later_batch_pays_once(self):
+        await check_in(self.event, [(self.codes[0], None)])
+        results = await check_in(self.event, [(self.codes[0], None)])
+        self.assertEqual(results[0]["status"], "duplicate")
+        self.assertEqual(await self.points(self.volunteers[0]), 40)
+
+    async def test_replay_pays_after_failed_payment(self):
+        with mock.patch.object(checkin_no_docker, "award_points_bulk", side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                await check_in(self.event, [(self.codes[0], None)])
+        self.assertEqual(await self.points(self.volunteers[0]), 0)
+
+        results = await check_in(self.event, [(self.codes[0], None)])
+        self.assertEqual((results[0]["status"], results[0]["balance"]), ("duplicate", 40))
+        self.assertTrue(await redis_client.sismember(event_paid_key(self.event.id), self.volunteers[0]))
+
+    async def test_replay_after_unmarked_payment_does_not_pay_twice(self):
+        await check_in(self.event, [(self.codes[0], None)])
+        # The award landed but the paid mark did not
+        await redis_client.srem(event_paid_key(self.event.id), self.volunteers[0])
+        await check_in(self.event, [(self.codes[0], None)])
+        self.assertEqual(await self.points(self.volunteers[0]), 40)
+
+    async def test_rejects_bad_codes(self):
+        other = RedisEvent(organizer_id=self.event.organizer_id, title="Other", starts_at=self.event.starts_at)
+        await other.save()
+        forged = self.codes[0].replace(self.volunteers[0], self.volunteers[1])
+        valid_from, _ = checkin_window(self.event)
+        results = await check_in(self.event, [
+            ("garbage", None), (forged, None), (make_checkin_code(other, self.volunteers[0]), None),
+            (self.codes[0], valid_from - 1)
+        ])
+        self.assertEqual([result["status"] for result in results], ["invalid", "invalid", "wrong_event", "not_yet_valid"])
+        self.assertEqual(await redis_client.scard(event_attendees_key(self.event.id)), 0)
+
+    async def test_rejects_codes_after_the_event(self):
+        ended = RedisEvent(
+            organizer_id=self.event.organizer_id, title="Yesterday", points=40,
+            starts_at=(datetime.utcnow() - timedelta(days=1)).isoformat(),
+            ends_at=(datetime.utcnow() - timedelta(days=1, hours=-2)).isoformat()
+        )
+        await ended.save()
+        await register_for_event(ended, self.volunteers[0])
+        results = await check_in(ended, [(make_checkin_code(ended, self.volunteers[0]), None)])
+        self.assertEqual(results[0]["status"], "expired")
+        self.assertEqual(await self.points(self.volunteers[0]), 0)
+
+    async def test_unregistered_volunteer_is_not_checked_in(self):
+        results = await check_in(self.event, [(make_checkin_code(self.event, "stranger"), time.time())])
+        self.assertEqual(results[0]["status"], "not_registered")
+        self.assertFalse(await redis_client.exists(user_key("stranger")))
+
+class CheckinSecretTests(RedisTestCase):
+    async def test_disabled_without_its_own_secret(self):
+        organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        main.app.dependency_overrides[main.get_current_user] = lambda: organizer
+        self.addCleanup(main.app.dependency_overrides.clear)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            with mock.patch.object(main, "CHECKIN_ENABLED", False):
+                self.assertEqual((await client.get("/api/events/some-event/checkin-code")).status_code, 503)
+                self.assertEqual((await client.post("/api/events/some-event/checkins", json={"scans": []})).status_code, 503)
+
+    def test_refuses_to_sign_without_secret(self):
+        with mock.patch.object(checkin_no_docker, "_mac", None):
+            with self.assertRaises(RuntimeError):
+                checkin_no_docker._sign("payload")
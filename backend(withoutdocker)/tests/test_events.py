@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+from events_no_docker import (
+    RedisEvent, register_for_event, cancel_registration, get_waitlist_position, event_key, event_volunteers_key
+)
+import main
+from notifications_no_docker import NOTIFICATIONS_KEY
+from redis_models_no_docker import RedisUser, redis_client, user_key
+from tests import RedisTestCase
+
+class RegistrationTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        await self.organizer.save()
+        self.event = await self.new_event(capacity=5)
+
+    async def new_event(self, capacity: int, starts_in: timedelta = timedelta(days=1)) -> RedisEvent:
+        event = RedisEvent(
+            organizer_id=self.organizer.id, title="Cleanup", capacity=capacity,
+            starts_at=(datetime.utcnow() + starts_in).isoformat(), tags=["beach"]
+        )
+        await event.save()
+        return event
+
+    async def registered(self) -> int:
+        return int(await redis_client.hget(event_key(self.event.id), "registered"))
+
+    async def test_concurrent_registers_never_overbook(self):
+        results = await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(50)))
+        statuses = [result["status"] for result in results]
+        self.assertEqual((statuses.count("ok"), statuses.count("full")), (5, 45))
+        self.assertEqual(await self.registered(), 5)
+        self.assertEqual(await redis_client.scard(event_volunteers_key(self.event.id)), 5)
+        self.assertEqual(await redis_client.hget(user_key(self.organizer.id), "total_volunteers"), "5")
+
+    async def test_register_twice_is_a_no_op(self):
+        await register_for_event(self.event, "volunteer")
+        self.assertEqual((await register_for_event(self.event, "volunteer"))["status"], "already")
+        self.assertEqual(await self.registered(), 1)
+
+    async def test_waitlist_keeps_arrival_order(self):
+        await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(5)))
+        for n in range(3):
+            result = await register_for_event(self.event, f"waiting-{n}", waitlist=True)
+            self.assertEqual((result["status"], result["position"]), ("waitlisted", n + 1))
+        self.assertEqual(await get_waitlist_position(self.event.id, "waiting-2"), 3)
+
+    async def test_cancel_promotes_next_waiting(self):
+        await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(5)))
+        await register_for_event(self.event, "first-waiting", waitlist=True)
+        await register_for_event(self.event, "second-waiting", waitlist=True)
+
+        result = await cancel_registration(self.event, "volunteer-0")
+        self.assertEqual((result["status"], result["promoted"]), ("ok", "first-waiting"))
+        self.assertEqual(await self.registered(), 5)
+        self.assertTrue(await redis_client.sismember(event_volunteers_key(self.event.id), "first-waiting"))
+        self.assertEqual(await get_waitlist_position(self.event.id, "second-waiting"), 1)
+        (_, notification), = await redis_client.xrange(NOTIFICATIONS_KEY)
+        self.assertEqual((notification["type"], notification["user_id"]), ("waitlist_promoted", "first-waiting"))
+
+    async def test_cancel_promotes_when_registration_closed(self):
+        await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(5)))
+        await register_for_event(self.event, "waiting", waitlist=True)
+        await redis_client.hset(event_key(self.event.id), "status", "closed")
+        self.assertEqual((await cancel_registration(self.event, "volunteer-0"))["promoted"], "waiting")
+
+    async def test_concurrent_cancels_and_registers_stay_within_capacity(self):
+        await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(5)))
+        await asyncio.gather(
+            *(cancel_registration(self.event, f"volunteer-{n}") for n in range(5)),
+            *(register_for_event(self.event, f"late-{n}", waitlist=True) for n in range(20))
+        )
+        registered = await self.registered()
+        self.assertEqual(registered, await redis_client.scard(event_volunteers_key(self.event.id)))
+        self.assertLessEqual(registered, 5)
+
+    async def test_leave_waitlist_and_not_registered(self):
+        await asyncio.gather(*(register_for_event(self.event, f"volunteer-{n}") for n in range(5)))
+        await register_for_event(self.event, "waiting", waitlist=True)
+        self.assertEqual((await cancel_registration(self.event, "waiting"))["status"], "left_waitlist")
+        self.assertEqual((await cancel_registration(self.event, "stranger"))["status"], "not_registered")
+        self.assertEqual(await self.registered(), 5)
+
+    async def test_cancel_endpoint_refuses_after_start(self):
+        volunteer = RedisUser(email="volunteer@example.com", name="Volunteer", role="volunteer")
+        await volunteer.save()
+        started = await self.new_event(capacity=5, starts_in=-timedelta(hours=1))
+        await register_for_event(started, volunteer.id)
+        main.app.dependency_overrides[main.get_current_user] = lambda: volunteer
+        self.addCleanup(main.app.dependency_overrides.clear)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            response = await client.delete(f"/api/events/{started.id}/register")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(await redis_client.sismember(event_volunteers_key(started.id), volunteer.id))
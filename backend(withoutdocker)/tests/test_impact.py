@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+import redis
+from config_no_docker import get_redis_url
+from events_no_docker import RedisEvent, register_for_event
+from impact_no_docker import record_attendance, recompute_impact_scores
+from redis_models_no_docker import RedisUser, redis_client, user_key
+from tests import RedisTestCase
+
+class ImpactRecomputeTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        await self.organizer.save()
+        starts_at = datetime.utcnow() + timedelta(days=1)
+        self.event = RedisEvent(
+            organizer_id=self.organizer.id, title="Cleanup", capacity=5,
+            starts_at=starts_at.isoformat(), ends_at=(starts_at + timedelta(hours=3)).isoformat()
+        )
+        await self.event.save()
+        for volunteer in ("first", "second"):
+            await register_for_event(self.event, volunteer)
+        await record_attendance(self.event, ["first"])
+        self.blocking = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+        self.addCleanup(self.blocking.close)
+
+    async def impact(self) -> list:
+        return await redis_client.hmget(
+            user_key(self.organizer.id), "impact_events", "impact_attended", "impact_hours", "impact_score"
+        )
+
+    async def test_repairs_drifted_counters(self):
+        expected = await self.impact()
+        await redis_client.hset(user_key(self.organizer.id), mapping={"impact_events": 7, "impact_score": 1})
+        result = await asyncio.to_thread(recompute_impact_scores, self.blocking)
+        self.assertEqual(result, {"events": 1, "organizers": 1, "skipped": 0})
+        self.assertEqual([float(value) for value in await self.impact()], [float(value) for value in expected])
+
+    async def test_check_in_during_run_is_kept(self):
+        # Stall the recompute after it has counted, before it writes
+        counted, resume = threading.Event(), threading.Event()
+        register_script = self.blocking.register_script
+        def stalled_register_script(script):
+            write_batch = register_script(script)
+            def write(**kwargs):
+                counted.set()
+                resume.wait(5)
+                return write_batch(**kwargs)
+            return write
+        self.blocking.register_script = stalled_register_script
+
+        run = asyncio.create_task(asyncio.to_thread(recompute_impact_scores, self.blocking))
+        await asyncio.to_thread(counted.wait, 5)
+        await record_attendance(self.event, ["second"])
+        resume.set()
+        result = await run
+
+        self.assertEqual(result["skipped"], 1)
+        events, attended, hours, score = await self.impact()
+        self.assertEqual((events, attended, float(hours), score), ("1", "2", 6.0, "20"))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+import leaderboard_no_docker
+from leaderboard_no_docker import (
+    board_key, day_key, window_key, user_boards, rebuild_windows, get_leaderboard_page, get_rank_with_neighbours
+)
+from points_no_docker import award_points
+from redis_models_no_docker import RedisUser, redis_client, LEADERBOARD_KEY
+from tests import RedisTestCase
+
+class LeaderboardTests(RedisTestCase):
+    async def volunteers(self, *points: int) -> list:
+        users = []
+        for n, amount in enumerate(points):
+            user = RedisUser(email=f"volunteer{n}@example.com", name=f"Volunteer {n}", role="volunteer")
+            await user.save()
+            await award_points(user.id, amount, "cleanup", organization="Reef Org")
+            users.append(user)
+        return users
+
+    async def test_role_change_leaves_every_board(self):
+        user, other = await self.volunteers(40, 10)
+        user = await RedisUser.find_by_id(user.id)
+        user.role = "organizer"
+        await user.save()
+
+        for board in await user_boards():
+            self.assertIsNone(await redis_client.zscore(board, user.id), board)
+        self.assertEqual(await redis_client.zscore(board_key(organization="Reef Org"), other.id), 10)
+
+    async def test_rank_and_neighbours(self):
+        users = await self.volunteers(50, 40, 30, 20, 10)
+        page = await get_leaderboard_page(0, 2)
+        self.assertEqual([entry["id"] for entry in page["entries"]], [users[0].id, users[1].id])
+        self.assertEqual(page["total"], 5)
+
+        around = await get_rank_with_neighbours(users[2].id, radius=1, key=window_key("week"))
+        self.assertEqual(around["rank"], 3)
+        self.assertEqual([entry["points"] for entry in around["neighbours"]], [40, 30, 20])
+        self.assertIsNone(await get_rank_with_neighbours("no-such-user"))
+
+    async def test_rollover_drops_days_outside_the_window(self):
+        (user,) = await self.volunteers(25)
+        today = leaderboard_no_docker._today()
+        await redis_client.zadd(day_key(today - timedelta(days=6)), {user.id: 5})
+        await redis_client.zadd(day_key(today - timedelta(days=7)), {user.id: 100})
+
+        await rebuild_windows(today)
+        self.assertEqual(await redis_client.zscore(window_key("week"), user.id), 30)
+        self.assertEqual(await redis_client.zscore(window_key("month"), user.id), 130)
+        self.assertEqual(await redis_client.zscore(LEADERBOARD_KEY, user.id), 25)
+
+    def test_board_key_rejects_unknown_views(self):
+        with self.assertRaises(ValueError):
+            board_key("year")
+        with self.assertRaises(ValueError):
+            board_key("week", organization="Reef Org")
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from events_no_docker import RedisEvent, search_nearby
+from tests import RedisTestCase
+
+# Around a point on the coast; events up to ~20 km away, some at one spot
+ORIGIN = (-8.61, 41.15)
+
+class NearbyTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.today = datetime.utcnow().date()
+        self.events = []
+        for n in range(17):
+            offset = 0.05 if n % 4 == 0 else 0.01 * n  # Every 4th shares a location: distance ties
+            day = self.today + timedelta(days=n % 3)
+            event = RedisEvent(
+                organizer_id="organizer", title=f"Cleanup {n}", capacity=10,
+                starts_at=datetime.combine(day, datetime.min.time()).replace(hour=12).isoformat(),
+                longitude=ORIGIN[0] + offset, latitude=ORIGIN[1]
+            )
+            await event.save()
+            self.events.append(event)
+
+    async def pages(self, limit: int, **shape) -> list:
+        hits, cursor = await search_nearby(*ORIGIN, self.today, self.today + timedelta(days=2), limit=limit, **shape)
+        pages = [hits]
+        while cursor:
+            hits, cursor = await search_nearby(
+                *ORIGIN, self.today, self.today + timedelta(days=2), limit=limit, cursor=cursor, **shape
+            )
+            pages.append(hits)
+        return pages
+
+    async def test_pages_walk_every_hit_once_in_order(self):
+        everything, _ = await search_nearby(*ORIGIN, self.today, self.today + timedelta(days=2), radius_km=50, limit=100)
+        self.assertEqual(len(everything), len(self.events))
+        self.assertEqual(everything, sorted(everything, key=lambda hit: (hit[1], hit[0])))
+        for limit in (1, 3, 4, 16):
+            pages = await self.pages(limit, radius_km=50)
+            self.assertTrue(all(len(page) <= limit for page in pages))
+            self.assertEqual([hit for page in pages for hit in page], everything, limit)
+
+    async def test_radius_box_and_dates_filter(self):
+        near, _ = await search_nearby(*ORIGIN, self.today, self.today + timedelta(days=2), radius_km=5, limit=100)
+        self.assertTrue(near and all(distance <= 5 for _, distance in near))
+        boxed, _ = await search_nearby(*ORIGIN, self.today, self.today + timedelta(days=2), box_km=(4, 4), limit=100)
+        self.assertTrue(boxed and {event_id for event_id, _ in boxed} <= {event_id for event_id, _ in near})
+        first_day, _ = await search_nearby(*ORIGIN, self.today, self.today, radius_km=50, limit=100)
+        self.assertEqual(len(first_day), len([n for n in range(17) if n % 3 == 0]))
+
+    async def test_rejects_foreign_cursor(self):
+        with self.assertRaises(ValueError):
+            await search_nearby(*ORIGIN, self.today, self.today, radius_km=5, cursor="not-a-cursor")
@@ -0,0 +1,42 @@
+import asyncio
+from unittest import mock
+from notifications_no_docker import NOTIFICATIONS_KEY, DISPATCHER_GROUP, get_notifications, run_notification_dispatcher
+import redis_models_no_docker
+from redis_models_no_docker import redis_client
+from tests import RedisTestCase
+
+class DispatcherTests(RedisTestCase):
+    async def run_dispatcher(self, consumer: str) -> asyncio.Task:
+        task = asyncio.create_task(run_notification_dispatcher(consumer))
+        async def stop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.addAsyncCleanup(stop)
+        return task
+
+    async def wait_for_inbox(self, user_id: str, count: int) -> list:
+        for _ in range(100):
+            notifications = await get_notifications(user_id)
+            if len(notifications) >= count:
+                return notifications
+            await asyncio.sleep(0.02)
+        self.fail(f"{user_id} got {len(notifications)} of {count} notifications")
+
+    async def test_delivers_and_acks_new_entries(self):
+        await self.run_dispatcher("worker-1")
+        for n in range(3):
+            await redis_client.xadd(NOTIFICATIONS_KEY, {"user_id": "volunteer", "type": "test", "n": str(n)})
+        notifications = await self.wait_for_inbox("volunteer", 3)
+        self.assertEqual([notification["n"] for notification in notifications], ["2", "1", "0"])
+        self.assertEqual((await redis_client.xpending(NOTIFICATIONS_KEY, DISPATCHER_GROUP))["pending"], 0)
+
+    async def test_claims_entries_a_dead_consumer_never_acked(self):
+        await redis_client.xgroup_create(NOTIFICATIONS_KEY, DISPATCHER_GROUP, id="0", mkstream=True)
+        await redis_client.xadd(NOTIFICATIONS_KEY, {"user_id": "volunteer", "type": "test"})
+        # Read by a worker that died before delivering
+        await redis_client.xreadgroup(DISPATCHER_GROUP, "dead-worker", {NOTIFICATIONS_KEY: ">"})
+
+        with mock.patch.object(redis_models_no_docker, "_CLAIM_IDLE_MS", 0):
+            await self.run_dispatcher("worker-1")
+            await self.wait_for_inbox("volunteer", 1)
+        self.assertEqual((await redis_client.xpending(NOTIFICATIONS_KEY, DISPATCHER_GROUP))["pending"], 0)
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+from config_no_docker import POINTS_AWARD_MAX_AMOUNT
+from events_no_docker import RedisEvent, register_for_event
+import main
+from leaderboard_no_docker import award_boards
+from points_no_docker import award_points, award_points_bulk, apply_ledger_entries, LEDGER_KEY
+import points_no_docker
+from redis_models_no_docker import RedisUser, redis_client, user_key, LEADERBOARD_KEY
+from tests import RedisTestCase
+
+class AggregatorTests(RedisTestCase):
+    async def volunteer(self) -> RedisUser:
+        user = RedisUser(email="volunteer@example.com", name="Volunteer", role="volunteer")
+        await user.save()
+        return user
+
+    async def ledger(self) -> list:
+        return await redis_client.xrange(LEDGER_KEY)
+
+    async def test_award_moves_all_time_board_without_aggregator(self):
+        user = await self.volunteer()
+        await award_points(user.id, 120, "beach cleanup")
+        await award_points(user.id, 30, "beach cleanup")
+        self.assertEqual(await redis_client.zscore(LEADERBOARD_KEY, user.id), 150)
+
+    async def test_interleaved_consumers_keep_newest_level(self):
+        user = await self.volunteer()
+        await award_points(user.id, 600, "first")
+        first = await self.ledger()
+
+        # Consumer A reads the 600 balance, then stalls before writing
+        write_levels = points_no_docker._write_levels
+        a_read, a_resume = asyncio.Event(), asyncio.Event()
+        async def stalled(*args, **kwargs):
+            a_read.set()
+            await a_resume.wait()
+            return await write_levels(*args, **kwargs)
+        points_no_docker._write_levels = stalled
+        consumer_a = asyncio.create_task(apply_ledger_entries(first))
+        await a_read.wait()
+        points_no_docker._write_levels = write_levels
+
+        # Consumer B applies a later award in full while A is stalled
+        await award_points(user.id, 1000, "second")
+        await apply_ledger_entries((await self.ledger())[1:])
+        self.assertEqual(await redis_client.hget(user_key(user.id), "level"), "Ocean Champion")
+
+        a_resume.set()
+        await consumer_a
+        level, badges = await redis_client.hmget(user_key(user.id), "level", "badges")
+        self.assertEqual((level, badges), ("Ocean Champion", "3"))
+        self.assertEqual(await redis_client.zscore(LEADERBOARD_KEY, user.id), 1600)
+
+class AwardTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.user = RedisUser(email="volunteer@example.com", name="Volunteer", role="volunteer")
+        await self.user.save()
+
+    async def test_repeated_award_id_pays_once(self):
+        results = await asyncio.gather(*(award_points(self.user.id, 25, "cleanup", "award-1") for _ in range(5)))
+        self.assertEqual(sorted(result["status"] for result in results), ["duplicate"] * 4 + ["ok"])
+        self.assertEqual(await redis_client.hget(user_key(self.user.id), "points"), "25")
+        self.assertEqual(len(await redis_client.xrange(LEDGER_KEY)), 1)
+
+    async def test_bulk_award_id_is_scoped_per_user(self):
+        other = RedisUser(email="other@example.com", name="Other", role="volunteer")
+        await other.save()
+        first = await award_points_bulk([self.user.id, other.id], 10, "cleanup", "event-1")
+        again = await award_points_bulk([self.user.id, other.id, "no-such-user"], 10, "cleanup", "event-1")
+        self.assertEqual([result["status"] for result in first], ["ok", "ok"])
+        self.assertEqual([result["status"] for result in again], ["duplicate", "duplicate", "missing"])
+
+    async def test_award_counts_towards_every_board(self):
+        await award_points(self.user.id, 30, "cleanup", organization="Reef Org")
+        for board in award_boards("Reef Org"):
+            self.assertEqual(await redis_client.zscore(board, self.user.id), 30, board)
+
+    async def test_organizers_stay_off_the_boards(self):
+        organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        await organizer.save()
+        result = await award_points(organizer.id, 30, "bonus")
+        self.assertEqual((result["status"], result["balance"]), ("ok", 30))
+        for board in award_boards():
+            self.assertIsNone(await redis_client.zscore(board, organizer.id), board)
+
+class AwardEndpointTests(RedisTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.organizer = RedisUser(email="organizer@example.com", name="Organizer", role="organizer")
+        self.rival = RedisUser(email="rival@example.com", name="Rival", role="organizer")
+        self.volunteer = RedisUser(email="volunteer@example.com", name="Volunteer", role="volunteer")
+        self.stranger = RedisUser(email="stranger@example.com", name="Stranger", role="volunteer")
+        for user in (self.organizer, self.rival, self.volunteer, self.stranger):
+            await user.save()
+        for organizer, volunteer in ((self.organizer, self.volunteer), (self.rival, self.stranger)):
+            event = RedisEvent(
+                organizer_id=organizer.id, title="Cleanup", capacity=5,
+                starts_at=(datetime.utcnow() + timedelta(days=1)).isoformat()
+            )
+            await event.save()
+            await register_for_event(event, volunteer.id)
+
+        main.app.dependency_overrides[main.get_current_user] = lambda: self.organizer
+        self.addCleanup(main.app.dependency_overrides.clear)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def award(self, user_id: str, amount: int) -> httpx.Response:
+        return await self.client.post("/api/points/award", json={"userId": user_id, "amount": amount, "reason": "cleanup"})
+
+    async def test_awards_own_volunteer(self):
+        response = await self.award(self.volunteer.id, 50)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["balance"], 50)
+
+    async def test_rejects_volunteer_of_someone_elses_event(self):
+        for user_id in (self.stranger.id, self.organizer.id, "no-such-user"):
+            self.assertEqual((await self.award(user_id, 50)).status_code, 403)
+        self.assertEqual(await redis_client.hget(user_key(self.stranger.id), "points"), "0")
+
+    async def test_rejects_negative_and_oversized_amounts(self):
+        for amount in (-50, 0, POINTS_AWARD_MAX_AMOUNT + 1):
+            self.assertEqual((await self.award(self.volunteer.id, amount)).status_code, 400)
+
+    async def test_bulk_skips_users_outside_organizers_events(self):
+        response = await self.client.post("/api/points/award/bulk", json={
+            "userIds": [self.volunteer.id, self.stranger.id], "amount": 20, "reason": "cleanup"
+        })
+        statuses = {result["user_id"]: result["status"] for result in response.json()["results"]}
+        self.assertEqual(statuses, {self.volunteer.id: "ok", self.stranger.id: "not_registered"})
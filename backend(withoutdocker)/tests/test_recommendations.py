@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from unittest import mock
+from events_no_docker import RedisEvent, register_for_event
+import recommendations_no_docker
+from recommendations_no_docker import recommend_events
+from tests import RedisTestCase
+
+class RecommendationTests(RedisTestCase):
+    async def new_events(self, count: int, tags: list, capacity: int = 5) -> list:
+        events = []
+        for n in range(count):
+            event = RedisEvent(
+                organizer_id="organizer", title=f"Event {n}", capacity=capacity, tags=tags,
+                starts_at=(datetime.utcnow() + timedelta(days=1, hours=n)).isoformat()
+            )
+            await event.save()
+            events.append(event)
+        return events
+
+    async def recommended(self, limit: int, interests: tuple = ("beach",)) -> list:
+        return [(event.title, matches) for event, matches in await recommend_events("volunteer", list(interests), limit)]
+
+    async def test_ranks_by_matching_tags_then_start(self):
+        await self.new_events(2, ["beach"])
+        both, = await self.new_events(1, ["beach", "kids"])
+        both.title = "Both"
+        await both.save()
+        self.assertEqual(await self.recommended(3, ["beach", "kids"]), [("Both", 2), ("Event 0", 1), ("Event 1", 1)])
+
+    async def test_closed_events_do_not_use_up_the_window(self):
+        events = await self.new_events(5, ["beach"])
+        for event in events[:3]:
+            event.status = "closed"
+            await event.save()
+        with mock.patch.object(recommendations_no_docker, "RECOMMENDATIONS_TAG_WINDOW", 3):
+            self.assertEqual(await self.recommended(2), [("Event 3", 1), ("Event 4", 1)])
+
+    async def test_cached_list_refills_after_events_fill(self):
+        events = await self.new_events(6, ["beach"], capacity=1)
+        self.assertEqual(len(await self.recommended(2)), 2)
+        # Filling up doesn't touch cached lists, and the cache holds 4 of the 6
+        for n, event in enumerate(events[:3]):
+            await register_for_event(event, f"volunteer-{n}")
+        self.assertEqual(await self.recommended(2), [("Event 3", 1), ("Event 4", 1)])
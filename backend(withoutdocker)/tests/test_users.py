@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from redis_models_no_docker import (
+    RedisUser, RedisSession, open_login_session, cleanup_expired_sessions, get_stats_counters,
+    get_active_sessions_count, reconcile_stats_counters, redis_client, user_key, session_key, session_token_key,
+    SESSION_EXPIRY_INDEX, STATS_COUNTERS_KEY
+)
+from tests import RedisTestCase
+
+def _session(hours: float = 1) -> RedisSession:
+    return RedisSession(
+        token=str(uuid.uuid4()),
+        expires_at=(datetime.utcnow() + timedelta(hours=hours)).isoformat()
+    )
+
+class DirtyFieldSaveTests(RedisTestCase):
+    async def test_save_writes_only_changed_fields(self):
+        user = RedisUser(email="volunteer@example.com", name="Volunteer")
+        await user.save()
+        loaded = await RedisUser.find_by_id(user.id)
+
+        # Another writer awards points after we loaded the user
+        await redis_client.hincrby(user_key(user.id), "points", 40)
+        loaded.avatar = "https://example.com/avatar.png"
+        self.assertEqual(set(loaded.dirty_fields()), {"avatar"})
+        await loaded.save()
+
+        points, avatar = await redis_client.hmget(user_key(user.id), "points", "avatar")
+        self.assertEqual((points, avatar), ("40", "https://example.com/avatar.png"))
+
+    async def test_unchanged_save_writes_nothing(self):
+        user = RedisUser(email="volunteer@example.com", name="Volunteer")
+        await user.save()
+        await redis_client.hset(user_key(user.id), "name", "Renamed elsewhere")
+        await user.save()
+        self.assertEqual(await redis_client.hget(user_key(user.id), "name"), "Renamed elsewhere")
+
+class LoginTests(RedisTestCase):
+    async def test_concurrent_first_logins_create_one_user(self):
+        results = await asyncio.gather(*(
+            open_login_session("new@example.com", _session(), new_user=RedisUser(name="New"), update={})
+            for _ in range(20)
+        ))
+        statuses = [status for status, _ in results]
+        self.assertEqual(statuses.count("created"), 1)
+        self.assertEqual(statuses.count("updated"), 19)
+        self.assertEqual(len({user.id for _, user in results}), 1)
+        self.assertEqual(await redis_client.hget(STATS_COUNTERS_KEY, "users"), "1")
+
+    async def test_existing_user_refused_without_update(self):
+        await open_login_session("taken@example.com", _session(), new_user=RedisUser(name="First"))
+        status, user = await open_login_session("taken@example.com", _session(), new_user=RedisUser(name="Second"))
+        self.assertEqual((status, user), ("exists", None))
+
+    async def test_fill_only_writes_empty_fields(self):
+        await open_login_session("fill@example.com", _session(), new_user=RedisUser(name="Chosen name"))
+        _, user = await open_login_session(
+            "fill@example.com", _session(), update={}, fill={"name": "Google name", "avatar": "https://example.com/a.png"}
+        )
+        self.assertEqual((user.name, user.avatar), ("Chosen name", "https://example.com/a.png"))
+
+class SessionTests(RedisTestCase):
+    async def login(self, session: RedisSession) -> RedisUser:
+        _, user = await open_login_session("volunteer@example.com", session, new_user=RedisUser(name="V"), update={})
+        return user
+
+    async def test_token_resolves_to_session_until_revoked(self):
+        session = _session()
+        user = await self.login(session)
+        found = await RedisSession.find_by_token(session.token)
+        self.assertEqual((found.id, found.user_id), (session.id, user.id))
+
+        await found.revoke()
+        self.assertIsNone(await RedisSession.find_by_token(session.token))
+        self.assertIsNone(await redis_client.zscore(SESSION_EXPIRY_INDEX, session.id))
+
+    async def test_sweeper_removes_only_expired_sessions(self):
+        live, expired = _session(), _session()
+        await self.login(live)
+        await self.login(expired)
+        # Backdate one session in the expiry index, as if its time had passed
+        await redis_client.zadd(SESSION_EXPIRY_INDEX, {expired.id: datetime.now(timezone.utc).timestamp() - 60})
+
+        self.assertEqual(await cleanup_expired_sessions(), 1)
+        self.assertFalse(await redis_client.exists(session_key(expired.id), session_token_key(expired.token)))
+        self.assertIsNotNone(await RedisSession.find_by_token(live.token))
+
+class StatsCounterTests(RedisTestCase):
+    async def test_counters_follow_creates_and_role_changes(self):
+        volunteer = RedisUser(email="volunteer@example.com", name="Volunteer")
+        await volunteer.save()
+        await open_login_session("organizer@example.com", _session(), new_user=RedisUser(name="O", role="organizer"))
+        volunteer.role = "organizer"
+        await volunteer.save()
+        await volunteer.save()
+
+        self.assertEqual(await get_stats_counters(), {"users": 2, "users:volunteer": 0, "users:organizer": 2})
+        self.assertEqual(await get_active_sessions_count(), 1)
+
+    async def test_reconcile_repairs_drift(self):
+        for n in range(3):
+            await RedisUser(email=f"volunteer{n}@example.com", name="Volunteer").save()
+        await redis_client.hset(STATS_COUNTERS_KEY, mapping={"users": 99, "users:organizer": 5})
+
+        self.assertEqual(await reconcile_stats_counters(), {"users": 3, "users:volunteer": 3})
+        self.assertEqual(await get_stats_counters(), {"users": 3, "users:volunteer": 3})
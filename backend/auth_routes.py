@@ -4,8 +4,9 @@ from datetime import datetime
 import uuid
 import logging
 from fastapi import Depends
-from models import User, get_user_by_email
-from oauth import get_google_user
+from models import User
+from oauth import get_google_user, google_upstream
+from upstream import UpstreamUnavailable
 from auth_utils import create_auth_response, get_current_user, logout_user
 from config import GOOGLE_CLIENT_ID
 
@@ -37,33 +38,35 @@ async def google_callback(request: Request):
         redirect_uri = "http://localhost:8000/api/auth/google/callback"
         google_user = await get_google_user(code, redirect_uri)
         
-        # Find or create user
-        user = get_user_by_email(google_user["email"])
-        if not user:
-            user = User(
+        # Find or create the user and open a session in one round trip
+        update = {"name": google_user["name"]}
+        if "picture" in google_user:
+            update["avatar"] = google_user["picture"]
+        auth_data = await create_auth_response(
+            request, google_user["email"],
+            new_user=User(
                 email=google_user["email"],
                 name=google_user["name"],
                 avatar=google_user.get("picture", ""),
                 role="volunteer",  # Default role
                 auth_provider="google",
                 provider_id=google_user.get("sub")
-            )
-            user.save()
-        else:
-            # Update user info from Google
-            user.name = google_user["name"]
-            user.avatar = google_user.get("picture", user.avatar)
-            if not user.provider_id:
-                user.provider_id = google_user.get("sub")
-            user.save()
-        
-        # Create auth tokens
-        auth_data = create_auth_response(user, request)
+            ),
+            update=update,
+            fill={"provider_id": google_user.get("sub") or ""}
+        )
         
         # Redirect to frontend with token
         frontend_url = f"http://localhost:5173/auth/callback?token={auth_data['access_token']}"
         return RedirectResponse(url=frontend_url)
         
+    except UpstreamUnavailable as e:
+        logger.warning(f"Google OAuth skipped: {e}")
+        error_url = (
+            f"http://localhost:5173/auth/error?retry_after={e.retry_after:.0f}"
+            f"&message=Google sign-in is temporarily unavailable, please try again shortly"
+        )
+        return RedirectResponse(url=error_url)
     except Exception as e:
         logger.error(f"Google callback error: {e}")
         error_url = f"http://localhost:5173/auth/error?message=Authentication failed"
@@ -75,23 +78,16 @@ async def signup(request: Request):
     try:
         data = await request.json()
         
-        # Check if user exists
-        existing_user = get_user_by_email(data["email"])
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        # Create user
-        user = User(
+        # Create the user and open a session; the email is claimed atomically
+        auth_data = await create_auth_response(request, data["email"], new_user=User(
             email=data["email"],
             name=data["name"],
             role=data.get("role", "volunteer"),
             organization_name=data.get("organizationName"),
             auth_provider="local"
-        )
-        user.save()
-        
-        # Create auth response
-        auth_data = create_auth_response(user, request)
+        ))
+        if auth_data is None:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         return auth_data
         
@@ -107,13 +103,10 @@ async def login(request: Request):
     try:
         data = await request.json()
         
-        user = get_user_by_email(data["email"])
-        if not user:
+        auth_data = await create_auth_response(request, data["email"], update={})
+        if auth_data is None:
             raise HTTPException(status_code=400, detail="User not found")
         
-        # Create auth response
-        auth_data = create_auth_response(user, request)
-        
         return auth_data
         
     except HTTPException:
@@ -135,7 +128,7 @@ async def logout(request: Request):
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header.split(" ")[1]
-            success = logout_user(token)
+            success = await logout_user(token)
             return {"message": "Logged out successfully", "success": success}
         else:
             return {"message": "No token provided", "success": False}
@@ -148,7 +141,7 @@ async def get_user_sessions(current_user: User = Depends(get_current_user)):
     """Get all active sessions for current user (useful for hackathon debugging)"""
     from models import Session
     try:
-        sessions = Session.find(
+        sessions = await Session.find(
             Session.user_id == current_user.id, 
             Session.is_active == True
         ).all()
@@ -171,10 +164,12 @@ async def get_user_sessions(current_user: User = Depends(get_current_user)):
 # Health check endpoint
 @router.get("/health")
 async def health_check():
-    """Health check for Redis connection"""
+    """Health check for Redis connection and this worker's Google circuit breaker"""
+    google = google_upstream.snapshot()
     try:
         from models import redis
-        redis.ping()
-        return {"status": "healthy", "redis": "connected"}
+        await redis.ping()
+        status = "healthy" if google["state"] == "closed" else "degraded"
+        return {"status": status, "redis": "connected", "google_upstream": google}
     except Exception as e:
-        return {"status": "unhealthy", "redis": "disconnected", "error": str(e)}
\ No newline at end of file
+        return {"status": "unhealthy", "redis": "disconnected", "error": str(e), "google_upstream": google}
\ No newline at end of file
@@ -1,18 +1,215 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+from jose import JWTError, JWSError, ExpiredSignatureError, jwk, jws
+from jose.exceptions import JWTClaimsError
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_HOURS
-from models import User, Session, get_user_by_id, get_session_by_token, create_user_session
-import secrets
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_HOURS, JWT_BACKEND, JWT_ISSUER, JWT_AUDIENCE,
+    JWT_LEEWAY_SECONDS, JWT_REQUIRED_CLAIMS
+)
+from models import (
+    User, Session, get_user_by_id, get_session_by_token, open_login_session, resolve_session_user,
+    invalidate_token
+)
+from session_tokens import is_signed_session_token
+from cache import token_cache
 import logging
 
+# PyJWT is an optional JWT backend
+try:
+    import jwt as pyjwt
+except ImportError:
+    pyjwt = None
+
 logger = logging.getLogger(__name__)
 
 # OAuth2 scheme
 security = HTTPBearer()
 
+# Access tokens (JWT)
+#
+# A JWTEngine signs and verifies with a key built once, when the engine is
+# created, and checks the claims the same way whichever library does the
+# signing. Engines only differ in how they produce and check the JWS.
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+class JWTEngine:
+    """Encode and verify JWTs with one key and one set of claim checks.
+
+    On decode, the claims in `required` must be present, exp and nbf are
+    checked with `leeway` seconds of clock skew, and iss / aud must match
+    `issuer` / `audience` when those are set (a token carrying an aud is
+    refused when no audience is configured). Raises JWTError (or its
+    ExpiredSignatureError / JWTClaimsError subclasses).
+    """
+    name = ""
+
+    def __init__(self, secret: str, algorithm: str, issuer: str = "", audience: str = "",
+                 leeway: int = 0, required: Iterable[str] = ("exp",)):
+        if not secret:
+            # An empty HMAC key lets anyone mint tokens that verify
+            raise ValueError("A JWT engine needs a non-empty secret")
+        self.algorithm = algorithm
+        self.issuer = issuer
+        self.audience = audience
+        self.leeway = leeway
+        self.required = tuple(required)
+
+    def encode(self, claims: dict) -> str:
+        """Sign `claims`; datetime exp/iat/nbf become epoch seconds"""
+        claims = dict(claims)
+        for name in ("exp", "iat", "nbf"):
+            if isinstance(claims.get(name), datetime):
+                claims[name] = calendar.timegm(claims[name].utctimetuple())
+        if self.issuer:
+            claims.setdefault("iss", self.issuer)
+        if self.audience:
+            claims.setdefault("aud", self.audience)
+        return self._sign(json.dumps(claims, separators=(",", ":")).encode())
+
+    def decode(self, token: str) -> dict:
+        """Claims of a token with a valid signature and acceptable claims"""
+        try:
+            claims = json.loads(self._verify(token))
+        except JWTError:
+            raise
+        except Exception as e:
+            raise JWTError(f"Invalid token: {e}")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+        self._validate(claims)
+        return claims
+
+    def _sign(self, payload: bytes) -> str:
+        raise NotImplementedError
+
+    def _verify(self, token: str) -> bytes:
+        """Payload of a token whose signature checks out"""
+        raise NotImplementedError
+
+    def _validate(self, claims: dict):
+        for name in self.required:
+            if name not in claims:
+                raise JWTClaimsError(f"Missing required claim: {name}")
+        now = time.time()
+        for name in ("exp", "nbf", "iat"):
+            if name in claims and not isinstance(claims[name], (int, float)):
+                raise JWTClaimsError(f"Invalid {name} claim")
+        if "exp" in claims and now > claims["exp"] + self.leeway:
+            raise ExpiredSignatureError("Signature has expired.")
+        if "nbf" in claims and now < claims["nbf"] - self.leeway:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+        if self.issuer and claims.get("iss") != self.issuer:
+            raise JWTClaimsError("Invalid issuer")
+        if "aud" in claims or self.audience:
+            audiences = claims.get("aud")
+            if isinstance(audiences, str):
+                audiences = [audiences]
+            if not self.audience or not isinstance(audiences, list) or self.audience not in audiences:
+                raise JWTClaimsError("Invalid audience")
+
+class HMACEngine(JWTEngine):
+    """Stdlib HS256/384/512: the header is encoded once and each token
+    copies a pre-keyed HMAC instead of re-deriving the key pads"""
+    name = "hmac"
+    _DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, secret: str, algorithm: str, **kwargs):
+        super().__init__(secret, algorithm, **kwargs)
+        if algorithm not in self._DIGESTS:
+            raise ValueError(f"The hmac JWT backend only supports {', '.join(self._DIGESTS)}, not {algorithm}")
+        self._mac = hmac.new(secret.encode(), digestmod=self._DIGESTS[algorithm])
+        self._header = _b64encode(json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+
+    def _signature(self, signing_input: bytes) -> str:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return _b64encode(mac.digest())
+
+    def _sign(self, payload: bytes) -> str:
+        signing_input = f"{self._header}.{_b64encode(payload)}"
+        return f"{signing_input}.{self._signature(signing_input.encode())}"
+
+    def _verify(self, token: str) -> bytes:
+        try:
+            header, payload, signature = token.split(".")
+        except (AttributeError, ValueError):
+            raise JWTError("Not enough segments")
+        # Tokens we issued share our header bytes; others must still name our algorithm
+        if header != self._header:
+            try:
+                alg = json.loads(_b64decode(header)).get("alg")
+            except Exception:
+                raise JWTError("Invalid header")
+            if alg != self.algorithm:
+                raise JWTError("The specified alg value is not allowed")
+        if not hmac.compare_digest(signature, self._signature(f"{header}.{payload}".encode())):
+            raise JWTError("Signature verification failed.")
+        return _b64decode(payload)
+
+class JoseEngine(JWTEngine):
+    """python-jose's JWS with a key constructed once"""
+    name = "jose"
+
+    def __init__(self, secret: str, algorithm: str, **kwargs):
+        super().__init__(secret, algorithm, **kwargs)
+        self._key = jwk.construct(secret, algorithm)
+
+    def _sign(self, payload: bytes) -> str:
+        return jws.sign(payload, self._key, algorithm=self.algorithm)
+
+    def _verify(self, token: str) -> bytes:
+        try:
+            return jws.verify(token, self._key, algorithms=[self.algorithm])
+        except JWSError as e:
+            raise JWTError(str(e))
+
+class PyJWTEngine(JWTEngine):
+    """PyJWT's JWS (needs `pip install pyjwt`)"""
+    name = "pyjwt"
+
+    def __init__(self, secret: str, algorithm: str, **kwargs):
+        super().__init__(secret, algorithm, **kwargs)
+        if pyjwt is None:
+            raise RuntimeError("The pyjwt JWT backend needs PyJWT installed")
+        self._key = secret.encode()
+
+    def _sign(self, payload: bytes) -> str:
+        return pyjwt.api_jws.encode(payload, self._key, algorithm=self.algorithm)
+
+    def _verify(self, token: str) -> bytes:
+        try:
+            return pyjwt.api_jws.decode(token, self._key, algorithms=[self.algorithm])
+        except pyjwt.PyJWTError as e:
+            raise JWTError(str(e))
+
+JWT_ENGINES = {engine.name: engine for engine in (HMACEngine, JoseEngine, PyJWTEngine)}
+
+def new_jwt_engine(backend: str = JWT_BACKEND) -> JWTEngine:
+    """Engine for access tokens, configured from the JWT_* settings"""
+    if backend not in JWT_ENGINES:
+        raise ValueError(f"Unknown JWT backend {backend!r}, expected one of {', '.join(JWT_ENGINES)}")
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY must be set to sign access tokens")
+    return JWT_ENGINES[backend](
+        SECRET_KEY, ALGORITHM, issuer=JWT_ISSUER, audience=JWT_AUDIENCE,
+        leeway=JWT_LEEWAY_SECONDS, required=JWT_REQUIRED_CLAIMS
+    )
+
+jwt_engine = new_jwt_engine()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -22,60 +219,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def create_session_token(user_id: str, request: Request = None) -> str:
-    """Create session token and store in Redis"""
-    # Generate secure random token
-    token = secrets.token_urlsafe(64)
-    expires_at = (datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)).isoformat()
-    
-    # Get request info
-    user_agent = request.headers.get("user-agent") if request else None
-    ip_address = request.client.host if request else None
-    
-    # Store session in Redis
-    create_user_session(
-        user_id=user_id,
-        token=token,
-        expires_at=expires_at,
-        user_agent=user_agent,
-        ip_address=ip_address
-    )
-    
-    return token
+    return jwt_engine.encode(to_encode)
 
 def verify_token(token: str) -> Optional[dict]:
     """Verify JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return jwt_engine.decode(token)
     except JWTError:
         return None
 
-def get_user_from_session_token(token: str) -> Optional[User]:
+async def get_user_from_session_token(token: str) -> Optional[User]:
     """Get user from session token stored in Redis"""
     try:
-        session = get_session_by_token(token)
-        if not session:
-            return None
+        if is_signed_session_token(token):
+            # Session check, expiry flip and user fetch in one script call
+            resolved = await resolve_session_user(token)
+            if not resolved:
+                return None
+            user, expires_at = resolved
+            expires_at = datetime.fromisoformat(expires_at)
+        else:
+            session = await get_session_by_token(token)
+            if not session:
+                return None
+            
+            # Check if session is expired
+            expires_at = datetime.fromisoformat(session.expires_at)
+            if datetime.utcnow() > expires_at:
+                session.is_active = False
+                await session.save()
+                return None
+            
+            # Get user
+            user = await get_user_by_id(session.user_id)
         
-        # Check if session is expired
-        expires_at = datetime.fromisoformat(session.expires_at)
-        if datetime.utcnow() > expires_at:
-            session.is_active = False
-            session.save()
-            return None
-        
-        # Get user
-        user = get_user_by_id(session.user_id)
+        if user and user.is_active:
+            token_cache.set(token, user.id, expires_at.replace(tzinfo=timezone.utc).timestamp())
         return user
     except Exception as e:
         logger.error(f"Error getting user from session: {e}")
         return None
 
-def get_user_from_jwt_token(token: str) -> Optional[User]:
+async def get_user_from_jwt_token(token: str) -> Optional[User]:
     """Get user from JWT token"""
     payload = verify_token(token)
     if payload is None:
@@ -85,7 +270,9 @@ def get_user_from_jwt_token(token: str) -> Optional[User]:
     if user_id is None:
         return None
     
-    user = get_user_by_id(user_id)
+    user = await get_user_by_id(user_id)
+    if user and user.is_active:
+        token_cache.set(token, user.id, payload.get("exp"))
     return user
 
 async def get_current_user(
@@ -101,13 +288,20 @@ async def get_current_user(
     try:
         token = credentials.credentials
         
+        # Recently verified token: skip decode, user comes from the user cache
+        user_id = token_cache.get(token)
+        if user_id:
+            user = await get_user_by_id(user_id)
+            if user and user.is_active:
+                return user
+        
         # Try JWT first (for OAuth compatibility)
-        user = get_user_from_jwt_token(token)
+        user = await get_user_from_jwt_token(token)
         if user and user.is_active:
             return user
         
         # Try session token (for regular login)
-        user = get_user_from_session_token(token)
+        user = await get_user_from_session_token(token)
         if user and user.is_active:
             return user
         
@@ -123,8 +317,24 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def create_auth_response(user: User, request: Request = None) -> dict:
-    """Create authentication response with both JWT and session token"""
+async def create_auth_response(request: Request, email: str, new_user: Optional[User] = None,
+                               update: Optional[dict] = None, fill: Optional[dict] = None) -> Optional[dict]:
+    """Find or create the user and open a session (see open_login_session).
+
+    Returns the response with both JWT and session token, or None if the
+    user exists and `update` is None, or doesn't and `new_user` is None.
+    """
+    status, user, session = await open_login_session(
+        email,
+        expires_at=(datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)).isoformat(),
+        user_agent=request.headers.get("user-agent") if request else None,
+        ip_address=request.client.host if request else None,
+        new_user=new_user, update=update, fill=fill
+    )
+    if user is None:
+        return None
+    logger.info(f"Login for {email}: user {status}")
+    
     # Create JWT for OAuth compatibility
     jwt_token = create_access_token(data={
         "sub": user.email, 
@@ -132,29 +342,23 @@ def create_auth_response(user: User, request: Request = None) -> dict:
         "role": user.role
     })
     
-    # Create session token for session management
-    session_token = create_session_token(user.id, request)
-    
-    # Update last login
-    user.last_login = datetime.utcnow().isoformat()
-    user.save()
-    
     return {
         "access_token": jwt_token,
-        "session_token": session_token,
+        "session_token": session.token,
         "token_type": "bearer",
         "expires_in": ACCESS_TOKEN_EXPIRE_HOURS * 3600,
         "user": user.to_dict()
     }
 
-def logout_user(token: str) -> bool:
+async def logout_user(token: str) -> bool:
     """Logout user by revoking session"""
+    await invalidate_token(token)
     try:
         # Try to revoke session token
-        session = get_session_by_token(token)
+        session = await get_session_by_token(token)
         if session:
             session.is_active = False
-            session.save()
+            await session.save()
             return True
         return False
     except Exception as e:
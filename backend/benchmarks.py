@@ -0,0 +1,236 @@
+"""Latency benchmarks against a local Redis.
+
+Usage: python benchmarks.py [auth|concurrency|jwt|google_exchange|google_outage] [iterations] [added RTT in ms]
+Writes throwaway users/sessions into the configured Redis and removes them.
+"""
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from jose import jwt
+import redis as sync_redis
+from redis import asyncio as aioredis
+from config import REDIS_URL
+from models import (
+    User, Session, redis, get_session_by_token, resolve_session_user, _fetch_user_by_id
+)
+from session_tokens import mint_session_token
+from auth_utils import JWT_ENGINES
+import oauth
+from oauth_stub import bench_google_exchange, bench_google_outage
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    def pick(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+async def _write_fixture(model):
+    """HSET a model directly, bypassing save() hooks"""
+    fields = {
+        name: int(value) if isinstance(value, bool) else ("" if value is None else value)
+        for name, value in model.dict().items()
+    }
+    await redis.hset(model.key(), mapping=fields)
+
+async def _time(fn, arg, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn(arg)
+        samples.append(time.perf_counter() - start)
+    return _percentiles(samples)
+
+async def _stepwise_session_auth(token):
+    """Auth resolution as it was: session read, expiry check, user read"""
+    session = await get_session_by_token(token)
+    if not session:
+        return None
+    if datetime.utcnow() > datetime.fromisoformat(session.expires_at):
+        session.is_active = False
+        await session.save()
+        return None
+    return await _fetch_user_by_id(session.user_id)
+
+async def _create_fixtures():
+    user = User(email=f"bench-{time.time()}@example.com", name="Bench User")
+    session = Session(user_id=user.id, token="", expires_at=(datetime.utcnow() + timedelta(hours=1)).isoformat())
+    session.token = mint_session_token(session.id)
+    await _write_fixture(user)
+    await _write_fixture(session)
+    return user, session
+
+async def _drop_fixtures(user, session):
+    await redis.delete(Session.make_primary_key(session.id), User.make_primary_key(user.id))
+
+async def bench_auth(iterations: int = 5000):
+    """p50/p99 of session-token auth on a cache miss, before and after"""
+    user, session = await _create_fixtures()
+    try:
+        # Warm up connections and load the script
+        await _stepwise_session_auth(session.token)
+        await resolve_session_user(session.token)
+
+        results = {
+            "sequential (3 round trips)": await _time(_stepwise_session_auth, session.token, iterations),
+            "script (1 round trip)": await _time(resolve_session_user, session.token, iterations),
+        }
+        print(f"Session-token auth, {iterations} iterations:")
+        for name, stats in results.items():
+            print(f"  {name:28} p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms mean={stats['mean_ms']}ms")
+        return results
+    finally:
+        await _drop_fixtures(user, session)
+
+async def _throughput(worker, requests: int, in_flight: int) -> float:
+    """Requests/second with `in_flight` coroutines sharing `requests` calls"""
+    per_worker = requests // in_flight
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(in_flight)))
+    return per_worker * in_flight / (time.perf_counter() - start)
+
+async def bench_jwt(iterations: int = 50000):
+    """Access-token encode and verify throughput per JWT backend.
+
+    "jose (before)" is how tokens were made before JWTEngine: jose's
+    jwt.encode/decode with the secret string on every call. Which tokens each
+    engine must accept and refuse is covered by tests/test_jwt.py.
+    """
+    secret = "bench-" + "k" * 32
+    claims = {
+        "sub": "volunteer@example.com", "user_id": str(uuid.uuid4()), "role": "volunteer",
+        "exp": datetime.utcnow() + timedelta(hours=24), "type": "access"
+    }
+
+    def ops_per_second(fn, arg) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(arg)
+        return iterations / (time.perf_counter() - start)
+
+    rows = [(
+        "jose (before)",
+        ops_per_second(lambda c: jwt.encode(c, secret, algorithm="HS256"), claims),
+        ops_per_second(lambda t: jwt.decode(t, secret, algorithms=["HS256"]), jwt.encode(claims, secret, algorithm="HS256")),
+    )]
+    for name, engine_class in JWT_ENGINES.items():
+        try:
+            engine = engine_class(secret, "HS256", required=("exp", "user_id"))
+        except RuntimeError as e:
+            print(f"  skipping {name}: {e}")
+            continue
+        rows.append((name, ops_per_second(engine.encode, claims), ops_per_second(engine.decode, engine.encode(claims))))
+
+    print(f"HS256 access tokens, {iterations} iterations:")
+    print(f"  {'backend':>14} {'encode/s':>10} {'decode/s':>10}")
+    for name, encode_rate, decode_rate in rows:
+        print(f"  {name:>14} {encode_rate:>10.0f} {decode_rate:>10.0f}")
+    return rows
+
+class _DelayProxy:
+    """TCP proxy adding a fixed delay each way, to emulate a remote Redis.
+
+    Runs its own event loop in a thread so a blocking client can't stall it.
+    """
+
+    def __init__(self, target_host: str, target_port: int, rtt_ms: float):
+        self.target = (target_host, target_port)
+        self.delay = rtt_ms / 2000
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(self.delay)
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(*self.target)
+        await asyncio.gather(
+            self._pipe(reader, upstream_writer),
+            self._pipe(upstream_reader, writer),
+            return_exceptions=True
+        )
+
+async def bench_concurrency(requests: int = 20000, rtt_ms: int = 0):
+    """Throughput of a user lookup as in-flight requests grow.
+
+    The blocking client is what the handlers used before: each call stalls the
+    event loop, so extra in-flight requests can't overlap their round trips.
+    On loopback the round trip is nearly free and the blocking client wins on
+    raw overhead; pass an RTT (e.g. 1) to see how each behaves against a
+    Redis on another host.
+    """
+    user, session = await _create_fixtures()
+    key = User.make_primary_key(user.id)
+    url = REDIS_URL
+    if rtt_ms:
+        parsed = urlparse(REDIS_URL)
+        proxy = _DelayProxy(parsed.hostname or "localhost", parsed.port or 6379, rtt_ms)
+        url = parsed._replace(netloc=f"127.0.0.1:{proxy.port}").geturl()
+    blocking = sync_redis.Redis.from_url(url, decode_responses=True)
+    pooled = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool.from_url(
+        url, max_connections=redis.connection_pool.max_connections, decode_responses=True
+    ))
+
+    async def blocking_worker(n):
+        for _ in range(n):
+            blocking.hgetall(key)
+            await asyncio.sleep(0)
+
+    async def async_worker(n):
+        for _ in range(n):
+            await pooled.hgetall(key)
+
+    try:
+        print(f"User lookup throughput, {requests} requests, +{rtt_ms}ms RTT:")
+        print(f"  {'in-flight':>9} {'blocking req/s':>15} {'asyncio req/s':>14}")
+        for in_flight in (1, 4, 16, 64, 256):
+            sync_rps = await _throughput(blocking_worker, requests, in_flight)
+            async_rps = await _throughput(async_worker, requests, in_flight)
+            print(f"  {in_flight:>9} {sync_rps:>15.0f} {async_rps:>14.0f}")
+    finally:
+        blocking.close()
+        await pooled.close()
+        await pooled.connection_pool.disconnect()
+        await _drop_fixtures(user, session)
+
+if __name__ == "__main__":
+    import sys
+
+    benchmarks = {
+        "auth": bench_auth,
+        "concurrency": bench_concurrency,
+        "jwt": bench_jwt,
+        "google_exchange": lambda *args: bench_google_exchange(oauth.google_oauth, *args),
+        "google_outage": lambda *args: bench_google_outage(oauth.google_oauth, *args),
+    }
+
+    if len(sys.argv) > 1 and sys.argv[1] in benchmarks:
+        args = [int(arg) for arg in sys.argv[2:]]
+        asyncio.run(benchmarks[sys.argv[1]](*args))
+    else:
+        print(f"Usage: python benchmarks.py [{'|'.join(benchmarks)}] [iterations] [added RTT in ms]")
@@ -0,0 +1,258 @@
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from config import (
+    TOKEN_CACHE_MAX_ENTRIES, TOKEN_CACHE_TTL_SECONDS,
+    USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+)
+
+# Pub/sub channel carrying user ids whose cached copies must be dropped, and
+# token revocations: "token:{digest}" for one token, "user_tokens:{user id}"
+# for all of a user's
+USER_INVALIDATION_CHANNEL = "user:invalidate"
+TOKEN_INVALIDATION_PREFIX = "token:"
+USER_TOKENS_INVALIDATION_PREFIX = "user_tokens:"
+
+
+def token_digest(token: str) -> str:
+    """Digest used as cache key so raw tokens never sit in process memory"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU + TTL cache of verified tokens.
+
+    Maps a token digest to the authenticated user id so repeated requests with
+    the same bearer token skip the JWT decode; the user itself comes from the
+    coherent UserCache. Entries never outlive the token's own expiry.
+    Revocations are broadcast on USER_INVALIDATION_CHANNEL like user saves.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[str]:
+        """Return the cached user id for a token, or None"""
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user_id, expires_at = entry
+            if time.time() >= expires_at:
+                self._remove(digest)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return user_id
+
+    def set(self, token: str, user_id: str, token_exp: Optional[float] = None):
+        """Cache a verified token, expiring at the earlier of TTL and token exp"""
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        if expires_at <= time.time():
+            return
+
+        digest = token_digest(token)
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+            self._entries[digest] = (user_id, expires_at)
+            self._by_user.setdefault(user_id, set()).add(digest)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, token: str):
+        """Drop a single token (logout)"""
+        self.invalidate_digest(token_digest(token))
+
+    def invalidate_digest(self, digest: str):
+        """Drop a single token by digest (a revocation broadcast by another worker)"""
+        with self._lock:
+            if self._remove(digest):
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached token belonging to a user (revoke all sessions)"""
+        with self._lock:
+            for digest in list(self._by_user.get(user_id, ())):
+                if self._remove(digest):
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for /stats"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, digest: str) -> bool:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return False
+        user_id = entry[0]
+        digests = self._by_user.get(user_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[user_id]
+        return True
+
+
+class UserCache:
+    """Per-process cache of user objects, kept coherent across workers.
+
+    Every save publishes the user id on USER_INVALIDATION_CHANNEL; each worker
+    listens and drops its copy. Concurrent misses for the same key await a
+    single Redis fetch. The TTL only bounds staleness if a message is lost.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._email_to_id: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get_by_id(self, user_id: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Return a copy of the cached user, loading it once on a miss"""
+        return await self._get_or_load(f"id:{user_id}", lambda: self._lookup(user_id), loader)
+
+    async def get_by_email(self, email: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Same as get_by_id, resolving through the email -> id map"""
+        def lookup():
+            user_id = self._email_to_id.get(email)
+            return self._lookup(user_id) if user_id else None
+        return await self._get_or_load(f"email:{email}", lookup, loader)
+
+    def invalidate(self, user_id: str):
+        """Drop a user from this process"""
+        self._generation += 1
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._email_to_id.pop(entry[0].email, None)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop everything, e.g. after the invalidation feed was interrupted"""
+        self._generation += 1
+        self._entries.clear()
+        self._email_to_id.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+    def _lookup(self, user_id: str) -> Optional[Any]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if time.time() >= expires_at:
+            self._entries.pop(user_id, None)
+            self._email_to_id.pop(user.email, None)
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def _store(self, user: Any, generation: int):
+        # Skip if an invalidation raced with the fetch
+        if generation != self._generation:
+            return
+        self._entries[user.id] = (user, time.time() + self.ttl_seconds)
+        self._entries.move_to_end(user.id)
+        self._email_to_id[user.email] = user.id
+        while len(self._entries) > self.max_entries:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._email_to_id.pop(evicted.email, None)
+
+    async def _get_or_load(self, key: str, lookup: Callable, loader: Callable) -> Optional[Any]:
+        user = lookup()
+        if user is not None:
+            self.hits += 1
+            return copy.copy(user)
+
+        self.misses += 1
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            user = await asyncio.shield(pending)
+            return copy.copy(user) if user is not None else None
+
+        pending = self._inflight[key] = asyncio.get_running_loop().create_future()
+        generation = self._generation
+        try:
+            user = await loader()
+            if user is not None:
+                self._store(user, generation)
+            pending.set_result(user)
+        except BaseException as e:
+            pending.set_exception(e)
+            # Nobody may be waiting; don't warn about an unretrieved exception
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        return copy.copy(user) if user is not None else None
+
+
+# Process-wide instances shared by auth_utils and models
+token_cache = TokenCache(
+    max_entries=TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=TOKEN_CACHE_TTL_SECONDS
+)
+user_cache = UserCache(
+    max_entries=USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=USER_CACHE_TTL_SECONDS
+)
@@ -7,15 +7,97 @@ load_dotenv()
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
 
 # JWT
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", "24"))
 
+# Library behind access tokens: hmac (stdlib, HS* only), jose or pyjwt (if
+# installed); see `python benchmarks.py jwt`. On verify, tokens must carry
+# REQUIRED_CLAIMS, exp/nbf get LEEWAY_SECONDS of clock skew, and iss / aud
+# must match ISSUER / AUDIENCE when set (new tokens carry them).
+JWT_BACKEND = os.getenv("JWT_BACKEND", "hmac")
+JWT_ISSUER = os.getenv("JWT_ISSUER", "")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "")
+JWT_LEEWAY_SECONDS = int(os.getenv("JWT_LEEWAY_SECONDS", "0"))
+JWT_REQUIRED_CLAIMS = [name for name in os.getenv("JWT_REQUIRED_CLAIMS", "exp,user_id").split(",") if name]
+
+# Sessions created before signed tokens are resolved through pointer keys
+# (see dev_utils.py migrate-sessions) and, while this is on, a RediSearch query.
+# Safe to turn off once ACCESS_TOKEN_EXPIRE_HOURS have passed since the upgrade.
+SESSION_LEGACY_LOOKUP = os.getenv("SESSION_LEGACY_LOOKUP", "true").lower() == "true"
+
+# Users saved before email -> id pointers are found through a RediSearch
+# query (and given a pointer) while this is on; logins then pay one extra
+# round trip to check for the pointer. Turn off after dev_utils.py migrate-emails.
+USER_EMAIL_LEGACY_LOOKUP = os.getenv("USER_EMAIL_LEGACY_LOOKUP", "true").lower() == "true"
+
+# Verified-token cache
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+
+# User-object cache (kept coherent across workers via pub/sub)
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+
+# Keys per SCAN call / hashes per pipeline when walking all users
+USER_SCAN_BATCH_SIZE = int(os.getenv("USER_SCAN_BATCH_SIZE", "500"))
+
+# How often one worker recounts the /stats counters to repair drift
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "600"))
+
 # OAuth
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://openidconnect.googleapis.com/v1/userinfo")
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = os.getenv("GOOGLE_ISSUERS", "https://accounts.google.com,accounts.google.com").split(",")
+
+# Read the Google profile from the code exchange's id_token, verified locally
+# against Google's cached signing keys, instead of calling userinfo. Userinfo
+# remains the fallback when there is no id_token or it can't be verified.
+GOOGLE_VERIFY_ID_TOKEN = os.getenv("GOOGLE_VERIFY_ID_TOKEN", "true").lower() == "true"
+GOOGLE_USERINFO_FALLBACK = os.getenv("GOOGLE_USERINFO_FALLBACK", "true").lower() == "true"
+
+# Signing-key (JWKS) cache: lifetime when the response has no max-age,
+# shortest gap between fetches (an unknown key id forces one early), and
+# retry delay after a failed background refresh
+JWKS_DEFAULT_TTL_SECONDS = int(os.getenv("JWKS_DEFAULT_TTL_SECONDS", "3600"))
+JWKS_MIN_REFRESH_SECONDS = int(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+JWKS_RETRY_SECONDS = int(os.getenv("JWKS_RETRY_SECONDS", "30"))
+
+# Outbound HTTP client shared by OAuth calls: timeouts in seconds (pool =
+# waiting for a free connection), connection limit and how long idle
+# keep-alive connections are held open
+OAUTH_HTTP_CONNECT_TIMEOUT = float(os.getenv("OAUTH_HTTP_CONNECT_TIMEOUT", "3"))
+OAUTH_HTTP_READ_TIMEOUT = float(os.getenv("OAUTH_HTTP_READ_TIMEOUT", "10"))
+OAUTH_HTTP_POOL_TIMEOUT = float(os.getenv("OAUTH_HTTP_POOL_TIMEOUT", "5"))
+OAUTH_HTTP_MAX_CONNECTIONS = int(os.getenv("OAUTH_HTTP_MAX_CONNECTIONS", "20"))
+OAUTH_HTTP_KEEPALIVE_SECONDS = float(os.getenv("OAUTH_HTTP_KEEPALIVE_SECONDS", "60"))
+
+# Guard around calls to Google (per worker). The breaker opens when, over the
+# last WINDOW_SECONDS, at least MIN_CALLS were made and FAILURE_RATE of them
+# failed or took over SLOW_CALL_SECONDS; it stays open OPEN_SECONDS before
+# letting a probe through. At most MAX_CONCURRENCY calls are in flight, and
+# a login waits QUEUE_TIMEOUT seconds for a slot. Each call is tried up to
+# MAX_ATTEMPTS times with jittered backoff, but retries in the window are
+# capped at BUDGET_MIN plus BUDGET_RATIO of calls.
+OAUTH_BREAKER_WINDOW_SECONDS = float(os.getenv("OAUTH_BREAKER_WINDOW_SECONDS", "30"))
+OAUTH_BREAKER_MIN_CALLS = int(os.getenv("OAUTH_BREAKER_MIN_CALLS", "20"))
+OAUTH_BREAKER_FAILURE_RATE = float(os.getenv("OAUTH_BREAKER_FAILURE_RATE", "0.5"))
+OAUTH_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("OAUTH_BREAKER_SLOW_CALL_SECONDS", "2"))
+OAUTH_BREAKER_OPEN_SECONDS = float(os.getenv("OAUTH_BREAKER_OPEN_SECONDS", "15"))
+OAUTH_UPSTREAM_MAX_CONCURRENCY = int(os.getenv("OAUTH_UPSTREAM_MAX_CONCURRENCY", "20"))
+OAUTH_UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("OAUTH_UPSTREAM_QUEUE_TIMEOUT", "1"))
+OAUTH_RETRY_MAX_ATTEMPTS = int(os.getenv("OAUTH_RETRY_MAX_ATTEMPTS", "3"))
+OAUTH_RETRY_BUDGET_RATIO = float(os.getenv("OAUTH_RETRY_BUDGET_RATIO", "0.1"))
+OAUTH_RETRY_BUDGET_MIN = int(os.getenv("OAUTH_RETRY_BUDGET_MIN", "3"))
+OAUTH_RETRY_BACKOFF_SECONDS = float(os.getenv("OAUTH_RETRY_BACKOFF_SECONDS", "0.1"))
+OAUTH_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("OAUTH_RETRY_BACKOFF_MAX_SECONDS", "1"))
 
 # CORS
 CORS_ORIGINS = ["http://localhost:3000", "http://localhost:5173"]
\ No newline at end of file
@@ -0,0 +1,51 @@
+import asyncio
+from models import redis, migrate_legacy_sessions, migrate_email_pointers
+
+async def migrate_sessions():
+    """Add keyed lookups for sessions created before signed session tokens"""
+    try:
+        migrated = await migrate_legacy_sessions()
+        print(f"✅ Migrated {migrated} legacy sessions")
+        return True
+    except Exception as e:
+        print(f"❌ Error migrating sessions: {e}")
+        return False
+
+async def migrate_emails():
+    """Add email -> user id pointers for users created before them"""
+    try:
+        migrated = await migrate_email_pointers()
+        print(f"✅ Added {migrated} email pointers")
+        return True
+    except Exception as e:
+        print(f"❌ Error migrating emails: {e}")
+        return False
+
+async def list_redis_keys():
+    """List all Redis keys for debugging"""
+    try:
+        keys = [key async for key in redis.scan_iter("*")]
+        print(f"📋 Found {len(keys)} Redis keys:")
+        for key in keys:
+            print(f"  - {key}")
+        return keys
+    except Exception as e:
+        print(f"❌ Error listing Redis keys: {e}")
+        return []
+
+if __name__ == "__main__":
+    import sys
+    
+    commands = {
+        "migrate-sessions": migrate_sessions,
+        "migrate-emails": migrate_emails,
+        "list": list_redis_keys,
+    }
+    
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        asyncio.run(commands[sys.argv[1]]())
+    else:
+        print("Usage: python dev_utils.py [migrate-sessions|migrate-emails|list]")
+        print("  migrate-sessions - Keyed lookups for pre-signed session tokens")
+        print("  migrate-emails   - Email pointers for users created before them")
+        print("  list             - List all Redis keys")
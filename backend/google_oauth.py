@@ -0,0 +1,209 @@
+"""Google sign-in over one pooled HTTP client, verifying id_tokens against a cached JWKS."""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+from jose import jwk, jwt, JWTError
+from upstream import UpstreamGuard, UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+class GoogleOAuthError(httpx.HTTPStatusError):
+    """Google answered with an error; `stage` is "token_exchange" or "user_info" """
+
+    def __init__(self, stage: str, response: httpx.Response):
+        super().__init__(
+            f"{stage} failed: {response.status_code} - {response.text}", request=response.request, response=response
+        )
+        self.stage = stage
+
+def max_age(response: httpx.Response, default: int) -> int:
+    """Seconds the response may be cached for, from Cache-Control max-age less Age"""
+    for directive in response.headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return max(int(value) - int(response.headers.get("age", "0") or 0), 0)
+    return default
+
+class JWKSCache:
+    """Signing keys by key id, parsed once per fetch.
+
+    `fetch` GETs a URL. The set is cached for its max-age (`default_ttl`
+    without one); a key id it doesn't have triggers a refetch at most once
+    per `min_refresh_seconds`.
+    """
+
+    def __init__(self, url: str, fetch: Callable[[str], Awaitable[httpx.Response]], default_ttl: int = 3600,
+                 min_refresh_seconds: float = 60, retry_seconds: float = 30):
+        self.url = url
+        self.fetch = fetch
+        self.default_ttl = default_ttl
+        self.min_refresh_seconds = min_refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.keys: Dict[str, jwk.Key] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self):
+        """Fetch and parse the key set; keys no longer listed are dropped"""
+        response = await self.fetch(self.url)
+        response.raise_for_status()
+        keys = {}
+        for key in response.json()["keys"]:
+            if key.get("use", "sig") == "sig" and key.get("kid"):
+                keys[key["kid"]] = jwk.construct(key, algorithm=key.get("alg", "RS256"))
+        self.keys = keys
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + max_age(response, self.default_ttl)
+
+    def _needs_refresh(self, kid: str) -> bool:
+        now = time.monotonic()
+        if now >= self.expires_at:
+            return True
+        return kid not in self.keys and now - self.fetched_at >= self.min_refresh_seconds
+
+    async def get_key(self, kid: str) -> Optional[jwk.Key]:
+        """Key `kid`, refetching first if the set is stale or (at most once per
+        min_refresh_seconds) doesn't have it"""
+        if self._needs_refresh(kid):
+            async with self._lock:
+                # Another login may have refreshed while we waited
+                if self._needs_refresh(kid):
+                    await self.refresh()
+        return self.keys.get(kid)
+
+    async def run_refresher(self):
+        """Refetch shortly before the cached set expires, until cancelled"""
+        while True:
+            try:
+                async with self._lock:
+                    await self.refresh()
+                delay = max((self.expires_at - time.monotonic()) * 0.9, self.min_refresh_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"JWKS refresh error: {e}")
+                delay = self.retry_seconds
+            await asyncio.sleep(delay)
+
+class GoogleOAuth:
+    """Sign-in with Google for one OAuth client.
+
+    Every call goes through `guard`; `timeout` and `limits` configure the
+    pooled client. With `verify_id_tokens` the profile comes from the code
+    exchange's id_token, and `userinfo_fallback` calls userinfo when that
+    can't be verified instead of failing the login. `leeway` is the clock
+    skew tolerated on the id_token's exp/iat.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, token_url: str, userinfo_url: str,
+                 jwks_url: str, issuers: List[str], guard: UpstreamGuard, verify_id_tokens: bool = True,
+                 userinfo_fallback: bool = True, jwks_default_ttl: int = 3600,
+                 jwks_min_refresh_seconds: float = 60, jwks_retry_seconds: float = 30,
+                 timeout: Optional[httpx.Timeout] = None, limits: Optional[httpx.Limits] = None,
+                 leeway: int = 60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.userinfo_url = userinfo_url
+        self.issuers = issuers
+        self.guard = guard
+        self.verify_id_tokens = verify_id_tokens
+        self.userinfo_fallback = userinfo_fallback
+        self.timeout = timeout or httpx.Timeout(10)
+        self.limits = limits or httpx.Limits()
+        self.leeway = leeway
+        self.jwks = JWKSCache(
+            jwks_url, self._get, default_ttl=jwks_default_ttl,
+            min_refresh_seconds=jwks_min_refresh_seconds, retry_seconds=jwks_retry_seconds
+        )
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def new_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(http2=True, timeout=self.timeout, limits=self.limits)
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """The shared client; created on first use outside the app (scripts, benchmarks)"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = self.new_http_client()
+        return self._http_client
+
+    async def _get(self, url: str) -> httpx.Response:
+        client = self.get_http_client()
+        return await self.guard.call(lambda: client.get(url))
+
+    async def start(self):
+        """Open the shared client and start the signing-key refresher (app startup)"""
+        self.get_http_client()
+        if self.verify_id_tokens:
+            self._refresher = asyncio.create_task(self.jwks.run_refresher())
+
+    async def close(self):
+        """Stop the refresher and close the shared client (app shutdown)"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def verify_id_token(self, id_token: str, access_token: Optional[str] = None) -> Dict:
+        """Claims of a Google id_token issued to this app.
+
+        Checks the signature against the cached JWKS, the issuer, audience and
+        expiry, and at_hash when an access token is given. Raises JWTError.
+        """
+        kid = jwt.get_unverified_header(id_token).get("kid")
+        key = await self.jwks.get_key(kid) if kid else None
+        if key is None:
+            raise JWTError(f"Unknown signing key: {kid}")
+        return jwt.decode(
+            id_token, key, algorithms=["RS256"], audience=self.client_id, issuer=self.issuers,
+            access_token=access_token, options={"leeway": self.leeway}
+        )
+
+    async def get_user(self, code: str, redirect_uri: str, client: Optional[httpx.AsyncClient] = None) -> Dict:
+        """Exchange an authorization code for the Google user's profile.
+
+        The profile (sub, email, name, picture) comes from the verified
+        id_token when possible, otherwise from userinfo. Raises
+        GoogleOAuthError if a call is answered with an error.
+        """
+        client = client or self.get_http_client()
+        # Not idempotent (the code is single-use): only retried if it never reached Google
+        token_response = await self.guard.call(lambda: client.post(
+            self.token_url,
+            data={
+                "code": code,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uri": redirect_uri,
+                "grant_type": "authorization_code",
+            }
+        ), idempotent=False)
+        if token_response.status_code != 200:
+            raise GoogleOAuthError("token_exchange", token_response)
+        tokens = token_response.json()
+
+        if self.verify_id_tokens and tokens.get("id_token"):
+            try:
+                claims = await self.verify_id_token(tokens["id_token"], tokens.get("access_token"))
+                if claims.get("email") and claims.get("name"):
+                    return claims
+                logger.warning("id_token has no email/name claims, falling back to userinfo")
+            except (JWTError, httpx.HTTPError, UpstreamUnavailable) as e:
+                if not self.userinfo_fallback:
+                    raise
+                logger.warning(f"id_token not verified ({e}), falling back to userinfo")
+
+        user_response = await self.guard.call(lambda: client.get(
+            self.userinfo_url,
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        ))
+        if user_response.status_code != 200:
+            raise GoogleOAuthError("user_info", user_response)
+        return user_response.json()
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from auth_routes import router as auth_router
@@ -10,10 +11,21 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from models import init_redis, close_redis
+    from oauth import init_oauth, close_oauth
+    await init_redis()
+    await init_oauth()
+    yield
+    await close_oauth()
+    await close_redis()
+
 app = FastAPI(
     title="WaveAI API with Redis", 
     version="1.0.0",
-    description="Hackathon-ready authentication with Redis"
+    description="Hackathon-ready authentication with Redis",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -46,28 +58,25 @@ async def root():
 async def get_stats():
     """Get system stats (useful for hackathon demos)"""
     try:
-        from models import User, Session, redis
-        
-        # Count users
-        total_users = len(User.find().all())
-        volunteers = len(User.find(User.role == "volunteer").all())
-        organizers = len(User.find(User.role == "organizer").all())
+        from models import redis, get_stats_counters
+        from cache import token_cache, user_cache
         
-        # Count active sessions
-        active_sessions = len(Session.find(Session.is_active == True).all())
+        counters = await get_stats_counters()
         
         # Redis info
-        redis_info = redis.info()
+        redis_info = await redis.info()
         
         return {
             "users": {
-                "total": total_users,
-                "volunteers": volunteers,
-                "organizers": organizers
+                "total": counters.get("users", 0),
+                "volunteers": counters.get("users:volunteer", 0),
+                "organizers": counters.get("users:organizer", 0)
             },
             "sessions": {
-                "active": active_sessions
+                "active": counters.get("sessions:active", 0)
             },
+            "token_cache": token_cache.stats(),
+            "user_cache": user_cache.stats(),
             "redis": {
                 "connected_clients": redis_info.get("connected_clients", 0),
                 "used_memory_human": redis_info.get("used_memory_human", "0B"),
@@ -1,11 +1,101 @@
-from redis_om import get_redis_connection, HashModel, Field
-from typing import Optional
+from aredis_om import HashModel, Field, NotFoundError
+from redis import asyncio as aioredis
+from redis.exceptions import WatchError
+from typing import AsyncIterator, Dict, Optional, Tuple
 from datetime import datetime
+import asyncio
+import hmac
 import uuid
-from config import REDIS_URL
+import logging
+from config import (
+    REDIS_URL, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, SESSION_LEGACY_LOOKUP, USER_EMAIL_LEGACY_LOOKUP,
+    USER_SCAN_BATCH_SIZE, STATS_RECONCILE_INTERVAL_SECONDS
+)
+from session_tokens import (
+    mint_session_token, parse_session_token, is_signed_session_token, legacy_token_pointer_key
+)
+from cache import (
+    token_cache, token_digest, user_cache, USER_INVALIDATION_CHANNEL, TOKEN_INVALIDATION_PREFIX,
+    USER_TOKENS_INVALIDATION_PREFIX
+)
 
-# Redis connection
-redis = get_redis_connection(url=REDIS_URL, decode_responses=True)
+# redis-om models are pydantic v1 models even when pydantic 2 is installed
+try:
+    from pydantic.v1 import PrivateAttr
+except ImportError:
+    from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Redis connection: one bounded pool per worker shared by the models and
+# helpers. Connections are opened lazily; init_redis/close_redis are called
+# from the app lifespan. When all connections are busy callers wait up to
+# REDIS_POOL_TIMEOUT seconds instead of failing.
+pool = aioredis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    decode_responses=True
+)
+redis = aioredis.Redis(connection_pool=pool)
+
+# Counters behind /stats, kept in step by the save scripts below and
+# periodically recounted by reconcile_stats_counters():
+#   users, users:{role}, sessions:active
+STATS_COUNTERS_KEY = "stats:counters"
+_STATS_RECONCILE_LOCK_KEY = "stats:reconcile:lock"
+
+# Write user fields and adjust the user/role counters from the stored role,
+# so the counts stay right whichever worker or code path saves.
+# KEYS[1] = user key, KEYS[2] = counters; ARGV = field, value, ...
+_SAVE_USER_SCRIPT = """
+local existed = redis.call('EXISTS', KEYS[1])
+local old_role = redis.call('HGET', KEYS[1], 'role')
+redis.call('HSET', KEYS[1], unpack(ARGV))
+local new_role = redis.call('HGET', KEYS[1], 'role')
+if existed == 0 then
+    redis.call('HINCRBY', KEYS[2], 'users', 1)
+end
+if old_role ~= new_role then
+    if old_role then
+        redis.call('HINCRBY', KEYS[2], 'users:' .. old_role, -1)
+    end
+    if new_role then
+        redis.call('HINCRBY', KEYS[2], 'users:' .. new_role, 1)
+    end
+end
+"""
+_save_user = redis.register_script(_SAVE_USER_SCRIPT)
+
+# Same for sessions: count the ones whose is_active flips on or off
+# KEYS[1] = session key, KEYS[2] = counters; ARGV = field, value, ...
+_SAVE_SESSION_SCRIPT = """
+local function active(value)
+    return value == '1' or value == 'True' or value == 'true'
+end
+local was_active = active(redis.call('HGET', KEYS[1], 'is_active'))
+redis.call('HSET', KEYS[1], unpack(ARGV))
+local is_active = active(redis.call('HGET', KEYS[1], 'is_active'))
+if is_active ~= was_active then
+    redis.call('HINCRBY', KEYS[2], 'sessions:active', is_active and 1 or -1)
+end
+"""
+_save_session = redis.register_script(_SAVE_SESSION_SCRIPT)
+
+# email -> user id pointer, so logins find a user with a keyed read and can
+# claim an email atomically (see open_login_session)
+def user_email_key(email: str) -> str:
+    return f"user_email:{email}"
+
+def _encode_fields(model) -> Dict[str, str]:
+    """Model fields as hash values: bools as 1/0, None as empty string"""
+    return {
+        name: ("1" if value else "0") if isinstance(value, bool) else ("" if value is None else str(value))
+        for name, value in model.dict().items()
+    }
+
+def _flatten(fields: Dict[str, str]) -> list:
+    return [item for pair in fields.items() for item in pair]
 
 class User(HashModel):
     """User model stored in Redis"""
@@ -39,6 +129,46 @@ class User(HashModel):
     auth_provider: str = Field(default="local")  # local, google, github
     provider_id: Optional[str] = None
     
+    # Hash as last read from/written to Redis; None until persisted
+    _stored: Optional[Dict[str, str]] = PrivateAttr(default=None)
+    
+    def __copy__(self) -> "User":
+        # pydantic v1 shallow copies share the field dict; the user cache
+        # hands out copies that callers mutate, so give them their own
+        return self.copy()
+    
+    def to_hash(self) -> Dict[str, str]:
+        """Field mapping as stored in the user hash"""
+        return _encode_fields(self)
+    
+    def mark_stored(self, document: Optional[Dict[str, str]] = None) -> "User":
+        """Record the hash this user was loaded from, for dirty tracking"""
+        self._stored = dict(document) if document is not None else self.to_hash()
+        return self
+    
+    def dirty_fields(self) -> Dict[str, str]:
+        """Fields whose value differs from what is stored in Redis"""
+        current = self.to_hash()
+        if self._stored is None:
+            return current
+        return {name: value for name, value in current.items() if self._stored.get(name) != value}
+    
+    async def save(self, pipeline=None):
+        """Write the fields changed since load and tell every worker to drop its cached copy"""
+        self.check()
+        changed = self.dirty_fields()
+        if not changed:
+            return self
+        client = pipeline or redis
+        await _save_user(keys=[self.key(), STATS_COUNTERS_KEY], args=_flatten(changed), client=client)
+        if "email" in changed:
+            await client.set(user_email_key(self.email), self.id)
+            if self._stored and self._stored.get("email"):
+                await client.delete(user_email_key(self._stored["email"]))
+        self._stored = {**(self._stored or {}), **changed}
+        await invalidate_user_cache(self.id)
+        return self
+    
     def to_dict(self):
         """Convert to dictionary for JSON response"""
         return {
@@ -72,75 +202,460 @@ class Session(HashModel):
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     user_agent: Optional[str] = None
     ip_address: Optional[str] = None
+    
+    async def save(self, pipeline=None):
+        """Write the session, keeping the active-session counter in step"""
+        self.check()
+        await _save_session(
+            keys=[self.key(), STATS_COUNTERS_KEY], args=_flatten(_encode_fields(self)), client=pipeline or redis
+        )
+        return self
 
 # Helper functions for Redis operations
-def get_user_by_email(email: str) -> Optional[User]:
-    """Get user by email"""
+async def _fetch_user_by_email(email: str) -> Optional[User]:
     try:
-        users = User.find(User.email == email).all()
-        return users[0] if users else None
+        user_id = await redis.get(user_email_key(email))
+        if user_id:
+            return await _fetch_user_by_id(user_id)
+        if not USER_EMAIL_LEGACY_LOOKUP:
+            return None
+        users = await User.find(User.email == email).all()
+        if not users:
+            return None
+        await redis.set(user_email_key(email), users[0].id, nx=True)
+        return users[0].mark_stored()
     except:
         return None
 
-def get_user_by_id(user_id: str) -> Optional[User]:
-    """Get user by ID"""
+async def _fetch_user_by_id(user_id: str) -> Optional[User]:
     try:
-        return User.get(user_id)
+        return (await User.get(user_id)).mark_stored()
     except:
         return None
 
-def create_user_session(user_id: str, token: str, expires_at: str, user_agent: str = None, ip_address: str = None) -> Session:
-    """Create a new session"""
+async def _scan_batches(pattern: str, batch_size: int) -> AsyncIterator[list]:
+    """SCAN for hash keys matching pattern, grouped into lists of batch_size"""
+    batch = []
+    async for key in redis.scan_iter(pattern, count=batch_size, _type="hash"):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def iter_users(batch_size: int = USER_SCAN_BATCH_SIZE) -> AsyncIterator[User]:
+    """Stream every user: SCAN for keys, HGETALL them in pipelined batches.
+
+    Unlike User.find().all() this needs no search index and never holds more
+    than one batch. Bypasses the user cache; like SCAN, a user may be yielded
+    twice if the keyspace is rehashed mid-walk.
+    """
+    async for batch in _scan_batches(User.make_primary_key("*"), batch_size):
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in batch:
+                pipe.hgetall(key)
+            documents = await pipe.execute()
+        for document in documents:
+            if document:
+                yield User.parse_obj(document).mark_stored(document)
+
+async def get_user_by_email(email: str) -> Optional[User]:
+    """Get user by email"""
+    return await user_cache.get_by_email(email, lambda: _fetch_user_by_email(email))
+
+async def get_user_by_id(user_id: str) -> Optional[User]:
+    """Get user by ID"""
+    return await user_cache.get_by_id(user_id, lambda: _fetch_user_by_id(user_id))
+
+# Background tasks started by init_redis()
+_background_tasks: list = []
+
+# User cache coherence
+
+async def invalidate_user_cache(user_id: str):
+    """Drop a user from this worker and broadcast to the others"""
+    user_cache.invalidate(user_id)
+    try:
+        await redis.publish(USER_INVALIDATION_CHANNEL, user_id)
+    except Exception as e:
+        logger.error(f"Could not publish user invalidation: {e}")
+
+async def invalidate_token(token: str):
+    """Drop a revoked token from every worker's token cache"""
+    digest = token_digest(token)
+    token_cache.invalidate_digest(digest)
+    try:
+        await redis.publish(USER_INVALIDATION_CHANNEL, TOKEN_INVALIDATION_PREFIX + digest)
+    except Exception as e:
+        logger.error(f"Could not publish token invalidation: {e}")
+
+async def invalidate_user_tokens(user_id: str):
+    """Drop all of a user's tokens from every worker's token cache"""
+    token_cache.invalidate_user(user_id)
+    try:
+        await redis.publish(USER_INVALIDATION_CHANNEL, USER_TOKENS_INVALIDATION_PREFIX + user_id)
+    except Exception as e:
+        logger.error(f"Could not publish token invalidation: {e}")
+
+def _apply_invalidation(message: str):
+    if message.startswith(TOKEN_INVALIDATION_PREFIX):
+        token_cache.invalidate_digest(message[len(TOKEN_INVALIDATION_PREFIX):])
+    elif message.startswith(USER_TOKENS_INVALIDATION_PREFIX):
+        token_cache.invalidate_user(message[len(USER_TOKENS_INVALIDATION_PREFIX):])
+    else:
+        user_cache.invalidate(message)
+
+async def _listen_for_invalidations():
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(USER_INVALIDATION_CHANNEL)
+                # Anything could have changed (or been revoked) while we weren't subscribed
+                user_cache.clear()
+                token_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _apply_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"User invalidation listener error: {e}")
+            user_cache.clear()
+            token_cache.clear()
+            await asyncio.sleep(1)
+
+async def reconcile_stats_counters(attempts: int = 3) -> Optional[Dict[str, int]]:
+    """Recount users, roles and active sessions and overwrite the counters.
+
+    Repairs drift from writes made outside the save scripts. The counters key
+    is WATCHed during the recount, so a save landing mid-count aborts the
+    overwrite and the recount is retried. Returns None if it never settled.
+    """
+    for _ in range(attempts):
+        async with redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(STATS_COUNTERS_KEY)
+            counters = {"users": 0, "sessions:active": 0}
+            async for user in iter_users():
+                counters["users"] += 1
+                role_field = f"users:{user.role}"
+                counters[role_field] = counters.get(role_field, 0) + 1
+            
+            async for batch in _scan_batches(Session.make_primary_key("*"), USER_SCAN_BATCH_SIZE):
+                async with redis.pipeline(transaction=False) as flags_pipe:
+                    for key in batch:
+                        flags_pipe.hget(key, "is_active")
+                    flags = await flags_pipe.execute()
+                counters["sessions:active"] += sum(flag in ("1", "True", "true") for flag in flags)
+            
+            pipe.multi()
+            pipe.delete(STATS_COUNTERS_KEY)
+            pipe.hset(STATS_COUNTERS_KEY, mapping=counters)
+            try:
+                await pipe.execute()
+                return counters
+            except WatchError:
+                continue
+    return None
+
+async def get_stats_counters() -> Dict[str, int]:
+    """Current counters for /stats: one HGETALL"""
+    return {field: int(value) for field, value in (await redis.hgetall(STATS_COUNTERS_KEY)).items()}
+
+async def _reconcile_stats_periodically():
+    while True:
+        try:
+            # One worker per interval does the recount
+            if await redis.set(_STATS_RECONCILE_LOCK_KEY, "1", nx=True, ex=STATS_RECONCILE_INTERVAL_SECONDS):
+                counters = await reconcile_stats_counters()
+                if counters is None:
+                    logger.warning("Stats counters kept changing; reconciliation skipped")
+                else:
+                    logger.info(f"Reconciled stats counters: {counters}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stats counter reconciliation error: {e}")
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_SECONDS)
+
+async def init_redis():
+    """Open the pool and start background tasks (app startup)"""
+    await redis.ping()
+    _background_tasks.append(asyncio.create_task(_listen_for_invalidations()))
+    _background_tasks.append(asyncio.create_task(_reconcile_stats_periodically()))
+
+async def close_redis():
+    """Stop background tasks and release pooled connections (app shutdown)"""
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await redis.close()
+    await pool.disconnect()
+
+# Login in one round trip: find or create the user by email, patch their
+# profile and write the session, keeping the user and active-session
+# counters in step. The email pointer is claimed with SETNX, so concurrent
+# signups for one address can't both create a user. An existing user's key
+# is derived server-side, so this assumes a single (non-cluster) Redis.
+# KEYS[1] = email pointer, KEYS[2] = new user's hash, KEYS[3] = counters,
+# KEYS[4] = session
+# ARGV[1] = new user id ('' to never create), ARGV[2] = user key prefix,
+# ARGV[3] = 'update' or 'reject' for an existing user, ARGV[4] = invalidation
+# channel, ARGV[5..7] = counts of new user, update and fill items, followed
+# by those field, value items and then the session's
+_LOGIN_SCRIPT = """
+local n_new, n_update, n_fill = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7])
+local first = 8
+local created = n_new > 0 and redis.call('SETNX', KEYS[1], ARGV[1]) == 1
+local user_id = ARGV[1]
+if not created then
+    local owner = redis.call('GET', KEYS[1])
+    if owner and redis.call('EXISTS', ARGV[2] .. owner) == 1 then
+        if ARGV[3] ~= 'update' then
+            return {'exists'}
+        end
+        user_id = owner
+    elseif n_new > 0 then
+        -- Pointer left behind by a deleted user: take it over
+        redis.call('SET', KEYS[1], user_id)
+        created = true
+    else
+        return {'missing'}
+    end
+end
+
+local user = ARGV[2] .. user_id
+if created then
+    redis.call('HSET', user, unpack(ARGV, first, first + n_new - 1))
+    redis.call('HINCRBY', KEYS[3], 'users', 1)
+    redis.call('HINCRBY', KEYS[3], 'users:' .. redis.call('HGET', user, 'role'), 1)
+else
+    if n_update > 0 then
+        redis.call('HSET', user, unpack(ARGV, first + n_new, first + n_new + n_update - 1))
+    end
+    for i = first + n_new + n_update, first + n_new + n_update + n_fill - 1, 2 do
+        local current = redis.call('HGET', user, ARGV[i])
+        if not current or current == '' then
+            redis.call('HSET', user, ARGV[i], ARGV[i + 1])
+        end
+    end
+    redis.call('PUBLISH', ARGV[4], user_id)
+end
+
+redis.call('HSET', KEYS[4], 'user_id', user_id, unpack(ARGV, first + n_new + n_update + n_fill))
+redis.call('HINCRBY', KEYS[3], 'sessions:active', 1)
+return {created and 'created' or 'updated', redis.call('HGETALL', user)}
+"""
+_login = redis.register_script(_LOGIN_SCRIPT)
+
+async def _claim_legacy_email(email: str):
+    """Write the email pointer of a user saved before pointers existed, if any"""
+    if await redis.exists(user_email_key(email)):
+        return
+    users = await User.find(User.email == email).all()
+    if users:
+        await redis.set(user_email_key(email), users[0].id, nx=True)
+
+async def open_login_session(email: str, expires_at: str, user_agent: str = None, ip_address: str = None,
+                             new_user: Optional[User] = None, update: Optional[Dict[str, str]] = None,
+                             fill: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[User], Optional[Session]]:
+    """Find or create the user with `email` and open a session for them, in one script call.
+
+    If no user has the email, `new_user` (when given) is created. An
+    existing user gets `update` written over their fields and `fill` written
+    to fields that are still empty; with `update` None they are refused.
+    last_login is stamped either way. Returns (status, user, session):
+    "created" or "updated" with the stored user and new session, or
+    "exists" / "missing" with None, None. `update` and `fill` must not touch
+    email or role, whose pointer and counters are only set on creation.
+    """
+    if USER_EMAIL_LEGACY_LOOKUP:
+        await _claim_legacy_email(email)
+
+    now = datetime.utcnow().isoformat()
+    new_fields = {}
+    if new_user is not None:
+        new_user.email = email
+        new_user.last_login = now
+        new_user.check()
+        new_fields = new_user.to_hash()
+    if update is not None:
+        update = {**update, "last_login": now}
+    fill = fill or {}
+
+    session_id = str(uuid.uuid4())
     session = Session(
-        user_id=user_id,
-        token=token,
+        id=session_id,
+        user_id="",
+        token=mint_session_token(session_id),
         expires_at=expires_at,
         user_agent=user_agent,
         ip_address=ip_address
     )
-    session.save()
-    return session
+    session_fields = _encode_fields(session)
+    del session_fields["user_id"]
 
-def get_session_by_token(token: str) -> Optional[Session]:
+    result = await _login(
+        keys=[
+            user_email_key(email), User.make_primary_key(new_user.id if new_user else ""),
+            STATS_COUNTERS_KEY, session.key()
+        ],
+        args=[
+            new_user.id if new_user else "", User.make_primary_key(""), "reject" if update is None else "update",
+            USER_INVALIDATION_CHANNEL, len(new_fields) * 2, len(update or {}) * 2, len(fill) * 2,
+            *_flatten(new_fields), *_flatten(update or {}), *_flatten(fill), *_flatten(session_fields)
+        ]
+    )
+    if len(result) == 1:
+        return result[0], None, None
+    status, fields = result
+    document = dict(zip(fields[::2], fields[1::2]))
+    user = User.parse_obj(document).mark_stored(document)
+    session.user_id = user.id
+    # Other workers are told by the script's PUBLISH
+    user_cache.invalidate(user.id)
+    return status, user, session
+
+async def get_session_by_token(token: str) -> Optional[Session]:
     """Get session by token"""
     try:
-        sessions = Session.find(Session.token == token, Session.is_active == True).all()
-        return sessions[0] if sessions else None
+        session_id = parse_session_token(token)
+        if session_id is None:
+            if is_signed_session_token(token):
+                return None  # Forged or corrupted, no Redis needed
+            return await _get_legacy_session_by_token(token)
+        
+        session = await Session.get(session_id)
+        if not session.is_active or not hmac.compare_digest(session.token, token):
+            return None
+        return session
     except:
         return None
 
-def revoke_session(token: str) -> bool:
+# Resolve a signed session token to its user in one round trip: check the
+# session is active and unexpired (flipping it inactive if it has expired),
+# then return the user hash. expires_at is an isoformat() UTC string, which
+# orders lexicographically. The user key is derived server-side, so this
+# assumes a single (non-cluster) Redis.
+# KEYS[1] = session key, KEYS[2] = counters; ARGV = token, now (isoformat), user key prefix
+_RESOLVE_SESSION_SCRIPT = """
+local s = redis.call('HMGET', KEYS[1], 'token', 'is_active', 'expires_at', 'user_id')
+if not s[1] or s[1] ~= ARGV[1] then
+    return false
+end
+if s[2] == '0' or s[2] == 'False' or s[2] == 'false' or s[2] == '' then
+    return false
+end
+if ARGV[2] > s[3] then
+    redis.call('HSET', KEYS[1], 'is_active', '0')
+    redis.call('HINCRBY', KEYS[2], 'sessions:active', -1)
+    return false
+end
+return {s[3], redis.call('HGETALL', ARGV[3] .. s[4])}
+"""
+_resolve_session = redis.register_script(_RESOLVE_SESSION_SCRIPT)
+
+async def resolve_session_user(token: str) -> Optional[Tuple[User, str]]:
+    """Return (user, session expires_at) for a signed session token"""
+    session_id = parse_session_token(token)
+    if session_id is None:
+        return None
+    
+    result = await _resolve_session(
+        keys=[Session.make_primary_key(session_id), STATS_COUNTERS_KEY],
+        args=[token, datetime.utcnow().isoformat(), User.make_primary_key("")]
+    )
+    if not result or not result[1]:
+        return None
+    expires_at, fields = result
+    document = dict(zip(fields[::2], fields[1::2]))
+    return User.parse_obj(document).mark_stored(document), expires_at
+
+async def _get_legacy_session_by_token(token: str) -> Optional[Session]:
+    """Resolve a token issued before signed session tokens"""
+    session_id = await redis.get(legacy_token_pointer_key(token))
+    if session_id:
+        try:
+            session = await Session.get(session_id)
+        except NotFoundError:
+            return None
+        if session.is_active and hmac.compare_digest(session.token, token):
+            return session
+        return None
+    
+    if not SESSION_LEGACY_LOOKUP:
+        return None
+    sessions = await Session.find(Session.token == token, Session.is_active == True).all()
+    return sessions[0] if sessions else None
+
+async def migrate_legacy_sessions() -> int:
+    """Write token -> session id pointers for sessions with unsigned tokens.
+    
+    Lets those sessions be resolved with keyed reads until they expire.
+    Returns the number of pointers written.
+    """
+    migrated = 0
+    now = datetime.utcnow()
+    async for pk in await Session.all_pks():
+        try:
+            session = await Session.get(pk)
+        except NotFoundError:
+            continue
+        if not session.is_active or is_signed_session_token(session.token):
+            continue
+        remaining = int((datetime.fromisoformat(session.expires_at) - now).total_seconds())
+        if remaining <= 0:
+            continue
+        await redis.set(legacy_token_pointer_key(session.token), session.id, ex=remaining)
+        migrated += 1
+    return migrated
+
+async def migrate_email_pointers() -> int:
+    """Write email -> user id pointers for users saved before they existed.
+
+    Existing pointers are left alone. Returns the number written.
+    """
+    migrated = 0
+    async for user in iter_users():
+        if user.email and await redis.set(user_email_key(user.email), user.id, nx=True):
+            migrated += 1
+    return migrated
+
+async def revoke_session(token: str) -> bool:
     """Revoke a session"""
+    await invalidate_token(token)
     try:
-        session = get_session_by_token(token)
+        session = await get_session_by_token(token)
         if session:
             session.is_active = False
-            session.save()
+            await session.save()
             return True
         return False
     except:
         return False
 
-def revoke_all_user_sessions(user_id: str) -> bool:
+async def revoke_all_user_sessions(user_id: str) -> bool:
     """Revoke all sessions for a user"""
+    await invalidate_user_tokens(user_id)
     try:
-        sessions = Session.find(Session.user_id == user_id, Session.is_active == True).all()
+        sessions = await Session.find(Session.user_id == user_id, Session.is_active == True).all()
         for session in sessions:
             session.is_active = False
-            session.save()
+            await session.save()
         return True
     except:
         return False
 
 # Simple cache functions for additional data
-def cache_set(key: str, value: str, expire_seconds: int = 3600):
+async def cache_set(key: str, value: str, expire_seconds: int = 3600):
     """Set cache value with expiration"""
-    redis.setex(key, expire_seconds, value)
+    await redis.setex(key, expire_seconds, value)
 
-def cache_get(key: str) -> Optional[str]:
+async def cache_get(key: str) -> Optional[str]:
     """Get cache value"""
-    return redis.get(key)
+    return await redis.get(key)
 
-def cache_delete(key: str):
+async def cache_delete(key: str):
     """Delete cache value"""
-    redis.delete(key)
\ No newline at end of file
+    await redis.delete(key)
\ No newline at end of file
@@ -1,27 +1,51 @@
 import httpx
-from config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
+from config import (
+    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL,
+    GOOGLE_JWKS_URL, GOOGLE_ISSUERS, GOOGLE_VERIFY_ID_TOKEN, GOOGLE_USERINFO_FALLBACK,
+    JWKS_DEFAULT_TTL_SECONDS, JWKS_MIN_REFRESH_SECONDS, JWKS_RETRY_SECONDS,
+    OAUTH_HTTP_CONNECT_TIMEOUT, OAUTH_HTTP_READ_TIMEOUT, OAUTH_HTTP_POOL_TIMEOUT,
+    OAUTH_HTTP_MAX_CONNECTIONS, OAUTH_HTTP_KEEPALIVE_SECONDS,
+    OAUTH_BREAKER_WINDOW_SECONDS, OAUTH_BREAKER_MIN_CALLS, OAUTH_BREAKER_FAILURE_RATE,
+    OAUTH_BREAKER_SLOW_CALL_SECONDS, OAUTH_BREAKER_OPEN_SECONDS, OAUTH_UPSTREAM_MAX_CONCURRENCY,
+    OAUTH_UPSTREAM_QUEUE_TIMEOUT, OAUTH_RETRY_MAX_ATTEMPTS, OAUTH_RETRY_BUDGET_RATIO,
+    OAUTH_RETRY_BUDGET_MIN, OAUTH_RETRY_BACKOFF_SECONDS, OAUTH_RETRY_BACKOFF_MAX_SECONDS
+)
+from google_oauth import GoogleOAuth
+from upstream import UpstreamGuard
 
-async def get_google_user(code: str, redirect_uri: str):
-    """Exchange Google OAuth code for user info"""
-    async with httpx.AsyncClient() as client:
-        # Exchange code for tokens
-        token_response = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "code": code,
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "redirect_uri": redirect_uri,
-                "grant_type": "authorization_code",
-            }
-        )
-        token_response.raise_for_status()
-        tokens = token_response.json()
+# Google OAuth over one pooled HTTP client, opened in the app lifespan, with
+# id_tokens verified against Google's cached signing keys (see google_oauth.py).
+# Every call to Google (code exchange, userinfo, signing keys) goes through this
+google_upstream = UpstreamGuard(
+    "google",
+    window_seconds=OAUTH_BREAKER_WINDOW_SECONDS, min_calls=OAUTH_BREAKER_MIN_CALLS,
+    failure_rate=OAUTH_BREAKER_FAILURE_RATE, slow_call_seconds=OAUTH_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=OAUTH_BREAKER_OPEN_SECONDS, max_concurrency=OAUTH_UPSTREAM_MAX_CONCURRENCY,
+    queue_timeout=OAUTH_UPSTREAM_QUEUE_TIMEOUT, max_attempts=OAUTH_RETRY_MAX_ATTEMPTS,
+    retry_ratio=OAUTH_RETRY_BUDGET_RATIO, retry_min=OAUTH_RETRY_BUDGET_MIN,
+    backoff_seconds=OAUTH_RETRY_BACKOFF_SECONDS, backoff_max_seconds=OAUTH_RETRY_BACKOFF_MAX_SECONDS
+)
 
-        # Get user info
-        user_response = await client.get(
-            "https://openidconnect.googleapis.com/v1/userinfo",
-            headers={"Authorization": f"Bearer {tokens['access_token']}"}
-        )
-        user_response.raise_for_status()
-        return user_response.json()
\ No newline at end of file
+google_oauth = GoogleOAuth(
+    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL, GOOGLE_JWKS_URL,
+    GOOGLE_ISSUERS, google_upstream,
+    verify_id_tokens=GOOGLE_VERIFY_ID_TOKEN, userinfo_fallback=GOOGLE_USERINFO_FALLBACK,
+    jwks_default_ttl=JWKS_DEFAULT_TTL_SECONDS, jwks_min_refresh_seconds=JWKS_MIN_REFRESH_SECONDS,
+    jwks_retry_seconds=JWKS_RETRY_SECONDS,
+    timeout=httpx.Timeout(
+        connect=OAUTH_HTTP_CONNECT_TIMEOUT, read=OAUTH_HTTP_READ_TIMEOUT,
+        write=OAUTH_HTTP_READ_TIMEOUT, pool=OAUTH_HTTP_POOL_TIMEOUT
+    ),
+    limits=httpx.Limits(
+        max_connections=OAUTH_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=OAUTH_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=OAUTH_HTTP_KEEPALIVE_SECONDS
+    ),
+)
+
+google_jwks = google_oauth.jwks
+get_http_client = google_oauth.get_http_client
+init_oauth = google_oauth.start
+close_oauth = google_oauth.close
+verify_google_id_token = google_oauth.verify_id_token
+get_google_user = google_oauth.get_user
@@ -0,0 +1,230 @@
+"""A local stand-in for Google's OAuth endpoints, and the benchmarks run against it."""
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Optional
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+import upstream
+
+def _percentile(samples, q: float) -> float:
+    """q-quantile of sorted `samples` (seconds) in ms"""
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+class StubOAuthServer:
+    """Local stand-in for Google's token, userinfo and JWKS endpoints.
+
+    Emulates a remote host over loopback: opening a connection costs two
+    round trips (TCP, then TLS) and every request one more. The code
+    exchange returns an RS256 id_token for `audience`, signed with a key
+    generated here and published at /certs. Runs its own event loop in a
+    thread so the client being measured can't stall it.
+    """
+
+    def __init__(self, rtt_ms: float, audience: str, kid: str = "stub-key"):
+        self.delay = rtt_ms / 1000
+        self.stall = 0.0  # Extra wait on /token, to emulate a struggling Google
+        self.connections = 0
+        self.requests = {}
+        self.audience = audience
+        self.jwks = {"keys": []}
+        self._private_keys = {}
+        self.add_key(kid)
+        # Signed up front so the stub's own CPU time doesn't count against the client
+        now = int(time.time())
+        self.id_tokens = [self.sign(self.claims(uuid.uuid4().hex[:12], now)) for _ in range(64)]
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def add_key(self, kid: str):
+        """Generate a signing key, publish it at /certs and sign new tokens with it"""
+        private_pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        self.jwks["keys"].append({
+            **jwk.construct(private_pem, algorithm="RS256").public_key().to_dict(), "kid": kid, "use": "sig"
+        })
+        self._private_keys[kid] = private_pem
+        self.kid = kid
+
+    def claims(self, user: str, now: Optional[int] = None) -> dict:
+        """id_token claims as Google issues them for `user` to `audience`"""
+        now = int(time.time()) if now is None else now
+        return {
+            "iss": "https://accounts.google.com", "aud": self.audience, "sub": user, "iat": now,
+            "exp": now + 3600, "email": f"{user}@example.com", "email_verified": True, "name": f"User {user}"
+        }
+
+    def sign(self, claims: dict, kid: Optional[str] = None) -> str:
+        """RS256 id_token for `claims`, signed with key `kid` (the newest by default)"""
+        kid = kid or self.kid
+        return jwt.encode(claims, self._private_keys[kid], algorithm="RS256", headers={"kid": kid})
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=1024)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _respond(self, method: str, path: str) -> tuple:
+        """(body, extra headers) for one request"""
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if path == "/certs":
+            return json.dumps(self.jwks), "cache-control: public, max-age=300\r\n"
+        if method == "POST":
+            return json.dumps({
+                "access_token": uuid.uuid4().hex, "expires_in": 3599,
+                "id_token": self.id_tokens[self.requests[path] % len(self.id_tokens)]
+            }), ""
+        user = uuid.uuid4().hex[:12]
+        return json.dumps({"sub": user, "email": f"{user}@example.com", "name": f"User {user}"}), ""
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(2 * self.delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *headers = head.decode().split("\r\n")
+                length = 0
+                for header in headers:
+                    name, _, value = header.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(self.delay)
+                method, path, _ = request_line.split(" ")
+                if path == "/token" and self.stall:
+                    await asyncio.sleep(self.stall)
+                body, extra_headers = self._respond(method, path)
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n{extra_headers}"
+                    f"content-length: {len(body)}\r\n\r\n{body}".encode()
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def _point_at_stub(google, rtt_ms: float) -> StubOAuthServer:
+    """Start a stub and send `google`'s calls to it"""
+    google.client_id = google.client_id or "stub-client.apps.googleusercontent.com"
+    stub = StubOAuthServer(rtt_ms, google.client_id)
+    google.token_url = f"{stub.url}/token"
+    google.userinfo_url = f"{stub.url}/userinfo"
+    google.jwks.url = f"{stub.url}/certs"
+    return stub
+
+async def bench_google_exchange(google, logins: int = 500, in_flight: int = 50, rtt_ms: int = 20):
+    """Google's side of a login (GoogleOAuth.get_user) under concurrent logins.
+
+    Only the code exchange and profile lookup: the user upsert and session
+    write the callback handler does next aren't included. Against a stub
+    issuer with an emulated RTT, compares a fresh httpx.AsyncClient per
+    login calling userinfo (how logins used to run), the shared pooled
+    client calling userinfo, and the pooled client verifying the id_token
+    against the cached JWKS instead.
+    """
+    stub = _point_at_stub(google, rtt_ms)
+    gate = asyncio.Semaphore(in_flight)
+
+    async def login(fresh: bool):
+        async with gate:
+            start = time.perf_counter()
+            if fresh:
+                async with httpx.AsyncClient() as client:
+                    user = await google.get_user("code", "http://localhost/callback", client=client)
+            else:
+                user = await google.get_user("code", "http://localhost/callback")
+            assert user["email"], user
+            return time.perf_counter() - start
+
+    try:
+        await google.jwks.refresh()  # Warm, as in a running app
+        print(f"Google code exchanges, {logins} logins, {in_flight} in flight, {rtt_ms}ms RTT:")
+        print(
+            f"  {'client':>16} {'p50 ms':>7} {'p99 ms':>7} {'logins/s':>9} {'connections':>12}"
+            f" {'userinfo':>9} {'jwks':>5}"
+        )
+        for name, fresh, verify in (
+            ("fresh+userinfo", True, False), ("pooled+userinfo", False, False), ("pooled+id_token", False, True)
+        ):
+            google.verify_id_tokens = verify
+            stub.connections = 0
+            stub.requests.clear()
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(login(fresh) for _ in range(logins)))
+            wall = time.perf_counter() - start
+            latencies.sort()
+            print(
+                f"  {name:>16} {_percentile(latencies, 0.5):>7.1f} {_percentile(latencies, 0.99):>7.1f} {logins / wall:>9.0f}"
+                f" {stub.connections:>12}"
+                f" {stub.requests.get('/userinfo', 0):>9} {stub.requests.get('/certs', 0):>5}"
+            )
+    finally:
+        await google.close()
+
+async def bench_google_outage(google, logins: int = 400, rate: int = 100, stall_ms: int = 3000):
+    """Code exchanges arriving at `rate` per second while the stub's token endpoint stalls, then after it recovers.
+
+    "unguarded" lets every call through (as before the breaker), so each
+    login waits out the stall. With the guard, logins beyond the
+    concurrency cap fail as busy, the breaker opens once the window fills
+    with slow calls, and later logins fail at once; after open_seconds
+    (shortened here) a probe closes it again.
+    """
+    stub = _point_at_stub(google, 0)
+    guarded = google.guard
+    guarded.open_seconds = 2
+    unguarded = upstream.UpstreamGuard("google", min_calls=10 * logins, max_concurrency=logins, max_attempts=1)
+
+    async def login(i: int):
+        await asyncio.sleep(i / rate)
+        start = time.perf_counter()
+        try:
+            await google.get_user("code", "http://localhost/callback")
+            outcome = "ok"
+        except upstream.UpstreamUnavailable as e:
+            outcome = e.reason
+        return outcome, time.perf_counter() - start
+
+    try:
+        await google.jwks.refresh()
+        print(f"Code exchanges during a {stall_ms}ms token endpoint stall, {logins} logins at {rate}/s:")
+        print(f"  {'phase':>10} {'outcome':>8} {'logins':>7} {'p50 ms':>8} {'max ms':>8} {'breaker':>10}")
+        for phase, guard, stall in (
+            ("unguarded", unguarded, stall_ms), ("outage", guarded, stall_ms), ("recovery", guarded, 0)
+        ):
+            google.guard = guard
+            stub.stall = stall / 1000
+            if phase == "recovery":
+                await asyncio.sleep(guard.open_seconds)
+            results = await asyncio.gather(*(login(i) for i in range(logins)))
+            by_outcome = {}
+            for outcome, latency in results:
+                by_outcome.setdefault(outcome, []).append(latency)
+            for outcome, latencies in sorted(by_outcome.items()):
+                latencies.sort()
+                print(
+                    f"  {phase:>10} {outcome:>8} {len(latencies):>7} {_percentile(latencies, 0.5):>8.1f}"
+                    f" {latencies[-1] * 1000:>8.1f} {guard.state:>10}"
+                )
+    finally:
+        google.guard = guarded
+        await google.close()
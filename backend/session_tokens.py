@@ -0,0 +1,47 @@
+import base64
+import hashlib
+import hmac
+from typing import Optional
+from config import SECRET_KEY
+
+# Self-describing session tokens: "<version>.<session id>.<signature>"
+# The session id is the Redis primary key, so a valid token is one keyed read
+# away from its session and a forged one is rejected without touching Redis.
+TOKEN_VERSION = "s1"
+
+# Separate key from the JWT one so the two token types can't be confused
+if not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY must be set to sign session tokens")
+_SIGNING_KEY = hmac.new(SECRET_KEY.encode(), b"session-token", hashlib.sha256).digest()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_SIGNING_KEY, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def mint_session_token(session_id: str) -> str:
+    """Create a signed token addressing the given session"""
+    payload = f"{TOKEN_VERSION}.{session_id}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def is_signed_session_token(token: str) -> bool:
+    """True if the token claims to be in the signed format"""
+    return token.startswith(f"{TOKEN_VERSION}.")
+
+
+def parse_session_token(token: str) -> Optional[str]:
+    """Return the session id of a correctly signed token, else None"""
+    parts = token.split(".")
+    if len(parts) != 3 or parts[0] != TOKEN_VERSION or not parts[1]:
+        return None
+    expected = _sign(f"{parts[0]}.{parts[1]}")
+    if not hmac.compare_digest(expected, parts[2]):
+        return None
+    return parts[1]
+
+
+def legacy_token_pointer_key(token: str) -> str:
+    """Redis key mapping a pre-signed-format token to its session id"""
+    return f"session_token:{hashlib.sha256(token.encode()).hexdigest()}"
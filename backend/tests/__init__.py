@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the backend modules by name, the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "test-" + "k" * 32)
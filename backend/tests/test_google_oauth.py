@@ -0,0 +1,149 @@
+import asyncio
+import base64
+import json
+import time
+import unittest
+import httpx
+from jose import JWTError, ExpiredSignatureError
+from jose.exceptions import JWTClaimsError
+from google_oauth import GoogleOAuth, max_age
+from oauth_stub import StubOAuthServer
+from upstream import UpstreamGuard
+
+AUDIENCE = "test-client.apps.googleusercontent.com"
+ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+_stub = None
+
+def setUpModule():
+    # One stub for the module: it signs a batch of tokens on start
+    global _stub
+    _stub = StubOAuthServer(0, AUDIENCE)
+
+class _StubTestCase(unittest.IsolatedAsyncioTestCase):
+    """A GoogleOAuth pointed at the module's stub"""
+
+    @property
+    def stub(self) -> StubOAuthServer:
+        return _stub
+
+    def google(self, **kwargs) -> GoogleOAuth:
+        google = GoogleOAuth(
+            AUDIENCE, "secret", f"{self.stub.url}/token", f"{self.stub.url}/userinfo",
+            f"{self.stub.url}/certs", ISSUERS, UpstreamGuard("google-test", backoff_seconds=0), **kwargs
+        )
+        self.addAsyncCleanup(google.close)
+        return google
+
+    def jwks_fetches(self) -> int:
+        return self.stub.requests.get("/certs", 0)
+
+class VerifyIdTokenTests(_StubTestCase):
+    async def test_accepts_token_from_published_key(self):
+        claims = await self.google().verify_id_token(self.stub.sign(self.stub.claims("alice")))
+        self.assertEqual(claims["email"], "alice@example.com")
+
+    async def test_rejects_wrong_audience(self):
+        token = self.stub.sign({**self.stub.claims("alice"), "aud": "someone-else.apps.googleusercontent.com"})
+        with self.assertRaises(JWTClaimsError):
+            await self.google().verify_id_token(token)
+
+    async def test_rejects_wrong_issuer(self):
+        token = self.stub.sign({**self.stub.claims("alice"), "iss": "https://evil.example.com"})
+        with self.assertRaises(JWTClaimsError):
+            await self.google().verify_id_token(token)
+
+    async def test_rejects_expired(self):
+        now = int(time.time())
+        token = self.stub.sign({**self.stub.claims("alice", now - 7200), "exp": now - 120})
+        with self.assertRaises(ExpiredSignatureError):
+            await self.google(leeway=60).verify_id_token(token)
+
+    async def test_leeway_allows_clock_skew(self):
+        now = int(time.time())
+        token = self.stub.sign({**self.stub.claims("alice", now - 3600), "exp": now - 30})
+        await self.google(leeway=60).verify_id_token(token)
+
+    async def test_rejects_bad_signature(self):
+        header, _, signature = self.stub.sign(self.stub.claims("alice")).split(".")
+        forged_claims = {**self.stub.claims("mallory"), "email": "alice@example.com"}
+        forged_payload = base64.urlsafe_b64encode(json.dumps(forged_claims).encode()).rstrip(b"=").decode()
+        with self.assertRaises(JWTError):
+            await self.google().verify_id_token(f"{header}.{forged_payload}.{signature}")
+
+    async def test_rejects_token_without_kid(self):
+        token = self.stub.sign(self.stub.claims("alice")).split(".", 1)[1]
+        header = base64.urlsafe_b64encode(b'{"alg":"RS256","typ":"JWT"}').rstrip(b"=").decode()
+        with self.assertRaises(JWTError):
+            await self.google().verify_id_token(f"{header}.{token}")
+
+class KeyRotationTests(_StubTestCase):
+    async def test_unknown_kid_refetches_once(self):
+        google = self.google(jwks_min_refresh_seconds=0)
+        await google.verify_id_token(self.stub.sign(self.stub.claims("alice")))
+        fetches = self.jwks_fetches()
+
+        self.stub.add_key(f"rotated-{time.monotonic_ns()}")
+        token = self.stub.sign(self.stub.claims("bob"))
+        # Concurrent logins with the new key share one refetch
+        results = await asyncio.gather(*(google.verify_id_token(token) for _ in range(10)))
+        self.assertTrue(all(claims["sub"] == "bob" for claims in results))
+        self.assertEqual(self.jwks_fetches(), fetches + 1)
+
+    async def test_unknown_kid_refetch_is_rate_limited(self):
+        google = self.google(jwks_min_refresh_seconds=60)
+        await google.jwks.refresh()
+        fetches = self.jwks_fetches()
+
+        self.stub.add_key(f"rotated-{time.monotonic_ns()}")
+        with self.assertRaises(JWTError):
+            await google.verify_id_token(self.stub.sign(self.stub.claims("bob")))
+        self.assertEqual(self.jwks_fetches(), fetches)
+
+    async def test_kid_nobody_published(self):
+        google = self.google(jwks_min_refresh_seconds=0)
+        await google.jwks.refresh()
+        header = base64.urlsafe_b64encode(b'{"alg":"RS256","kid":"no-such-key"}').rstrip(b"=").decode()
+        token = self.stub.sign(self.stub.claims("alice")).split(".", 1)[1]
+        with self.assertRaisesRegex(JWTError, "Unknown signing key"):
+            await google.verify_id_token(f"{header}.{token}")
+
+class GetUserTests(_StubTestCase):
+    def setUp(self):
+        self.id_tokens = self.stub.id_tokens
+
+    def tearDown(self):
+        self.stub.id_tokens = self.id_tokens
+
+    async def test_profile_from_verified_id_token(self):
+        userinfo = self.stub.requests.get("/userinfo", 0)
+        user = await self.google().get_user("code", "http://localhost/callback")
+        self.assertTrue(user["email"].endswith("@example.com"))
+        self.assertEqual(self.stub.requests.get("/userinfo", 0), userinfo)
+
+    async def test_unverifiable_id_token_falls_back_to_userinfo(self):
+        self.stub.id_tokens = [self.stub.sign({**self.stub.claims("alice"), "aud": "someone-else"})]
+        userinfo = self.stub.requests.get("/userinfo", 0)
+        user = await self.google().get_user("code", "http://localhost/callback")
+        self.assertNotEqual(user["email"], "alice@example.com")
+        self.assertEqual(self.stub.requests.get("/userinfo", 0), userinfo + 1)
+
+    async def test_unverifiable_id_token_fails_without_fallback(self):
+        self.stub.id_tokens = [self.stub.sign({**self.stub.claims("alice"), "aud": "someone-else"})]
+        with self.assertRaises(JWTError):
+            await self.google(userinfo_fallback=False).get_user("code", "http://localhost/callback")
+
+class MaxAgeTests(unittest.TestCase):
+    def response(self, **headers) -> httpx.Response:
+        return httpx.Response(200, headers={name.replace("_", "-"): value for name, value in headers.items()})
+
+    def test_max_age_less_age(self):
+        self.assertEqual(max_age(self.response(cache_control="public, max-age=300, must-revalidate", age="100"), 60), 200)
+        self.assertEqual(max_age(self.response(cache_control="max-age=300", age="400"), 60), 0)
+
+    def test_default_without_max_age(self):
+        self.assertEqual(max_age(self.response(cache_control="no-cache"), 60), 60)
+        self.assertEqual(max_age(self.response(), 60), 60)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+from jose import jwt
+import auth_utils
+from auth_utils import JWT_ENGINES, JWTError, ExpiredSignatureError, JWTClaimsError, _b64encode
+
+SECRET = "test-" + "s" * 32
+
+def _claims(**overrides) -> dict:
+    claims = {
+        "sub": "volunteer@example.com", "user_id": str(uuid.uuid4()), "role": "volunteer",
+        "exp": datetime.utcnow() + timedelta(hours=1), "type": "access"
+    }
+    claims.update(overrides)
+    return claims
+
+class JWTEngineTests(unittest.TestCase):
+    """Every backend must accept the same tokens and refuse the same forgeries"""
+
+    def engines(self, **kwargs) -> list:
+        engines = []
+        for engine_class in JWT_ENGINES.values():
+            try:
+                engines.append(engine_class(SECRET, "HS256", required=("exp", "user_id"), **kwargs))
+            except RuntimeError:
+                # Optional library not installed
+                pass
+        return engines
+
+    def assertRejected(self, engine, token, error=JWTError):
+        with self.subTest(engine=engine.name), self.assertRaises(error):
+            engine.decode(token)
+
+    def assertAccepted(self, engine, token) -> dict:
+        try:
+            return engine.decode(token)
+        except JWTError as e:
+            self.fail(f"{engine.name} rejected a valid token: {e!r}")
+
+    def test_round_trip(self):
+        claims = _claims()
+        for engine in self.engines():
+            decoded = self.assertAccepted(engine, engine.encode(claims))
+            self.assertEqual(decoded["user_id"], claims["user_id"])
+            self.assertIsInstance(decoded["exp"], int)
+
+    def test_accepts_tokens_from_other_libraries(self):
+        claims = _claims(exp=int(time.time()) + 60)
+        tokens = [jwt.encode(claims, SECRET, algorithm="HS256")]
+        if auth_utils.pyjwt is not None:
+            tokens.append(auth_utils.pyjwt.encode(claims, SECRET, algorithm="HS256"))
+        for engine in self.engines():
+            for token in tokens:
+                self.assertEqual(self.assertAccepted(engine, token)["sub"], claims["sub"])
+
+    def test_engines_agree(self):
+        claims = _claims(exp=int(time.time()) + 60)
+        tokens = {engine.encode(claims) for engine in self.engines()}
+        self.assertEqual(len(tokens), 1)
+        self.assertGreaterEqual(len(self.engines()), 2)
+
+    def test_rejects_expired(self):
+        for engine in self.engines():
+            self.assertRejected(engine, engine.encode(_claims(exp=datetime.utcnow() - timedelta(seconds=5))), ExpiredSignatureError)
+
+    def test_leeway_allows_clock_skew(self):
+        token = jwt.encode(_claims(exp=int(time.time()) - 5), SECRET, algorithm="HS256")
+        for engine in self.engines(leeway=30):
+            self.assertAccepted(engine, token)
+
+    def test_rejects_not_yet_valid(self):
+        for engine in self.engines():
+            self.assertRejected(engine, engine.encode(_claims(nbf=int(time.time()) + 300)), JWTClaimsError)
+
+    def test_rejects_missing_required_claim(self):
+        claims = _claims()
+        del claims["user_id"]
+        for engine in self.engines():
+            self.assertRejected(engine, engine.encode(claims), JWTClaimsError)
+
+    def test_rejects_foreign_audience_and_issuer(self):
+        for engine in self.engines():
+            self.assertRejected(engine, engine.encode(_claims(aud="someone-else")), JWTClaimsError)
+        for engine in self.engines(issuer="volunteer-app", audience="volunteer-api"):
+            self.assertRejected(engine, engine.encode(_claims(aud="someone-else")), JWTClaimsError)
+            self.assertRejected(engine, engine.encode(_claims(iss="someone-else")), JWTClaimsError)
+            self.assertRejected(engine, jwt.encode(_claims(), SECRET, algorithm="HS256"), JWTClaimsError)
+            self.assertAccepted(engine, engine.encode(_claims()))
+
+    def test_rejects_wrong_key(self):
+        for engine in self.engines():
+            self.assertRejected(engine, jwt.encode(_claims(), SECRET + "x", algorithm="HS256"))
+
+    def test_rejects_tampered_payload(self):
+        forged_payload = _b64encode(json.dumps(_claims(exp=2**31, role="organizer"), default=str).encode())
+        for engine in self.engines():
+            header, _, signature = engine.encode(_claims()).split(".")
+            self.assertRejected(engine, f"{header}.{forged_payload}.{signature}")
+
+    def test_rejects_alg_none(self):
+        none_header = _b64encode(json.dumps({"alg": "none", "typ": "JWT"}).encode())
+        for engine in self.engines():
+            payload = engine.encode(_claims()).split(".")[1]
+            self.assertRejected(engine, f"{none_header}.{payload}.")
+
+    def test_rejects_other_algorithm(self):
+        for engine in self.engines():
+            self.assertRejected(engine, jwt.encode(_claims(), SECRET, algorithm="HS512"))
+
+    def test_rejects_malformed(self):
+        for engine in self.engines():
+            for token in ("not.a.jwt", "", "a.b", "...."):
+                self.assertRejected(engine, token)
+
+class SecretKeyTests(unittest.TestCase):
+    def test_engines_refuse_empty_secret(self):
+        for name, engine_class in JWT_ENGINES.items():
+            with self.subTest(engine=name), self.assertRaises((ValueError, RuntimeError)):
+                engine_class("", "HS256")
+
+    def test_startup_fails_without_secret_key(self):
+        for secret in ("", None):
+            with mock.patch.object(auth_utils, "SECRET_KEY", secret), self.assertRaises(RuntimeError):
+                auth_utils.new_jwt_engine("hmac")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from redis.exceptions import ConnectionError
+from cache import (
+    token_cache, token_digest, USER_INVALIDATION_CHANNEL, TOKEN_INVALIDATION_PREFIX, USER_TOKENS_INVALIDATION_PREFIX
+)
+import models
+
+class RevocationBroadcastTests(unittest.IsolatedAsyncioTestCase):
+    """Revocations published by another worker reach this worker's token cache"""
+
+    async def asyncSetUp(self):
+        await models.pool.disconnect()
+        self.addAsyncCleanup(models.pool.disconnect)
+        try:
+            await models.redis.ping()
+        except ConnectionError:
+            self.skipTest("No local Redis")
+        listener = asyncio.create_task(models._listen_for_invalidations())
+        self.addAsyncCleanup(self.stop, listener)
+        # The listener clears the cache once subscribed, so wait for that first
+        while (await models.redis.pubsub_numsub(USER_INVALIDATION_CHANNEL))[0][1] == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+    async def stop(self, listener: asyncio.Task):
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    async def until_missing(self, token: str):
+        for _ in range(100):
+            if token_cache.get(token) is None:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("token still cached")
+
+    async def test_single_token_revocation(self):
+        token_cache.set("revoked-token", "user-1")
+        token_cache.set("other-token", "user-1")
+        await models.redis.publish(USER_INVALIDATION_CHANNEL, TOKEN_INVALIDATION_PREFIX + token_digest("revoked-token"))
+        await self.until_missing("revoked-token")
+        self.assertEqual(token_cache.get("other-token"), "user-1")
+
+    async def test_revoke_all_user_tokens(self):
+        token_cache.set("first-token", "user-2")
+        token_cache.set("second-token", "user-2")
+        token_cache.set("someone-elses-token", "user-3")
+        await models.redis.publish(USER_INVALIDATION_CHANNEL, USER_TOKENS_INVALIDATION_PREFIX + "user-2")
+        await self.until_missing("first-token")
+        await self.until_missing("second-token")
+        self.assertEqual(token_cache.get("someone-elses-token"), "user-3")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+import httpx
+from upstream import UpstreamGuard, UpstreamUnavailable
+
+def _guard(**kwargs) -> UpstreamGuard:
+    options = dict(min_calls=4, failure_rate=0.5, open_seconds=60, backoff_seconds=0, retry_min=10)
+    options.update(kwargs)
+    return UpstreamGuard("test", **options)
+
+class _Upstream:
+    """Counts sends and answers each with the next response or error"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.sends = 0
+
+    async def send(self) -> httpx.Response:
+        outcome = self.outcomes[min(self.sends, len(self.outcomes) - 1)]
+        self.sends += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+class RetryTests(unittest.IsolatedAsyncioTestCase):
+    async def test_idempotent_call_retries_error_responses(self):
+        upstream = _Upstream(503, 503, 200)
+        response = await _guard().call(upstream.send)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(upstream.sends, 3)
+
+    async def test_non_idempotent_call_is_not_resent_after_error_response(self):
+        for status in (500, 503, 429):
+            upstream = _Upstream(status, 200)
+            response = await _guard().call(upstream.send, idempotent=False)
+            self.assertEqual(response.status_code, status)
+            self.assertEqual(upstream.sends, 1)
+
+    async def test_non_idempotent_call_is_not_resent_after_read_timeout(self):
+        upstream = _Upstream(httpx.ReadTimeout("slow"), 200)
+        with self.assertRaises(httpx.ReadTimeout):
+            await _guard().call(upstream.send, idempotent=False)
+        self.assertEqual(upstream.sends, 1)
+
+    async def test_non_idempotent_call_is_resent_when_it_never_left(self):
+        upstream = _Upstream(httpx.ConnectError("refused"), 200)
+        response = await _guard().call(upstream.send, idempotent=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(upstream.sends, 2)
+
+    async def test_retry_budget_caps_retries(self):
+        guard = _guard(min_calls=1000, retry_min=2, retry_ratio=0)
+        upstream = _Upstream(503)
+        for _ in range(3):
+            await guard.call(upstream.send)
+        # 3 first attempts plus the 2 retries the budget allows
+        self.assertEqual(upstream.sends, 5)
+
+class BreakerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_opens_after_failure_rate_and_fails_fast(self):
+        guard = _guard(max_attempts=1)
+        upstream = _Upstream(503)
+        for _ in range(4):
+            await guard.call(upstream.send)
+        self.assertEqual(guard.state, "open")
+        with self.assertRaises(UpstreamUnavailable) as raised:
+            await guard.call(upstream.send)
+        self.assertEqual(raised.exception.reason, "open")
+        self.assertEqual(upstream.sends, 4)
+
+    async def test_half_open_probe_closes_or_reopens(self):
+        guard = _guard(max_attempts=1, open_seconds=0.05)
+        for _ in range(4):
+            await guard.call(_Upstream(503).send)
+        await asyncio.sleep(0.06)
+        self.assertEqual(guard.state, "half_open")
+        await guard.call(_Upstream(503).send)
+        self.assertEqual(guard.state, "open")
+        await asyncio.sleep(0.06)
+        await guard.call(_Upstream(200).send)
+        self.assertEqual(guard.state, "closed")
+
+    async def test_busy_when_no_slot_frees_up(self):
+        guard = _guard(max_concurrency=1, queue_timeout=0.01)
+        release = asyncio.Event()
+
+        async def slow() -> httpx.Response:
+            await release.wait()
+            return httpx.Response(200)
+
+        first = asyncio.create_task(guard.call(slow))
+        await asyncio.sleep(0)
+        with self.assertRaises(UpstreamUnavailable) as raised:
+            await guard.call(slow)
+        self.assertEqual(raised.exception.reason, "busy")
+        release.set()
+        await first
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""Circuit breaker, retry budget and concurrency cap for calls to an upstream."""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+import httpx
+
+# Transport errors raised before the request reached the server: always safe to retry
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class UpstreamUnavailable(Exception):
+    """A call was refused without reaching the upstream.
+
+    `reason` is "open" (circuit breaker open) or "busy" (no free slot
+    within the queue timeout); `retry_after` is a hint in seconds.
+    """
+
+    def __init__(self, name: str, reason: str, retry_after: float):
+        super().__init__(f"{name} unavailable ({reason}), retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class UpstreamGuard:
+    """Circuit breaker, retry budget and concurrency cap around one upstream.
+
+    Every call's outcome lands in a sliding window. A call that fails (a
+    transport error, 5xx or 429) or takes longer than slow_call_seconds
+    counts against the upstream; once the window holds min_calls and the
+    share counting against it reaches failure_rate, the breaker opens and
+    calls fail at once with UpstreamUnavailable. After open_seconds one
+    probe is let through (half-open): success closes the breaker, failure
+    opens it again.
+
+    Retries use full-jitter exponential backoff and draw on a budget of
+    retry_ratio of the calls in the window (plus retry_min), so retries
+    can't multiply load on an upstream that is already struggling. A call
+    that is not idempotent is only retried when it never reached the server
+    (connect or pool errors), never after an error response.
+
+    At most max_concurrency calls are in flight; others wait up to
+    queue_timeout for a slot, then fail as "busy". State is per process.
+    """
+
+    def __init__(self, name: str, window_seconds: float = 30, min_calls: int = 20, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 2.0, open_seconds: float = 15, max_concurrency: int = 20,
+                 queue_timeout: float = 1.0, max_attempts: int = 3, retry_ratio: float = 0.1,
+                 retry_min: int = 3, backoff_seconds: float = 0.1, backoff_max_seconds: float = 1.0):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_attempts = max_attempts
+        self.retry_ratio = retry_ratio
+        self.retry_min = retry_min
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._calls: deque = deque()  # (finished at, counted against upstream)
+        self._bad = 0
+        self._retries: deque = deque()  # retry start times
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+
+    # Sliding window
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            if self._calls.popleft()[1]:
+                self._bad -= 1
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def _record(self, bad: bool, probe: bool):
+        now = time.monotonic()
+        if probe:
+            self._probing = False
+            if bad:
+                self._opened_at = now
+                return
+            self._opened_at = None
+            self._calls.clear()
+            self._bad = 0
+        self._calls.append((now, bad))
+        self._bad += bad
+        self._trim(now)
+        if self._opened_at is None and len(self._calls) >= self.min_calls \
+                and self._bad >= self.failure_rate * len(self._calls):
+            self._opened_at = now
+
+    # Breaker state
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def _admit(self) -> bool:
+        """Whether a call may start now; True means it is the half-open probe"""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        retry_after = max(self._opened_at + self.open_seconds - time.monotonic(), 1)
+        raise UpstreamUnavailable(self.name, "open", retry_after)
+
+    def _may_retry(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if self.state != "closed":
+            return False
+        if len(self._retries) >= self.retry_min + self.retry_ratio * len(self._calls):
+            return False
+        self._retries.append(now)
+        return True
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], idempotent: bool = True) -> httpx.Response:
+        """Run `send` under the breaker, retry budget and concurrency cap.
+
+        Returns the last response (which may be a 5xx once retries are
+        spent) or raises its transport error; raises UpstreamUnavailable
+        without calling `send` when the breaker is open or no slot frees up.
+        """
+        attempt = 0
+        while True:
+            probe = self._admit()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if probe:
+                    self._probing = False
+                raise UpstreamUnavailable(self.name, "busy", self.queue_timeout)
+
+            self._in_flight += 1
+            start = time.monotonic()
+            response, error = None, None
+            try:
+                response = await send()
+                failed = response.status_code >= 500 or response.status_code == 429
+                # The server may have acted on the request: only resend it if that's harmless
+                retryable = failed and idempotent
+            except httpx.TransportError as e:
+                error = e
+                failed = True
+                retryable = idempotent or isinstance(e, _NOT_SENT_ERRORS)
+            except BaseException:
+                if probe:
+                    self._probing = False
+                raise
+            finally:
+                self._in_flight -= 1
+                self._slots.release()
+            self._record(failed or time.monotonic() - start > self.slow_call_seconds, probe)
+
+            attempt += 1
+            if not failed or not retryable or attempt >= self.max_attempts or not self._may_retry():
+                if error is not None:
+                    raise error
+                return response
+            backoff = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** (attempt - 1))
+            await asyncio.sleep(random.uniform(0, backoff))
+
+    def snapshot(self) -> Dict:
+        """Breaker state and window counters, for health checks"""
+        now = time.monotonic()
+        self._trim(now)
+        state = self.state
+        calls = len(self._calls)
+        snapshot = {
+            "state": state,
+            "calls": calls,
+            "failureRate": round(self._bad / calls, 3) if calls else 0.0,
+            "retries": len(self._retries),
+            "inFlight": self._in_flight,
+            "maxConcurrency": self.max_concurrency,
+        }
+        if state == "open":
+            snapshot["retryAfterSeconds"] = round(self._opened_at + self.open_seconds - now, 1)
+        return snapshot
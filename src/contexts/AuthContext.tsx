@@ -11,9 +11,12 @@ export interface User {
   points?: number;
   level?: string;
   badges?: number;
+  eventsJoined?: number;
+  interests?: string[];
   organizationName?: string;
   eventsOrganized?: number;
   totalVolunteers?: number;
+  impactScore?: number;
   joinedAt: string;
   isVerified?: boolean;
   authProvider?: string;
@@ -47,7 +47,7 @@ export default function OrganizerDashboard() {
             </div>
             <div className="ml-4">
               <p className="text-sm text-gray-600 dark:text-gray-400">Impact Score</p>
-              <p className="text-xl font-bold text-gray-900 dark:text-white">--</p>
+              <p className="text-xl font-bold text-gray-900 dark:text-white">{user?.impactScore ?? '--'}</p>
             </div>
           </div>
         </div>
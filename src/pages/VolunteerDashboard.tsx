@@ -45,7 +45,7 @@ export default function VolunteerDashboard() {
             </div>
             <div className="ml-4">
               <p className="text-sm text-gray-600 dark:text-gray-400">Events Joined</p>
-              <p className="text-xl font-bold text-gray-900 dark:text-white">0</p>
+              <p className="text-xl font-bold text-gray-900 dark:text-white">{user?.eventsJoined || 0}</p>
             </div>
           </div>
         </div>